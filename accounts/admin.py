@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Acompanante, Anuncio, FotoAnuncio
+from .eliminacion import eliminar_anuncios, eliminar_usuario
+from .models import Acompanante, Anuncio, Categoria, Ciudad, FotoAnuncio, Pais
 
 @admin.register(Acompanante)
 class AcompananteAdmin(admin.ModelAdmin):
@@ -7,12 +8,43 @@ class AcompananteAdmin(admin.ModelAdmin):
 	list_filter = ("plan", "ciudad", "genero")
 	search_fields = ("username", "email")
 
+	# Se ocultan ya y se purgan en segundo plano (accounts/eliminacion.py)
+	def delete_model(self, request, obj):
+		eliminar_usuario(obj)
+
+	def delete_queryset(self, request, queryset):
+		for usuario in queryset:
+			eliminar_usuario(usuario)
+
 @admin.register(Anuncio)
 class AnuncioAdmin(admin.ModelAdmin):
 	list_display = ("titulo", "usuario", "ciudad", "precio", "sexo", "creado")
-	list_filter = ("ciudad", "sexo")
+	list_filter = ("categoria", "ciudad_ref__pais", "ciudad_ref")
 	search_fields = ("titulo", "descripcion")
 
+	def delete_model(self, request, obj):
+		eliminar_anuncios([obj.pk])
+
+	def delete_queryset(self, request, queryset):
+		eliminar_anuncios(queryset.values_list("pk", flat=True))
+
 @admin.register(FotoAnuncio)
 class FotoAnuncioAdmin(admin.ModelAdmin):
 	list_display = ("anuncio", "subida")
+
+@admin.register(Pais)
+class PaisAdmin(admin.ModelAdmin):
+	list_display = ("nombre", "slug")
+	prepopulated_fields = {"slug": ("nombre",)}
+
+@admin.register(Ciudad)
+class CiudadAdmin(admin.ModelAdmin):
+	list_display = ("nombre", "pais", "slug")
+	list_filter = ("pais",)
+	prepopulated_fields = {"slug": ("nombre",)}
+	search_fields = ("nombre",)
+
+@admin.register(Categoria)
+class CategoriaAdmin(admin.ModelAdmin):
+	list_display = ("nombre", "slug")
+	prepopulated_fields = {"slug": ("nombre",)}
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+
+    def ready(self):
+        from . import signals, imagenes, archivos, eliminacion, cercania  # noqa: F401
+        # La matriz de distancias entre ciudades se arma una vez, al arrancar
+        cercania.matriz()
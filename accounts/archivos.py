@@ -0,0 +1,125 @@
+# accounts/archivos.py
+"""
+Referencias a los archivos de fotos guardados por contenido
+(iscort.media.AlmacenamientoContenido). Cada FotoAnuncio suma una referencia
+a su archivo y la resta al borrarse; los archivos que quedan sin referencias
+los borra la tarea 'recolectar_archivos' pasado ARCHIVOS_GRACIA_SEGUNDOS.
+"""
+
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Min
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from .models import ArchivoContenido, FotoAnuncio, Tarea
+from .tareas import encolar, registrar
+
+TAREA_RECOLECTAR = 'recolectar_archivos'
+LOTE = 100
+
+
+def _gracia():
+    return timedelta(seconds=getattr(settings, 'ARCHIVOS_GRACIA_SEGUNDOS', 3600))
+
+
+def _storage():
+    return FotoAnuncio._meta.get_field('imagen').storage
+
+
+def programar_recoleccion(demora=None):
+    """Encola la recolección salvo que ya haya una pendiente"""
+    if not Tarea.objects.filter(tipo=TAREA_RECOLECTAR, estado=Tarea.PENDIENTE).exists():
+        encolar(TAREA_RECOLECTAR, demora=_gracia() if demora is None else demora)
+
+
+def registrar_subida(nombre):
+    """
+    Alta de un archivo recién subido que todavía no tiene FotoAnuncio.
+    Se llama antes de moverlo a su nombre definitivo; si el contenido ya
+    existía sin referencias, reinicia el margen para que no lo recolecten.
+    Devuelve True si el archivo es nuevo.
+    """
+    ahora = timezone.now()
+    archivo, nuevo = ArchivoContenido.objects.get_or_create(
+        nombre=nombre, defaults={'sin_referencias_desde': ahora}
+    )
+    if nuevo:
+        programar_recoleccion()
+    elif archivo.referencias == 0:
+        ArchivoContenido.objects.filter(pk=archivo.pk, referencias=0).update(sin_referencias_desde=ahora)
+    return nuevo
+
+
+def descartar_subida(nombre):
+    """Borra ya mismo un archivo subido que no se va a usar, si nadie más lo referencia"""
+    with transaction.atomic():
+        archivo = ArchivoContenido.objects.select_for_update().filter(nombre=nombre, referencias=0).first()
+        if archivo is not None:
+            archivo.delete()
+            _storage().delete(nombre)
+
+
+def sumar(nombres):
+    """Una referencia por cada aparición en `nombres`; un UPDATE por cantidad distinta"""
+    # Archivos guardados sin pasar por el upload handler (admin, scripts) aún no tienen fila
+    ArchivoContenido.objects.bulk_create(
+        [ArchivoContenido(nombre=nombre) for nombre in set(nombres)], ignore_conflicts=True
+    )
+    por_cantidad = defaultdict(list)
+    for nombre, cantidad in Counter(nombres).items():
+        por_cantidad[cantidad].append(nombre)
+    for cantidad, lista in por_cantidad.items():
+        ArchivoContenido.objects.filter(nombre__in=lista).update(
+            referencias=F('referencias') + cantidad, sin_referencias_desde=None
+        )
+
+
+def restar(nombres):
+    """Quita una referencia por aparición; los que llegan a cero quedan para la recolección"""
+    por_cantidad = defaultdict(list)
+    for nombre, cantidad in Counter(nombres).items():
+        por_cantidad[cantidad].append(nombre)
+    for cantidad, lista in por_cantidad.items():
+        ArchivoContenido.objects.filter(nombre__in=lista).update(referencias=Greatest(F('referencias') - cantidad, 0))
+    huerfanos = ArchivoContenido.objects.filter(
+        nombre__in=set(nombres), referencias=0, sin_referencias_desde__isnull=True
+    ).update(sin_referencias_desde=timezone.now())
+    if huerfanos:
+        programar_recoleccion()
+
+
+@registrar(TAREA_RECOLECTAR)
+def recolectar():
+    """Tarea: borra, por lotes, los archivos sin referencias cuyo margen ya pasó"""
+    limite = timezone.now() - _gracia()
+    storage = _storage()
+    borrados = 0
+    while True:
+        with transaction.atomic():
+            archivos = list(ArchivoContenido.objects.select_for_update(skip_locked=True).filter(
+                referencias=0, sin_referencias_desde__lte=limite
+            )[:LOTE])
+            if not archivos:
+                break
+            # Por si el contador se desfasó (p. ej. fotos creadas con bulk_create sin sumar)
+            en_uso = Counter(FotoAnuncio.objects.filter(
+                imagen__in=[archivo.nombre for archivo in archivos]
+            ).values_list('imagen', flat=True))
+            for nombre, cantidad in en_uso.items():
+                ArchivoContenido.objects.filter(nombre=nombre).update(referencias=cantidad, sin_referencias_desde=None)
+            huerfanos = [archivo for archivo in archivos if archivo.nombre not in en_uso]
+            ArchivoContenido.objects.filter(pk__in=[archivo.pk for archivo in huerfanos]).delete()
+            # Dentro de la transacción: una subida del mismo contenido espera el
+            # lock de la fila y después encuentra que el archivo ya no está
+            for archivo in huerfanos:
+                storage.delete(archivo.nombre)
+            borrados += len(huerfanos)
+
+    # Los que todavía están dentro del margen se recolectan en la próxima pasada
+    proximo = ArchivoContenido.objects.filter(referencias=0).aggregate(desde=Min('sin_referencias_desde'))['desde']
+    if proximo is not None:
+        programar_recoleccion(demora=max(proximo + _gracia() - timezone.now(), timedelta(0)))
+    return borrados
@@ -0,0 +1,132 @@
+# accounts/busqueda/__init__.py
+"""
+Búsqueda de texto completo y facetada de anuncios.
+IndiceBusqueda guarda un documento plano por anuncio; el motor de base de
+datos (tsvector/GIN en Postgres, FTS5 en SQLite) resuelve la coincidencia y
+la relevancia, y los conteos de facetas salen de una sola consulta.
+"""
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import connection
+from django.db.models import Count, F, Value
+from iscort.lotes import iterar_en_lotes
+from .. import catalogo
+from ..models import Anuncio, IndiceBusqueda
+from .backends import BACKENDS, backend_para
+
+FACETAS = ('ciudad', 'categoria', 'banda_precio', 'banda_edad')
+
+# (límite superior exclusivo, etiqueta); None es el último tramo
+BANDAS_PRECIO = [(50, '0-50'), (100, '50-100'), (200, '100-200'), (None, '200+')]
+BANDAS_EDAD = [(25, '18-24'), (35, '25-34'), (45, '35-44'), (None, '45+')]
+
+
+def _banda(valor, bandas):
+    if valor is None:
+        return ''
+    for limite, etiqueta in bandas:
+        if limite is None or valor < limite:
+            return etiqueta
+
+
+def banda_precio(precio):
+    return _banda(precio, BANDAS_PRECIO)
+
+
+def banda_edad(edad):
+    return _banda(edad, BANDAS_EDAD)
+
+
+def get_backend():
+    """Backend de BUSQUEDA_BACKEND, o el del motor de la conexión por defecto"""
+    nombre = getattr(settings, 'BUSQUEDA_BACKEND', None)
+    if nombre:
+        return BACKENDS[nombre]()
+    return backend_para(connection)
+
+
+def _categoria(anuncio):
+    """Slug de Anuncio.categoria; AnuncioExtendido.categoria tiene un default y no sirve de faceta"""
+    if anuncio.categoria_id is not None:
+        return anuncio.categoria.slug
+    encontrada = catalogo.categoria(anuncio.sexo)  # Sin FK: se deduce del sexo, si se puede
+    return encontrada.slug if encontrada else ''
+
+
+def documento(anuncio):
+    """Campos de IndiceBusqueda para `anuncio`"""
+    try:
+        extendido = anuncio.anuncio_extendido
+    except ObjectDoesNotExist:
+        extendido = None
+    partes = [anuncio.descripcion]
+    if extendido is not None:
+        partes += [extendido.servicios, extendido.barrio]
+    return {
+        'titulo': anuncio.titulo,
+        'cuerpo': '\n'.join(parte for parte in partes if parte),
+        'ciudad': anuncio.ciudad.strip().lower(),
+        'categoria': _categoria(anuncio),
+        'banda_precio': banda_precio(anuncio.precio),
+        'banda_edad': banda_edad(extendido.edad) if extendido else '',
+        'creado': anuncio.creado,
+    }
+
+
+def indexar_anuncio(anuncio_id):
+    """Crea o actualiza el documento de un anuncio (lo borra si el anuncio ya no existe)"""
+    anuncio = Anuncio.objects.select_related('anuncio_extendido', 'categoria').filter(pk=anuncio_id).first()
+    if anuncio is None:
+        IndiceBusqueda.objects.filter(anuncio_id=anuncio_id).delete()
+        return None
+    indice, _ = IndiceBusqueda.objects.update_or_create(anuncio=anuncio, defaults=documento(anuncio))
+    return indice
+
+
+def reindexar(chunk_size=500):
+    """Reconstruye el índice completo; devuelve la cantidad de anuncios indexados"""
+    IndiceBusqueda.objects.all().delete()
+    anuncios = Anuncio.objects.select_related('anuncio_extendido', 'categoria').order_by('id')
+    total = 0
+    for lote in iterar_en_lotes(anuncios, chunk_size):
+        IndiceBusqueda.objects.bulk_create([IndiceBusqueda(anuncio=anuncio, **documento(anuncio)) for anuncio in lote])
+        total += len(lote)
+    return total
+
+
+def conteo_facetas(queryset):
+    """{faceta: {valor: cantidad}} de `queryset` en una sola consulta UNION ALL"""
+    base = queryset.order_by()
+    partes = [
+        base.values(valor=F(faceta)).annotate(faceta=Value(faceta), cantidad=Count('id'))
+        .values_list('faceta', 'valor', 'cantidad')
+        for faceta in FACETAS
+    ]
+    conteos = {faceta: {} for faceta in FACETAS}
+    for faceta, valor, cantidad in partes[0].union(*partes[1:], all=True):
+        if valor:
+            conteos[faceta][valor] = cantidad
+    return conteos
+
+
+def buscar(texto='', **filtros):
+    """
+    Busca `texto` y filtra por facetas (ciudad, categoria, banda_precio, banda_edad).
+    Devuelve (queryset de IndiceBusqueda con anuncio y portada, conteo de facetas).
+    Las facetas se cuentan sobre el resultado del texto, antes de filtrarlas.
+    """
+    queryset = IndiceBusqueda.objects.all()
+    texto = (texto or '').strip()
+    if texto:
+        queryset = get_backend().buscar(queryset, texto)
+    facetas = conteo_facetas(queryset)
+
+    filtros = {faceta: valor for faceta, valor in filtros.items() if faceta in FACETAS and valor}
+    if 'ciudad' in filtros:
+        filtros['ciudad'] = filtros['ciudad'].strip().lower()
+    orden = ('-relevancia', '-creado') if texto else ('-creado',)
+    resultados = queryset.filter(**filtros).select_related(
+        'anuncio', 'anuncio__foto_principal'
+    ).order_by(*orden)
+    return resultados, facetas
@@ -0,0 +1,125 @@
+# accounts/busqueda/backends.py
+"""
+Backends de texto completo para IndiceBusqueda.
+Cada backend sabe crear sus estructuras (migración) y filtrar/ordenar un
+queryset de IndiceBusqueda por relevancia.
+"""
+
+import re
+
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+
+TABLA = 'accounts_indicebusqueda'
+
+
+class BackendBusqueda:
+    """Interfaz común; `instalar`/`desinstalar` reciben un schema_editor"""
+
+    def instalar(self, schema_editor):
+        raise NotImplementedError
+
+    def desinstalar(self, schema_editor):
+        raise NotImplementedError
+
+    def buscar(self, queryset, texto):
+        """Filtra `queryset` por `texto` y anota `relevancia` (mayor es mejor)"""
+        raise NotImplementedError
+
+
+class PostgresBackend(BackendBusqueda):
+    """tsvector generado + índice GIN con configuración española sin acentos"""
+    CONFIG = 'es_unaccent'
+
+    def instalar(self, schema_editor):
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS unaccent')
+        schema_editor.execute(f'''
+            DO $$ BEGIN
+                IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = '{self.CONFIG}') THEN
+                    CREATE TEXT SEARCH CONFIGURATION {self.CONFIG} (COPY = spanish);
+                    ALTER TEXT SEARCH CONFIGURATION {self.CONFIG}
+                        ALTER MAPPING FOR hword, hword_part, word WITH unaccent, spanish_stem;
+                END IF;
+            END $$
+        ''')
+        schema_editor.execute(f'''
+            ALTER TABLE {TABLA} ADD COLUMN documento tsvector GENERATED ALWAYS AS (
+                setweight(to_tsvector('{self.CONFIG}'::regconfig, titulo), 'A') ||
+                setweight(to_tsvector('{self.CONFIG}'::regconfig, cuerpo), 'B')
+            ) STORED
+        ''')
+        schema_editor.execute(f'CREATE INDEX {TABLA}_documento_gin ON {TABLA} USING GIN (documento)')
+
+    def desinstalar(self, schema_editor):
+        schema_editor.execute(f'DROP INDEX IF EXISTS {TABLA}_documento_gin')
+        schema_editor.execute(f'ALTER TABLE {TABLA} DROP COLUMN IF EXISTS documento')
+
+    def buscar(self, queryset, texto):
+        consulta = f"websearch_to_tsquery('{self.CONFIG}'::regconfig, %s)"
+        return queryset.alias(
+            coincide=RawSQL(f'{TABLA}.documento @@ {consulta}', [texto], output_field=BooleanField()),
+        ).filter(coincide=True).annotate(
+            relevancia=RawSQL(f'ts_rank({TABLA}.documento, {consulta})', [texto], output_field=FloatField()),
+        )
+
+
+class SQLiteBackend(BackendBusqueda):
+    """Tabla virtual FTS5 de contenido externo, sincronizada por triggers"""
+    FTS = f'{TABLA}_fts'
+
+    def instalar(self, schema_editor):
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {self.FTS} USING fts5(titulo, cuerpo, content='{TABLA}', "
+            f"content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+        )
+        nuevo = f"INSERT INTO {self.FTS}(rowid, titulo, cuerpo) VALUES (new.id, new.titulo, new.cuerpo);"
+        viejo = (f"INSERT INTO {self.FTS}({self.FTS}, rowid, titulo, cuerpo) "
+                 f"VALUES ('delete', old.id, old.titulo, old.cuerpo);")
+        schema_editor.execute(f"CREATE TRIGGER {TABLA}_ai AFTER INSERT ON {TABLA} BEGIN {nuevo} END")
+        schema_editor.execute(f"CREATE TRIGGER {TABLA}_ad AFTER DELETE ON {TABLA} BEGIN {viejo} END")
+        schema_editor.execute(f"CREATE TRIGGER {TABLA}_au AFTER UPDATE ON {TABLA} BEGIN {viejo} {nuevo} END")
+
+    def desinstalar(self, schema_editor):
+        for sufijo in ('ai', 'ad', 'au'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {TABLA}_{sufijo}')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {self.FTS}')
+
+    @staticmethod
+    def consulta_fts(texto):
+        """Cada palabra como término entre comillas con prefijo: sin sintaxis FTS del usuario"""
+        return ' '.join(f'"{palabra}"*' for palabra in re.findall(r'\w+', texto))
+
+    def buscar(self, queryset, texto):
+        consulta = self.consulta_fts(texto)
+        if not consulta:
+            return queryset.none()
+        # El MATCH se evalúa una sola vez por consulta, no por fila: el filtro es
+        # un IN sin correlación y los puntajes salen de un CTE materializado.
+        # bm25() es menor cuanto más relevante; títulos pesan 10 veces más
+        return queryset.alias(
+            coincide=RawSQL(
+                f'{TABLA}.id IN (SELECT rowid FROM {self.FTS} WHERE {self.FTS} MATCH %s)',
+                [consulta], output_field=BooleanField(),
+            ),
+        ).filter(coincide=True).annotate(
+            relevancia=RawSQL(
+                f'(WITH puntajes AS MATERIALIZED ('
+                f'SELECT rowid, -bm25({self.FTS}, 10.0, 1.0) AS puntaje FROM {self.FTS} WHERE {self.FTS} MATCH %s'
+                f') SELECT puntaje FROM puntajes WHERE puntajes.rowid = {TABLA}.id)',
+                [consulta], output_field=FloatField(),
+            ),
+        )
+
+
+BACKENDS = {
+    'postgresql': PostgresBackend,
+    'sqlite': SQLiteBackend,
+}
+
+
+def backend_para(connection):
+    """Backend que corresponde al motor de `connection`"""
+    try:
+        return BACKENDS[connection.vendor]()
+    except KeyError:
+        raise NotImplementedError(f"No hay backend de búsqueda para '{connection.vendor}'")
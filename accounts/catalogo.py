@@ -0,0 +1,132 @@
+# accounts/catalogo.py
+"""
+Tablas de referencia (Pais, Ciudad, Categoria) con una copia en memoria por
+proceso. Son chicas y casi no cambian: los filtros resuelven aquí el id y la
+consulta queda como igualdad de enteros sobre los índices de Anuncio.
+
+Las señales de accounts invalidan la copia al modificar estas tablas y suben
+una versión en el caché compartido; el resto de los procesos la compara cada
+CATALOGO_REVISION_SEGUNDOS. Mientras tanto, lo que no esté en la copia se
+busca en la base antes de darlo por inexistente.
+"""
+
+import time
+import uuid
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.text import slugify
+from .models import Categoria, Ciudad, Pais, SEXOS_POR_CATEGORIA
+
+CATALOGO_VERSION_KEY = 'catalogo:version'
+
+Catalogo = namedtuple('Catalogo', [
+    'paises',               # {slug: Pais}
+    'ciudades',             # {(slug_pais, slug_ciudad): Ciudad}
+    'ciudades_por_pais',    # {slug_pais: [Ciudad]} en orden alfabético
+    'ids_por_ciudad',       # {slug_ciudad: [id]} (el mismo nombre puede existir en varios países)
+    'categorias',           # {slug: Categoria}
+    'categorias_por_id',    # {id: Categoria}
+])
+
+
+# Copia de este proceso: {'catalogo', 'version', 'revisado'}
+_copia = {}
+
+
+def _leer():
+    paises = {pais.slug: pais for pais in Pais.objects.all()}
+    ciudades = {}
+    ciudades_por_pais = defaultdict(list)
+    ids_por_ciudad = defaultdict(list)
+    for ciudad in Ciudad.objects.select_related('pais').order_by('nombre'):
+        ciudades[(ciudad.pais.slug, ciudad.slug)] = ciudad
+        ciudades_por_pais[ciudad.pais.slug].append(ciudad)
+        ids_por_ciudad[ciudad.slug].append(ciudad.id)
+    categorias = {categoria.slug: categoria for categoria in Categoria.objects.all()}
+    return Catalogo(
+        paises, ciudades, dict(ciudades_por_pais), dict(ids_por_ciudad),
+        categorias, {categoria.id: categoria for categoria in categorias.values()},
+    )
+
+
+def cargar():
+    """Catálogo de este proceso; cada tanto confirma con el caché que siga vigente"""
+    ahora = time.monotonic()
+    revision = getattr(settings, 'CATALOGO_REVISION_SEGUNDOS', 10)
+    if 'catalogo' in _copia and ahora - _copia['revisado'] < revision:
+        return _copia['catalogo']
+    version = cache.get(CATALOGO_VERSION_KEY)
+    if 'catalogo' not in _copia or version != _copia['version']:
+        # La versión se lee antes que las tablas: un cambio en el medio
+        # solo provoca una recarga de más
+        _copia.update(catalogo=_leer(), version=version)
+    _copia['revisado'] = ahora
+    return _copia['catalogo']
+
+
+def invalidar():
+    """Descarta la copia local y, al confirmar la transacción, la de los demás procesos"""
+    _copia.clear()
+    transaction.on_commit(lambda: cache.set(CATALOGO_VERSION_KEY, uuid.uuid4().hex, None))
+
+
+def _desactualizada():
+    """La base tiene una fila que la copia no: se recarga ya"""
+    _copia.clear()
+    return cargar()
+
+
+def ciudades_de(pais):
+    """Nombres de las ciudades de `pais` (reemplaza a paises.get_ciudades_por_pais)"""
+    return [ciudad.nombre for ciudad in cargar().ciudades_por_pais.get(slugify(pais), [])]
+
+
+def ids_ciudad(nombre):
+    """Ids de Ciudad con ese nombre o slug, en cualquier país"""
+    slug = slugify(nombre)
+    ids = cargar().ids_por_ciudad.get(slug)
+    if ids is None and Ciudad.objects.filter(slug=slug).exists():
+        ids = _desactualizada().ids_por_ciudad.get(slug)
+    return ids or []
+
+
+def ciudad(pais, nombre, crear=False):
+    """Ciudad de `pais` con ese nombre; si no existe y `crear`, la registra"""
+    slug_pais, slug_ciudad = slugify(pais or 'Ecuador'), slugify(nombre or '')
+    if not slug_ciudad:
+        return None
+    encontrada = cargar().ciudades.get((slug_pais, slug_ciudad))
+    if encontrada is not None:
+        return encontrada
+    encontrada = Ciudad.objects.select_related('pais').filter(pais__slug=slug_pais, slug=slug_ciudad).first()
+    if encontrada is not None:
+        _desactualizada()
+        return encontrada
+    if not crear:
+        return None
+    # get_or_create resuelve la carrera si otro proceso la crea al mismo tiempo
+    pais_obj, _ = Pais.objects.get_or_create(slug=slug_pais, defaults={'nombre': (pais or 'Ecuador').strip()})
+    encontrada, _ = Ciudad.objects.get_or_create(pais=pais_obj, slug=slug_ciudad, defaults={'nombre': nombre.strip()})
+    return encontrada
+
+
+def categoria(valor):
+    """Categoria por slug ('escorts-femeninos') o por un valor de sexo ('mujer')"""
+    sexo = (valor or '').strip().lower()
+    slug = next((slug for slug, sexos in SEXOS_POR_CATEGORIA.items() if sexo in sexos), valor)
+    if not slug:
+        return None
+    encontrada = cargar().categorias.get(slug)
+    if encontrada is None and Categoria.objects.filter(slug=slug).exists():
+        encontrada = _desactualizada().categorias.get(slug)
+    return encontrada
+
+
+def slug_categoria(categoria_id):
+    encontrada = cargar().categorias_por_id.get(categoria_id)
+    if encontrada is None and categoria_id and Categoria.objects.filter(pk=categoria_id).exists():
+        encontrada = _desactualizada().categorias_por_id.get(categoria_id)
+    return encontrada.slug if encontrada else ''
@@ -0,0 +1,71 @@
+# accounts/cercania.py
+"""
+Búsqueda por cercanía entre ciudades ("a menos de N km de Latacunga").
+La matriz de distancias entre las ciudades con coordenadas conocidas se
+calcula una vez por proceso, al arrancar; un radio se resuelve en memoria
+a un conjunto de ids de Ciudad, y la consulta queda como un único
+`ciudad_ref_id IN (...)` sobre los índices de Anuncio, sin cálculo de
+distancias en SQL.
+"""
+
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+from django.utils.text import slugify
+from . import catalogo
+from .paises.ecuador import COORDENADAS
+
+PAIS = 'ecuador'
+RADIO_TIERRA_KM = 6371.0
+
+Matriz = namedtuple('Matriz', [
+    'slugs',        # [slug_ciudad], en el orden de las filas
+    'posiciones',   # {slug_ciudad: fila}
+    'distancias',   # ndarray (n, n) en km
+])
+
+
+@lru_cache(maxsize=1)
+def matriz():
+    """Distancias (haversine) entre todas las ciudades de COORDENADAS; no consulta la base"""
+    slugs = [slugify(nombre) for nombre in COORDENADAS]
+    latitudes, longitudes = np.radians(np.array(list(COORDENADAS.values()), dtype=float)).T
+    dlat = latitudes[:, None] - latitudes[None, :]
+    dlon = longitudes[:, None] - longitudes[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(latitudes)[:, None] * np.cos(latitudes)[None, :] * np.sin(dlon / 2) ** 2
+    distancias = 2 * RADIO_TIERRA_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+    return Matriz(slugs, {slug: fila for fila, slug in enumerate(slugs)}, distancias)
+
+
+def radio_km(request):
+    """Radio pedido en ?radio_km=, acotado por CERCANIA_RADIO_MAXIMO_KM; None si no hay uno válido"""
+    try:
+        radio = float(request.GET.get('radio_km', ''))
+    except ValueError:
+        return None
+    if not radio > 0:  # También descarta nan
+        return None
+    return min(radio, getattr(settings, 'CERCANIA_RADIO_MAXIMO_KM', 300))
+
+
+def ids_en_radio(ciudad, radio):
+    """
+    Ids de Ciudad a `radio` km o menos de `ciudad` (nombre o slug), la misma
+    incluida, ordenados por distancia. None si no se conocen sus coordenadas.
+    """
+    datos = matriz()
+    fila = datos.posiciones.get(slugify(ciudad))
+    if fila is None:
+        return None
+    distancias = datos.distancias[fila]
+    ciudades = catalogo.cargar().ciudades
+    ids = []
+    for columna in np.argsort(distancias, kind='stable'):
+        if distancias[columna] > radio:
+            break
+        encontrada = ciudades.get((PAIS, datos.slugs[columna]))
+        if encontrada is not None:
+            ids.append(encontrada.id)
+    return ids
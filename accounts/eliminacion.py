@@ -0,0 +1,117 @@
+# accounts/eliminacion.py
+"""
+Borrado de anuncios y usuarios en segundo plano.
+Lo pedido se oculta en el acto (Anuncio.oculto, usuario inactivo) y una
+tarea lo purga por lotes con DELETE ... WHERE id IN (...) crudos, hijos
+primero: sin cargar filas en memoria, sin señales por fila y sin una
+transacción larga aunque la cuenta tenga miles de calificaciones. Los
+archivos de las fotos se liberan al final de cada lote.
+"""
+
+from django.core.files.storage import default_storage
+from django.db import connection, models, transaction
+from rankings.models import RankingSnapshot
+from . import archivos
+from .home_cache import invalidar_home_payload
+from .models import Acompanante, Anuncio, FotoAnuncio, IndiceBusqueda
+from .tareas import encolar, registrar
+
+# Anuncios por transacción
+LOTE = 200
+TAREA_ANUNCIOS = 'purgar_anuncios'
+TAREA_USUARIO = 'purgar_usuario'
+
+
+def eliminar_anuncios(ids):
+    """Oculta los anuncios y encola su purga"""
+    ids = list(ids)
+    with transaction.atomic():
+        Anuncio.todos.filter(pk__in=ids).update(oculto=True)
+        # La búsqueda y los rankings leen sus tablas directamente: se sacan ya
+        IndiceBusqueda.objects.filter(anuncio_id__in=ids).delete()
+        RankingSnapshot.objects.filter(anuncio_id__in=ids).delete()
+        transaction.on_commit(invalidar_home_payload)
+        encolar(TAREA_ANUNCIOS, ids=ids)
+
+
+def eliminar_usuario(usuario):
+    """Desactiva al usuario (no puede volver a entrar), oculta sus anuncios y encola la purga"""
+    with transaction.atomic():
+        Acompanante.objects.filter(pk=usuario.pk).update(is_active=False)
+        Anuncio.todos.filter(usuario_id=usuario.pk).update(oculto=True)
+        IndiceBusqueda.objects.filter(anuncio__usuario_id=usuario.pk).delete()
+        RankingSnapshot.objects.filter(anuncio__usuario_id=usuario.pk).delete()
+        transaction.on_commit(invalidar_home_payload)
+        encolar(TAREA_USUARIO, usuario_id=usuario.pk)
+
+
+def _trozos(ids, tamano=None):
+    tamano = tamano or LOTE
+    for inicio in range(0, len(ids), tamano):
+        yield ids[inicio:inicio + tamano]
+
+
+def _delete_crudo(modelo, ids):
+    tabla = connection.ops.quote_name(modelo._meta.db_table)
+    columna = connection.ops.quote_name(modelo._meta.pk.column)
+    with connection.cursor() as cursor:
+        for trozo in _trozos(list(ids)):
+            marcadores = ', '.join(['%s'] * len(trozo))
+            cursor.execute(f'DELETE FROM {tabla} WHERE {columna} IN ({marcadores})', trozo)
+
+
+def _liberar_fotos(ids):
+    """Resta las referencias a los archivos y borra las variantes (propias de cada foto)"""
+    fotos = list(FotoAnuncio.objects.filter(pk__in=ids).values_list('imagen', 'variantes'))
+    archivos.restar([imagen for imagen, _ in fotos if imagen])
+    variantes = [
+        ruta for _, datos in fotos for variante in datos.values()
+        for clave, ruta in variante.items() if clave != 'ancho'
+    ]
+    transaction.on_commit(lambda: [default_storage.delete(ruta) for ruta in variantes])
+
+
+# Trabajo extra antes de borrar filas de un modelo (lo que hacían sus señales)
+ANTES_DE_BORRAR = {
+    FotoAnuncio: _liberar_fotos,
+}
+
+
+def _dependientes(modelo):
+    """Relaciones inversas hacia `modelo`, incluidas las ocultas (related_name='+', tablas de M2M)"""
+    return [
+        campo for campo in modelo._meta.get_fields(include_hidden=True)
+        if campo.auto_created and not campo.concrete and (campo.one_to_many or campo.one_to_one)
+    ]
+
+
+def _borrar(modelo, ids):
+    """Borra `ids` de `modelo` y, antes, todo lo que depende de ellos según on_delete"""
+    for relacion in _dependientes(modelo):
+        nombre = relacion.field.name
+        filas = relacion.related_model._base_manager.filter(**{f'{nombre}__in': ids})
+        if relacion.on_delete is models.CASCADE:
+            for trozo in _trozos(list(filas.values_list('pk', flat=True))):
+                _borrar(relacion.related_model, trozo)
+        elif relacion.on_delete is models.SET_NULL:
+            filas.update(**{nombre: None})
+    if modelo in ANTES_DE_BORRAR:
+        ANTES_DE_BORRAR[modelo](ids)
+    _delete_crudo(modelo, ids)
+
+
+@registrar(TAREA_ANUNCIOS)
+def purgar_anuncios(ids):
+    """Tarea: borra los anuncios ocultos de `ids`, de a LOTE por transacción"""
+    pendientes = list(Anuncio.todos.filter(pk__in=ids, oculto=True).values_list('pk', flat=True))
+    for trozo in _trozos(pendientes):
+        with transaction.atomic():
+            _borrar(Anuncio, trozo)
+
+
+@registrar(TAREA_USUARIO)
+def purgar_usuario(usuario_id):
+    """Tarea: borra los anuncios del usuario por lotes y al final el usuario"""
+    purgar_anuncios(list(Anuncio.todos.filter(usuario_id=usuario_id).values_list('pk', flat=True)))
+    with transaction.atomic():
+        _borrar(Acompanante, [usuario_id])
@@ -1,5 +1,5 @@
 from django import forms
-from .models import Acompanante
+from .models import Acompanante, Anuncio
 from django.contrib.auth.forms import UserCreationForm as DjangoUserCreationForm
 from django.utils.translation import gettext_lazy as _
 
@@ -17,3 +17,18 @@ class UserCreationForm(DjangoUserCreationForm):
     class Meta:
         model = Acompanante
         fields = ('username', 'email', 'password1', 'password2')
+
+
+class AnuncioForm(forms.ModelForm):
+    """Campos del anuncio del formulario de publicación"""
+
+    class Meta:
+        model = Anuncio
+        fields = ('titulo', 'descripcion', 'ciudad', 'pais', 'precio', 'sexo')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['pais'].required = False
+
+    def clean_pais(self):
+        return self.cleaned_data['pais'] or 'Ecuador'
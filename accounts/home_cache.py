@@ -0,0 +1,106 @@
+# accounts/home_cache.py
+"""
+Payload precalculado de la página principal.
+Se construye una sola vez, se guarda en el cache de Django y se invalida
+por señales cuando cambian anuncios, fotos o calificaciones.
+"""
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from . import catalogo
+from .models import Anuncio
+
+HOME_CACHE_KEY = 'home:payload'
+
+
+def _card(anuncio):
+    """Datos planos de un anuncio; no dispara consultas al renderizar"""
+    foto = anuncio.foto_principal
+    return {
+        'id': anuncio.id,
+        'titulo': anuncio.titulo,
+        'ciudad': anuncio.ciudad,
+        'precio': anuncio.precio,
+        'sexo': anuncio.sexo,
+        'creado': anuncio.creado,
+        'foto_principal': foto.url_optimizada if foto else None,
+        'foto': {
+            'url_optimizada': foto.url_optimizada,
+            'srcset_jpeg': foto.srcset_jpeg,
+            'srcset_webp': foto.srcset_webp,
+            'srcset_avif': foto.srcset_avif,
+        } if foto else None,
+    }
+
+
+def _listas():
+    """{nombre: queryset} de las listas del home (el catálogo puede consultar la base)"""
+    anuncios = Anuncio.objects.select_related('foto_principal')
+
+    def top(slug, cantidad):
+        encontrada = catalogo.categoria(slug)
+        if encontrada is None:
+            return anuncios.none()
+        return anuncios.filter(categoria_id=encontrada.id).order_by('-creado')[:cantidad]
+
+    return {
+        'top_femeninos': top('escorts-femeninos', 3),
+        'top_masculinos': top('escorts-masculinos', 6),
+        'top_trans': top('trans-travestis', 6),
+        'nuevos_verificados': anuncios.order_by('-creado')[:6],
+    }
+
+
+def _armar_payload(listas, total_escorts, total_ciudades):
+    payload = {
+        'estadisticas': {
+            'total_escorts': total_escorts,
+            'total_ciudades': total_ciudades,
+            'total_reviews': 0,
+            'promedio_satisfaccion': 0
+        },
+        'destacados_mes': [],
+    }
+    for nombre, lista in listas.items():
+        payload[nombre] = [_card(anuncio) for anuncio in lista]
+    return payload
+
+
+def construir_home_payload():
+    """Arma el contexto completo del home (estadísticas + tops por categoría)"""
+    listas = {nombre: list(queryset) for nombre, queryset in _listas().items()}
+    return _armar_payload(
+        listas, Anuncio.objects.count(), Anuncio.objects.values('ciudad').distinct().count()
+    )
+
+
+async def aconstruir_home_payload():
+    """
+    Igual que construir_home_payload, en un thread aparte. Con asyncio.gather no
+    se gana nada: el ORM async manda cada consulta al mismo thread, una tras otra
+    """
+    return await sync_to_async(construir_home_payload)()
+
+
+def get_home_payload():
+    """Devuelve el payload desde el cache, construyéndolo si no existe"""
+    payload = cache.get(HOME_CACHE_KEY)
+    if payload is None:
+        payload = construir_home_payload()
+        cache.set(HOME_CACHE_KEY, payload, getattr(settings, 'HOME_CACHE_TIMEOUT', 300))
+    return payload
+
+
+async def aget_home_payload():
+    """Versión async de get_home_payload para la vista ASGI"""
+    payload = await cache.aget(HOME_CACHE_KEY)
+    if payload is None:
+        payload = await aconstruir_home_payload()
+        await cache.aset(HOME_CACHE_KEY, payload, getattr(settings, 'HOME_CACHE_TIMEOUT', 300))
+    return payload
+
+
+def invalidar_home_payload():
+    """Borra el payload; el siguiente request lo reconstruye"""
+    cache.delete(HOME_CACHE_KEY)
@@ -0,0 +1,79 @@
+# accounts/imagenes.py
+"""
+Pipeline de imágenes de FotoAnuncio.
+Genera variantes redimensionadas (thumb, card, full) sin EXIF en JPEG, WebP
+y, si Pillow lo soporta, AVIF. Corre en los workers de accounts.tareas,
+nunca dentro del request de subida.
+"""
+
+import io
+import posixpath
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+from .models import FotoAnuncio
+from .tareas import registrar
+
+# Lado mayor de cada variante, en píxeles
+VARIANTES = {
+    'thumb': 160,
+    'card': 640,
+    'full': 1600,
+}
+
+FORMATOS = {
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+}
+if features.check('avif'):
+    FORMATOS['avif'] = {'format': 'AVIF', 'quality': 60}
+
+
+def _codificar(imagen, opciones):
+    salida = io.BytesIO()
+    # Sin exif= Pillow no escribe metadatos: la variante sale sin EXIF
+    imagen.save(salida, **opciones)
+    return salida.getvalue()
+
+
+def _rutas(variantes):
+    return {ruta for datos in variantes.values() for clave, ruta in datos.items() if clave != 'ancho'}
+
+
+def generar_variantes(foto):
+    """Crea los archivos de cada variante y devuelve el dict para FotoAnuncio.variantes"""
+    # Las variantes son propias de cada foto: van al storage común, no al
+    # de contenido (que comparte archivos entre fotos)
+    storage = default_storage
+    with foto.imagen.open('rb') as archivo:
+        original = Image.open(archivo)
+        # Aplicar la orientación del EXIF antes de descartarlo
+        original = ImageOps.exif_transpose(original).convert('RGB')
+
+    carpeta = posixpath.join(posixpath.dirname(foto.imagen.name), 'variantes', str(foto.pk))
+    variantes = {}
+    for nombre, lado in VARIANTES.items():
+        imagen = original.copy()
+        imagen.thumbnail((lado, lado), Image.Resampling.LANCZOS)
+        datos = {'ancho': imagen.width}
+        for extension, opciones in FORMATOS.items():
+            # El storage agrega el hash del contenido al nombre (ver iscort.media)
+            ruta = posixpath.join(carpeta, f'{nombre}.{extension}')
+            datos[extension] = storage.save(ruta, ContentFile(_codificar(imagen, opciones)))
+        variantes[nombre] = datos
+    return variantes
+
+
+@registrar('procesar_foto')
+def procesar_foto(foto_id):
+    """Tarea: genera y registra las variantes de una foto"""
+    foto = FotoAnuncio.objects.filter(pk=foto_id).first()
+    if foto is None:
+        return  # Se borró antes de procesarla
+    anteriores = _rutas(foto.variantes)
+    foto.variantes = generar_variantes(foto)
+    foto.save(update_fields=['variantes'])
+    # Si se reprocesó, las variantes viejas quedaron con otro nombre
+    for ruta in anteriores - _rutas(foto.variantes):
+        default_storage.delete(ruta)
@@ -0,0 +1,84 @@
+# accounts/listado_cache.py
+"""
+Caché HTTP de los listados públicos (iguales para todos los visitantes).
+Cada página se identifica por las filas que muestra: el ETag y el
+Last-Modified salen de (id, actualizado) de la página, así que cualquier
+cambio en un anuncio o en sus fotos (que tocan `Anuncio.actualizado`, ver
+signals) produce un validador nuevo sin tener que borrar nada a mano.
+"""
+
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+# Prefijo de la clave de la grilla renderizada (listado_grilla.html)
+FRAGMENTO_GRILLA = 'listado_grilla'
+
+
+def validadores(filas, siguiente_cursor):
+    """(etag, last_modified) de una página a partir de sus filas (id, creado, actualizado)"""
+    firma = hashlib.sha1()
+    for pk, _, actualizado in filas:
+        firma.update(f'{pk}:{actualizado.isoformat()};'.encode())
+    # La presencia del botón "Siguientes" también es parte de la página
+    firma.update(str(bool(siguiente_cursor)).encode())
+    last_modified = max((actualizado for _, _, actualizado in filas), default=None)
+    return f'"{firma.hexdigest()}"', last_modified
+
+
+def vary_on_grilla(request, etag):
+    """Lo que distingue a una grilla: categoría y ciudad (la ruta), página y contenido"""
+    return f"{request.path}|{request.GET.get('cursor', '')}|{etag}"
+
+
+def _clave_grilla(request, etag):
+    return make_template_fragment_key(FRAGMENTO_GRILLA, [vary_on_grilla(request, etag)])
+
+
+async def agrilla_cacheada(request, etag):
+    """HTML de la grilla de esta página si ya está en el caché de fragmentos, o None"""
+    return await cache.aget(_clave_grilla(request, etag))
+
+
+async def arenderizar_grilla(request, etag, anuncios):
+    """
+    Renderiza la grilla de `anuncios` y la guarda en el caché de fragmentos.
+    No se usa {% cache %} en la plantilla: el tag llama al caché de forma
+    síncrona y con DatabaseCache eso falla dentro de una vista async.
+    """
+    # La grilla es igual para todos los visitantes: se renderiza sin request
+    grilla = await sync_to_async(render_to_string)('listado_grilla.html', {'anuncios': anuncios})
+    await cache.aset(_clave_grilla(request, etag), grilla, getattr(settings, 'LISTADO_FRAGMENTO_TIMEOUT', 600))
+    return grilla
+
+
+def respuesta_condicional(request, etag, last_modified):
+    """HttpResponseNotModified si el cliente (o la CDN) ya tiene esta versión, o None"""
+    return get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified.timestamp()) if last_modified else None,
+    )
+
+
+def aplicar_cabeceras(response, etag, last_modified):
+    """ETag, Last-Modified y Cache-Control pensados para una CDN delante"""
+    response.headers['ETag'] = etag
+    if last_modified:
+        response.headers['Last-Modified'] = http_date(last_modified.timestamp())
+    # Navegadores y CDN revalidan pronto (un 304 es barato); mientras
+    # revalida, la CDN puede seguir sirviendo la copia anterior
+    patch_cache_control(
+        response,
+        public=True,
+        max_age=getattr(settings, 'LISTADO_CACHE_MAX_AGE', 30),
+        s_maxage=getattr(settings, 'LISTADO_CACHE_S_MAXAGE', 60),
+        stale_while_revalidate=getattr(settings, 'LISTADO_CACHE_STALE', 30),
+    )
+    return response
@@ -0,0 +1,49 @@
+# accounts/management/commands/procesar_tareas.py
+"""
+Worker de la cola de tareas en base de datos (accounts.tareas).
+Cada hilo del pool toma lotes con SKIP LOCKED, así se pueden correr
+varios procesos worker a la vez.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from accounts.tareas import ejecutar, tomar_tareas
+
+
+class Command(BaseCommand):
+    help = 'Procesa las tareas en segundo plano (imágenes, limpiezas) de la tabla Tarea'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Hilos del pool (default: 2)')
+        parser.add_argument('--lote', type=int, default=5, help='Tareas que toma cada hilo por vez')
+        parser.add_argument('--intervalo', type=float, default=5.0,
+                            help='Segundos de espera cuando la cola está vacía')
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Vacía la cola y termina en vez de quedarse escuchando')
+
+    def handle(self, *args, **options):
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            hilos = [pool.submit(self.trabajar, options) for _ in range(options['workers'])]
+            procesadas = sum(hilo.result() for hilo in hilos)
+        self.stdout.write(self.style.SUCCESS(f"{procesadas} tareas procesadas"))
+
+    def trabajar(self, options):
+        procesadas = 0
+        try:
+            while True:
+                close_old_connections()
+                tareas = tomar_tareas(options['lote'])
+                if not tareas:
+                    if options['una_vez']:
+                        return procesadas
+                    time.sleep(options['intervalo'])
+                    continue
+                for tarea in tareas:
+                    ejecutar(tarea)
+                    procesadas += 1
+        finally:
+            # Cada hilo abre su propia conexión
+            connection.close()
@@ -0,0 +1,26 @@
+# accounts/management/commands/reindexar_busqueda.py
+"""
+Reconstruye IndiceBusqueda desde los anuncios.
+Las señales lo mantienen al día; esto es para la carga inicial o si se
+cambian las reglas de indexación.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from accounts.busqueda import reindexar
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de búsqueda de texto completo de los anuncios'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Anuncios leídos e insertados por lote')
+
+    def handle(self, *args, **options):
+        inicio = time.monotonic()
+        total = reindexar(options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Índice de búsqueda reconstruido: {total} anuncios en {time.monotonic() - inicio:.2f}s"
+        ))
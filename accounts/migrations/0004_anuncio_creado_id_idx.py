@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_acompanante_plan'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='anuncio',
+            index=models.Index(fields=['-creado', '-id'], name='anuncio_creado_id_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def asignar_fotos_principales(apps, schema_editor):
+    Anuncio = apps.get_model('accounts', 'Anuncio')
+    FotoAnuncio = apps.get_model('accounts', 'FotoAnuncio')
+    Anuncio.objects.update(foto_principal=Subquery(
+        FotoAnuncio.objects.filter(anuncio=OuterRef('pk')).order_by('id').values('id')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_anuncio_creado_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='anuncio',
+            name='foto_principal',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='accounts.fotoanuncio'),
+        ),
+        migrations.RunPython(asignar_fotos_principales, migrations.RunPython.noop),
+    ]
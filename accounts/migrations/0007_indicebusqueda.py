@@ -0,0 +1,42 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from accounts.busqueda.backends import backend_para
+
+
+def instalar_texto_completo(apps, schema_editor):
+    backend_para(schema_editor.connection).instalar(schema_editor)
+
+
+def desinstalar_texto_completo(apps, schema_editor):
+    backend_para(schema_editor.connection).desinstalar(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_fotoanuncio_variantes_tarea'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndiceBusqueda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('titulo', models.CharField(max_length=100)),
+                ('cuerpo', models.TextField()),
+                ('ciudad', models.CharField(max_length=100)),
+                ('categoria', models.CharField(blank=True, max_length=50)),
+                ('banda_precio', models.CharField(max_length=20)),
+                ('banda_edad', models.CharField(blank=True, max_length=20)),
+                ('creado', models.DateTimeField()),
+                ('anuncio', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='indice_busqueda', to='accounts.anuncio')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ciudad', 'categoria'], name='busqueda_facetas_idx')],
+            },
+        ),
+        migrations.RunPython(instalar_texto_completo, desinstalar_texto_completo),
+    ]
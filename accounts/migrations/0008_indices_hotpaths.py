@@ -0,0 +1,22 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:52
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_indicebusqueda'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='anuncio',
+            index=models.Index(fields=['sexo', '-creado', '-id'], name='anuncio_sexo_creado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='anuncio',
+            index=models.Index(django.db.models.functions.text.Lower('ciudad'), models.F('sexo'), models.OrderBy(models.F('creado'), descending=True), models.OrderBy(models.F('id'), descending=True), name='anuncio_ciudad_sexo_creado_idx'),
+        ),
+    ]
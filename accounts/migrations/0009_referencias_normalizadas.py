@@ -0,0 +1,121 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Q
+from django.utils.text import slugify
+
+from accounts.paises.ecuador import CIUDADES_PRINCIPALES
+
+CATEGORIAS = [
+    ('escorts-femeninos', 'Escort Femenino', ['mujer', 'femenino']),
+    ('escorts-masculinos', 'Escort Masculino', ['hombre', 'masculino']),
+    ('trans-travestis', 'Trans y Travestis', ['trans', 'travesti']),
+]
+
+
+def normalizar(apps, schema_editor):
+    Pais = apps.get_model('accounts', 'Pais')
+    Ciudad = apps.get_model('accounts', 'Ciudad')
+    Categoria = apps.get_model('accounts', 'Categoria')
+    Anuncio = apps.get_model('accounts', 'Anuncio')
+
+    ecuador, _ = Pais.objects.get_or_create(slug='ecuador', defaults={'nombre': 'Ecuador'})
+    for nombre in CIUDADES_PRINCIPALES:
+        Ciudad.objects.get_or_create(pais=ecuador, slug=slugify(nombre), defaults={'nombre': nombre})
+
+    for slug, nombre, sexos in CATEGORIAS:
+        categoria, _ = Categoria.objects.get_or_create(slug=slug, defaults={'nombre': nombre})
+        coincide = Q()
+        for sexo in sexos:
+            coincide |= Q(sexo__iexact=sexo)
+        Anuncio.objects.filter(coincide).update(categoria=categoria)
+
+    # Un UPDATE por cada combinación distinta de país y ciudad escrita a mano
+    for nombre_pais, nombre_ciudad in Anuncio.objects.values_list('pais', 'ciudad').distinct():
+        slug_ciudad = slugify(nombre_ciudad)
+        if not slug_ciudad:
+            continue
+        pais, _ = Pais.objects.get_or_create(
+            slug=slugify(nombre_pais or 'Ecuador'), defaults={'nombre': (nombre_pais or 'Ecuador').strip()}
+        )
+        ciudad, _ = Ciudad.objects.get_or_create(
+            pais=pais, slug=slug_ciudad, defaults={'nombre': nombre_ciudad.strip()}
+        )
+        Anuncio.objects.filter(pais=nombre_pais, ciudad=nombre_ciudad).update(ciudad_ref=ciudad)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_indices_hotpaths'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Categoria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slug', models.SlugField(unique=True)),
+                ('nombre', models.CharField(max_length=50)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Ciudad',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100)),
+                ('slug', models.SlugField(max_length=100)),
+            ],
+            options={
+                'ordering': ['nombre'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Pais',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=50, unique=True)),
+                ('slug', models.SlugField(unique=True)),
+            ],
+            options={
+                'ordering': ['nombre'],
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='anuncio',
+            name='anuncio_sexo_creado_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='anuncio',
+            name='anuncio_ciudad_sexo_creado_idx',
+        ),
+        migrations.AddField(
+            model_name='anuncio',
+            name='categoria',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='anuncios', to='accounts.categoria'),
+        ),
+        migrations.AddField(
+            model_name='anuncio',
+            name='ciudad_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='anuncios', to='accounts.ciudad'),
+        ),
+        migrations.AddIndex(
+            model_name='anuncio',
+            index=models.Index(fields=['categoria', '-creado', '-id'], name='anuncio_categoria_creado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='anuncio',
+            index=models.Index(fields=['ciudad_ref', 'categoria', '-creado', '-id'], name='anuncio_ciudad_categoria_idx'),
+        ),
+        migrations.AddField(
+            model_name='ciudad',
+            name='pais',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='ciudades', to='accounts.pais'),
+        ),
+        migrations.AddConstraint(
+            model_name='ciudad',
+            constraint=models.UniqueConstraint(fields=('pais', 'slug'), name='ciudad_unica_por_pais'),
+        ),
+        migrations.RunPython(normalizar, migrations.RunPython.noop),
+    ]
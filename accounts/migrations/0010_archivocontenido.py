@@ -0,0 +1,44 @@
+# Generated by Django 5.2.1 on 2026-10-18 16:12
+
+import iscort.media
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def contar_referencias(apps, schema_editor):
+    """Las fotos ya subidas conservan su nombre; solo se cuentan sus referencias"""
+    FotoAnuncio = apps.get_model('accounts', 'FotoAnuncio')
+    ArchivoContenido = apps.get_model('accounts', 'ArchivoContenido')
+    usos = FotoAnuncio.objects.values('imagen').annotate(total=Count('id')).order_by()
+    ArchivoContenido.objects.bulk_create(
+        [ArchivoContenido(nombre=uso['imagen'], referencias=uso['total']) for uso in usos if uso['imagen']],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_referencias_normalizadas'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='fotoanuncio',
+            name='imagen',
+            field=models.ImageField(storage=iscort.media.almacenamiento_fotos, upload_to='anuncios_fotos/'),
+        ),
+        migrations.CreateModel(
+            name='ArchivoContenido',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=255, unique=True)),
+                ('referencias', models.PositiveIntegerField(default=0)),
+                ('sin_referencias_desde', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('referencias', 0)), fields=['sin_referencias_desde'], name='archivo_huerfano_idx')],
+            },
+        ),
+        migrations.RunPython(contar_referencias, migrations.RunPython.noop),
+    ]
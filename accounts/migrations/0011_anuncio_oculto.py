@@ -0,0 +1,42 @@
+# Generated by Django 5.2.1 on 2026-10-18 16:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_archivocontenido'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='anuncio',
+            name='anuncio_creado_id_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='anuncio',
+            name='anuncio_categoria_creado_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='anuncio',
+            name='anuncio_ciudad_categoria_idx',
+        ),
+        migrations.AddField(
+            model_name='anuncio',
+            name='oculto',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='anuncio',
+            index=models.Index(condition=models.Q(('oculto', False)), fields=['-creado', '-id'], name='anuncio_creado_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='anuncio',
+            index=models.Index(condition=models.Q(('oculto', False)), fields=['categoria', '-creado', '-id'], name='anuncio_categoria_creado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='anuncio',
+            index=models.Index(condition=models.Q(('oculto', False)), fields=['ciudad_ref', 'categoria', '-creado', '-id'], name='anuncio_ciudad_categoria_idx'),
+        ),
+    ]
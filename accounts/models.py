@@ -1,5 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
+from iscort.media import almacenamiento_fotos
 
 class Acompanante(AbstractUser):
     # Datos básicos originales
@@ -13,9 +15,60 @@ class Acompanante(AbstractUser):
     ]
     plan = models.CharField(max_length=10, choices=PLAN_CHOICES, default='basico')
 
+    @property
+    def max_fotos(self):
+        """Fotos permitidas por anuncio según el plan"""
+        return 1 if self.plan == 'basico' else 10
+
     def __str__(self):
         return self.username
 
+# Valores libres de Anuncio.sexo que corresponden a cada Categoria (por slug)
+SEXOS_POR_CATEGORIA = {
+    'escorts-femeninos': ['mujer', 'femenino'],
+    'escorts-masculinos': ['hombre', 'masculino'],
+    'trans-travestis': ['trans', 'travesti'],
+}
+
+class Pais(models.Model):
+    nombre = models.CharField(max_length=50, unique=True)
+    slug = models.SlugField(max_length=50, unique=True)
+
+    class Meta:
+        ordering = ['nombre']
+
+    def __str__(self):
+        return self.nombre
+
+class Ciudad(models.Model):
+    pais = models.ForeignKey(Pais, on_delete=models.PROTECT, related_name='ciudades')
+    nombre = models.CharField(max_length=100)
+    slug = models.SlugField(max_length=100)
+
+    class Meta:
+        ordering = ['nombre']
+        constraints = [
+            models.UniqueConstraint(fields=['pais', 'slug'], name='ciudad_unica_por_pais'),
+        ]
+
+    def __str__(self):
+        return self.nombre
+
+class Categoria(models.Model):
+    slug = models.SlugField(max_length=50, unique=True)
+    nombre = models.CharField(max_length=50)
+
+    def __str__(self):
+        return self.nombre
+
+VISIBLE = models.Q(oculto=False)
+
+class AnuncioManager(models.Manager):
+    """Anuncios visibles: los ocultos esperan su borrado en segundo plano (accounts/eliminacion.py)"""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(VISIBLE)
+
 class Anuncio(models.Model):
     # Campos originales únicamente
     usuario = models.ForeignKey(Acompanante, on_delete=models.CASCADE, related_name='anuncios')
@@ -27,14 +80,136 @@ class Anuncio(models.Model):
     sexo = models.CharField(max_length=20)
     creado = models.DateTimeField(auto_now_add=True)
     actualizado = models.DateTimeField(auto_now=True)
+    # Referencias normalizadas de `ciudad`/`pais` y `sexo`; las asigna accounts.signals al guardar
+    ciudad_ref = models.ForeignKey(Ciudad, null=True, blank=True, on_delete=models.PROTECT, related_name='anuncios')
+    categoria = models.ForeignKey(Categoria, null=True, blank=True, on_delete=models.PROTECT, related_name='anuncios')
+    # Primera foto del anuncio; la mantienen las señales de FotoAnuncio
+    foto_principal = models.ForeignKey(
+        'FotoAnuncio', null=True, blank=True, on_delete=models.SET_NULL, related_name='+'
+    )
+    # Marcado para borrar: deja de verse ya y se purga en segundo plano
+    oculto = models.BooleanField(default=False)
+
+    objects = AnuncioManager()
+    todos = models.Manager()
+
+    class Meta:
+        indexes = [
+            # Paginación por cursor de los listados. Solo anuncios visibles: el
+            # manager por defecto siempre filtra oculto=False
+            models.Index(fields=['-creado', '-id'], name='anuncio_creado_id_idx', condition=VISIBLE),
+            # Listados por categoría y por ciudad + categoría
+            models.Index(fields=['categoria', '-creado', '-id'], name='anuncio_categoria_creado_idx', condition=VISIBLE),
+            models.Index(
+                fields=['ciudad_ref', 'categoria', '-creado', '-id'], name='anuncio_ciudad_categoria_idx', condition=VISIBLE,
+            ),
+        ]
 
     def __str__(self):
         return f"{self.titulo} - {self.usuario.username}"
 
 class FotoAnuncio(models.Model):
     anuncio = models.ForeignKey(Anuncio, on_delete=models.CASCADE, related_name='fotos')
-    imagen = models.ImageField(upload_to='anuncios_fotos/')
+    # Almacenamiento por contenido: fotos iguales comparten archivo (ver ArchivoContenido)
+    imagen = models.ImageField(upload_to='anuncios_fotos/', storage=almacenamiento_fotos)
     subida = models.DateTimeField(auto_now_add=True)
+    # {variante: {formato: ruta, 'ancho': px}}; lo llena accounts.imagenes en segundo plano
+    variantes = models.JSONField(default=dict, blank=True)
+
+    def _srcset(self, formato):
+        storage = self.imagen.storage
+        return ', '.join(
+            f"{storage.url(datos[formato])} {datos['ancho']}w"
+            for datos in self.variantes.values() if formato in datos
+        )
+
+    @property
+    def srcset_jpeg(self):
+        return self._srcset('jpeg')
+
+    @property
+    def srcset_webp(self):
+        return self._srcset('webp')
+
+    @property
+    def srcset_avif(self):
+        return self._srcset('avif')
+
+    @property
+    def url_optimizada(self):
+        """Variante 'card' en JPEG; el original mientras no se haya procesado"""
+        card = self.variantes.get('card')
+        return self.imagen.storage.url(card['jpeg']) if card else self.imagen.url
 
     def __str__(self):
         return f"Foto de {self.anuncio.titulo} ({self.id})"
+
+class ArchivoContenido(models.Model):
+    """
+    Archivo de AlmacenamientoContenido y cuántas FotoAnuncio lo usan.
+    Los que quedan en cero se borran en segundo plano (accounts/archivos.py).
+    """
+    nombre = models.CharField(max_length=255, unique=True)  # Igual a FotoAnuncio.imagen
+    referencias = models.PositiveIntegerField(default=0)
+    sin_referencias_desde = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['sin_referencias_desde'], name='archivo_huerfano_idx',
+                         condition=models.Q(referencias=0)),
+        ]
+
+    def __str__(self):
+        return f"{self.nombre} ({self.referencias})"
+
+class Tarea(models.Model):
+    """Cola de trabajos en segundo plano respaldada por la base de datos (ver accounts/tareas.py)"""
+    PENDIENTE = 'pendiente'
+    EN_PROCESO = 'en_proceso'
+    FALLIDA = 'fallida'
+
+    tipo = models.CharField(max_length=50)
+    datos = models.JSONField(default=dict)
+    estado = models.CharField(max_length=20, default=PENDIENTE, choices=[
+        (PENDIENTE, 'Pendiente'),
+        (EN_PROCESO, 'En proceso'),
+        (FALLIDA, 'Fallida'),
+    ])
+    intentos = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    creada = models.DateTimeField(auto_now_add=True)
+    disponible_desde = models.DateTimeField(default=timezone.now)
+    tomada_en = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['estado', 'disponible_desde'], name='tarea_pendientes_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} #{self.id} ({self.estado})"
+
+
+class IndiceBusqueda(models.Model):
+    """
+    Documento de búsqueda desnormalizado de un anuncio (ver accounts/busqueda).
+    El índice de texto completo (tsvector/GIN o FTS5) lo crea la migración
+    según el motor de base de datos.
+    """
+    anuncio = models.OneToOneField(Anuncio, on_delete=models.CASCADE, related_name='indice_busqueda')
+    titulo = models.CharField(max_length=100)
+    cuerpo = models.TextField()  # descripción + servicios + barrio
+    # Facetas
+    ciudad = models.CharField(max_length=100)  # En minúsculas
+    categoria = models.CharField(max_length=50, blank=True)
+    banda_precio = models.CharField(max_length=20)
+    banda_edad = models.CharField(max_length=20, blank=True)
+    creado = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ciudad', 'categoria'], name='busqueda_facetas_idx'),
+        ]
+
+    def __str__(self):
+        return f"Índice de {self.titulo}"
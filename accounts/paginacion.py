@@ -0,0 +1,80 @@
+# accounts/paginacion.py
+"""
+Paginación por cursor (keyset) sobre (creado, id).
+El costo de cada página no depende de qué tan adentro del listado esté.
+"""
+
+import base64
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+
+
+def codificar_cursor(anuncio):
+    """Cursor estable para la página que empieza después de `anuncio`"""
+    return _codificar(anuncio.creado, anuncio.pk)
+
+
+def _codificar(creado, pk):
+    crudo = f"{creado.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Devuelve (creado, id) o None si el cursor no es válido"""
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        creado, pk = base64.urlsafe_b64decode(cursor + relleno).decode().split('|')
+        return datetime.fromisoformat(creado), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def tamano_pagina(request):
+    """Tamaño pedido en ?por_pagina=, acotado por LISTADO_TAMANO_MAXIMO"""
+    por_defecto = getattr(settings, 'LISTADO_TAMANO_PAGINA', 24)
+    try:
+        tamano = int(request.GET.get('por_pagina', por_defecto))
+    except ValueError:
+        tamano = por_defecto
+    return max(1, min(tamano, getattr(settings, 'LISTADO_TAMANO_MAXIMO', 100)))
+
+
+def _pagina(queryset, cursor, tamano):
+    """Queryset de la página que sigue a `cursor`, con un elemento extra para saber si hay otra"""
+    queryset = queryset.order_by('-creado', '-id')
+    posicion = decodificar_cursor(cursor) if cursor else None
+    if posicion:
+        creado, pk = posicion
+        queryset = queryset.filter(Q(creado__lt=creado) | Q(creado=creado, id__lt=pk))
+    return queryset[:tamano + 1]
+
+
+def _cortar(elementos, tamano, cursor_de=codificar_cursor):
+    if len(elementos) > tamano:
+        elementos = elementos[:tamano]
+        return elementos, cursor_de(elementos[-1])
+    return elementos, None
+
+
+def paginar_keyset(queryset, cursor=None, tamano=24):
+    """
+    Devuelve (elementos, siguiente_cursor) para `queryset` ordenado por
+    (-creado, -id). siguiente_cursor es None en la última página.
+    """
+    return _cortar(list(_pagina(queryset, cursor, tamano)), tamano)
+
+
+async def apaginar_keyset(queryset, cursor=None, tamano=24):
+    """Versión async de paginar_keyset para las vistas ASGI"""
+    return _cortar([elemento async for elemento in _pagina(queryset, cursor, tamano)], tamano)
+
+
+async def afilas_keyset(queryset, cursor=None, tamano=24):
+    """
+    Como apaginar_keyset pero solo trae (id, creado, actualizado) de cada fila:
+    alcanza para validar cachés y armar el siguiente cursor sin cargar los anuncios.
+    """
+    filas = _pagina(queryset, cursor, tamano).values_list('id', 'creado', 'actualizado')
+    return _cortar([fila async for fila in filas], tamano, lambda fila: _codificar(fila[1], fila[0]))
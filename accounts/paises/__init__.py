@@ -1,8 +1,4 @@
 # accounts/paises/__init__.py
-
-def get_ciudades_por_pais(pais):
-    if pais == "ecuador":
-        from .ecuador import CIUDADES_PRINCIPALES
-        return CIUDADES_PRINCIPALES
-    # Aquí puedes agregar más países en el futuro
-    return []
+# Listas semilla de ciudades por país. La migración 0009 las carga en
+# Pais/Ciudad; en tiempo de ejecución se consultan con accounts.catalogo.
+# Las coordenadas (COORDENADAS) las usa accounts.cercania.
@@ -5,3 +5,31 @@ CIUDADES_PRINCIPALES = [
     "Tena", "Puyo", "Nueva Loja", "Macas", "Zamora", "Orellana", "Azogues",
     "Latacunga", "Guaranda", "Santa Elena", "San Cristóbal"
 ]
+
+# (latitud, longitud) del centro de cada ciudad, para la búsqueda por cercanía
+COORDENADAS = {
+    "Quito": (-0.1807, -78.4678),
+    "Guayaquil": (-2.1709, -79.9224),
+    "Cuenca": (-2.9005, -79.0045),
+    "Ambato": (-1.2491, -78.6168),
+    "Portoviejo": (-1.0546, -80.4545),
+    "Machala": (-3.2581, -79.9554),
+    "Loja": (-3.9931, -79.2042),
+    "Riobamba": (-1.6636, -78.6546),
+    "Ibarra": (0.3517, -78.1223),
+    "Babahoyo": (-1.8022, -79.5344),
+    "Santo Domingo": (-0.2530, -79.1754),
+    "Esmeraldas": (0.9682, -79.6517),
+    "Tulcán": (0.8118, -77.7173),
+    "Tena": (-0.9938, -77.8129),
+    "Puyo": (-1.4924, -78.0024),
+    "Nueva Loja": (0.0847, -76.8828),
+    "Macas": (-2.3087, -78.1114),
+    "Zamora": (-4.0692, -78.9567),
+    "Orellana": (-0.4625, -76.9842),
+    "Azogues": (-2.7397, -78.8486),
+    "Latacunga": (-0.9352, -78.6155),
+    "Guaranda": (-1.5926, -79.0010),
+    "Santa Elena": (-2.2262, -80.8587),
+    "San Cristóbal": (-0.9017, -89.6103),
+}
@@ -0,0 +1,52 @@
+# accounts/publicacion.py
+"""
+Publicación de anuncios sin sesión.
+Los datos del primer paso viajan firmados en el formulario de fotos (no se
+escriben en la sesión de base de datos) y el anuncio se crea junto con todas
+sus fotos en una sola transacción.
+"""
+
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from . import archivos
+from .forms import AnuncioForm
+from .models import Anuncio, FotoAnuncio
+from .tareas import encolar_lote
+
+SAL_BORRADOR = 'accounts.publicacion.borrador'
+
+
+def firmar_borrador(datos):
+    """Token firmado con los campos del anuncio, para el campo oculto `borrador`"""
+    campos = {campo: datos.get(campo, '') for campo in AnuncioForm.Meta.fields}
+    return signing.dumps(campos, salt=SAL_BORRADOR, compress=True)
+
+
+def leer_borrador(token):
+    """Datos del borrador, o None si la firma no es válida o venció"""
+    try:
+        return signing.loads(token, salt=SAL_BORRADOR, max_age=getattr(settings, 'BORRADOR_MAX_AGE', 86400))
+    except signing.BadSignature:
+        return None
+
+
+def publicar(usuario, form, nombres_fotos):
+    """
+    Crea el anuncio de `form` (ya validado) con sus fotos, que el upload
+    handler dejó en el storage. bulk_create no envía post_save, así que lo que
+    hacen las señales de FotoAnuncio (portada, procesar_foto y referencias a
+    los archivos) se hace acá.
+    """
+    with transaction.atomic():
+        anuncio = form.save(commit=False)
+        anuncio.usuario = usuario
+        anuncio.save()
+        fotos = FotoAnuncio.objects.bulk_create(
+            [FotoAnuncio(anuncio=anuncio, imagen=nombre) for nombre in nombres_fotos]
+        )
+        anuncio.foto_principal = fotos[0]
+        Anuncio.objects.filter(pk=anuncio.pk).update(foto_principal=fotos[0])
+        encolar_lote('procesar_foto', [{'foto_id': foto.pk} for foto in fotos])
+        archivos.sumar(nombres_fotos)
+    return anuncio
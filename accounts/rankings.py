@@ -7,7 +7,8 @@ Maneja toda la lógica de rankings y top lists
 from django.db.models import Avg, Count, Q
 from django.utils import timezone
 from datetime import timedelta
-from .models import Anuncio, Acompanante, Calificacion
+from .models import Anuncio, Acompanante
+from rankings.models import Calificacion
 
 class RankingManager:
     """Clase para manejar todos los rankings de la plataforma"""
@@ -120,19 +121,10 @@ class RankingManager:
     
     @staticmethod
     def actualizar_rankings_automatico():
-        """Actualiza automáticamente los rankings de todos los anuncios"""
-        anuncios = Anuncio.objects.filter(activo=True)
-        
-        for anuncio in anuncios:
-            # Actualizar puntuación del anuncio
-            anuncio.actualizar_puntuacion()
-            
-            # Actualizar ranking del usuario
-            usuario = anuncio.usuario
-            usuario.puntuacion_ranking = usuario.calcular_ranking()
-            usuario.save()
-        
-        print(f"Rankings actualizados para {anuncios.count()} anuncios")
+        """Actualiza automáticamente los rankings de todos los perfiles"""
+        from rankings.rankings_manager import RankingManager as RankingPerfiles
+        resultado = RankingPerfiles.actualizar_rankings_automatico()
+        print(f"Rankings actualizados para {resultado['perfiles']} perfiles")
 
 class RankingDisplay:
     """Clase para formatear datos de rankings para mostrar en templates"""
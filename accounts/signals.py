@@ -0,0 +1,104 @@
+# accounts/signals.py
+"""
+Señales de la app accounts
+"""
+
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from . import archivos, catalogo
+from .busqueda import indexar_anuncio
+from .home_cache import invalidar_home_payload
+from .models import Anuncio, Categoria, Ciudad, FotoAnuncio, Pais
+from .tareas import encolar
+
+
+@receiver(post_save, sender=Anuncio)
+@receiver(post_delete, sender=Anuncio)
+@receiver(post_save, sender=FotoAnuncio)
+@receiver(post_delete, sender=FotoAnuncio)
+@receiver(post_save, sender='rankings.Calificacion')
+@receiver(post_delete, sender='rankings.Calificacion')
+def invalidar_home_al_cambiar(sender, **kwargs):
+    """Invalida el payload del home cuando cambia algo que se muestra en él"""
+    # Después del commit, para no volver a cachear datos que aún no son visibles
+    transaction.on_commit(invalidar_home_payload)
+
+
+@receiver(post_save, sender=FotoAnuncio)
+@receiver(post_delete, sender=FotoAnuncio)
+def tocar_anuncio_de_foto(sender, instance, **kwargs):
+    """
+    Un cambio de fotos cambia cómo se ve el anuncio: se actualiza
+    `actualizado` para que el ETag de los listados y su caché de fragmentos
+    (accounts.listado_cache) queden viejos
+    """
+    Anuncio.objects.filter(pk=instance.anuncio_id).update(actualizado=timezone.now())
+
+
+@receiver(post_save, sender=FotoAnuncio)
+def asignar_foto_principal(sender, instance, created, **kwargs):
+    """La primera foto subida pasa a ser la portada del anuncio"""
+    if created:
+        Anuncio.objects.filter(
+            pk=instance.anuncio_id, foto_principal__isnull=True
+        ).update(foto_principal=instance)
+
+
+@receiver(post_save, sender=FotoAnuncio)
+def encolar_procesamiento_foto(sender, instance, created, **kwargs):
+    """Las variantes (thumb/card/full, WebP/AVIF) se generan fuera del request"""
+    if created:
+        encolar('procesar_foto', foto_id=instance.pk)
+
+
+@receiver(post_delete, sender=FotoAnuncio)
+def reemplazar_foto_principal(sender, instance, **kwargs):
+    """Si se borró la portada (SET_NULL), se toma la siguiente foto del anuncio"""
+    Anuncio.objects.filter(
+        pk=instance.anuncio_id, foto_principal__isnull=True
+    ).update(foto_principal=Subquery(
+        FotoAnuncio.objects.filter(anuncio=OuterRef('pk')).order_by('id').values('id')[:1]
+    ))
+
+
+@receiver(post_save, sender=FotoAnuncio)
+def sumar_referencia_archivo(sender, instance, created, **kwargs):
+    """Cada foto es una referencia a su archivo (puede compartirlo con otras)"""
+    if created and instance.imagen:
+        archivos.sumar([instance.imagen.name])
+
+
+@receiver(post_delete, sender=FotoAnuncio)
+def restar_referencia_archivo(sender, instance, **kwargs):
+    """El archivo no se borra acá: si quedó sin referencias lo recolecta una tarea"""
+    if instance.imagen:
+        archivos.restar([instance.imagen.name])
+
+
+@receiver(post_save, sender=Anuncio)
+@receiver(post_save, sender='rankings.AnuncioExtendido')
+def indexar_para_busqueda(sender, instance, **kwargs):
+    """Mantiene al día el documento de IndiceBusqueda del anuncio"""
+    anuncio_id = instance.pk if sender is Anuncio else instance.anuncio_id
+    transaction.on_commit(lambda: indexar_anuncio(anuncio_id))
+
+
+@receiver(pre_save, sender=Anuncio)
+def normalizar_referencias(sender, instance, **kwargs):
+    """Resuelve `ciudad`/`pais` y `sexo` (texto libre) a sus filas de referencia"""
+    instance.ciudad_ref = catalogo.ciudad(instance.pais, instance.ciudad, crear=True)
+    instance.categoria = catalogo.categoria(instance.sexo)
+
+
+@receiver(post_save, sender=Pais)
+@receiver(post_delete, sender=Pais)
+@receiver(post_save, sender=Ciudad)
+@receiver(post_delete, sender=Ciudad)
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+def invalidar_catalogo(sender, **kwargs):
+    """La copia en memoria de este proceso se recarga en la próxima consulta"""
+    catalogo.invalidar()
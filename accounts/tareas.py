@@ -0,0 +1,96 @@
+# accounts/tareas.py
+"""
+Cola de tareas en segundo plano sobre la tabla Tarea (sin broker externo).
+Los workers (`manage.py procesar_tareas`) toman lotes con
+SELECT ... FOR UPDATE SKIP LOCKED, así varios procesos no se pisan.
+"""
+
+import logging
+import traceback
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import Tarea
+
+logger = logging.getLogger(__name__)
+
+MAX_INTENTOS = 3
+# Una tarea en proceso por más de esto se considera abandonada (worker caído)
+TIEMPO_MAXIMO = timedelta(minutes=10)
+
+MANEJADORES = {}
+
+
+def registrar(tipo):
+    """Decorador: registra la función que ejecuta las tareas de `tipo`"""
+    def decorador(funcion):
+        MANEJADORES[tipo] = funcion
+        return funcion
+    return decorador
+
+
+def encolar(tipo, demora=None, **datos):
+    """Crea la tarea dentro de la transacción actual; se ve al hacer commit"""
+    if demora is None:
+        return Tarea.objects.create(tipo=tipo, datos=datos)
+    return Tarea.objects.create(tipo=tipo, datos=datos, disponible_desde=timezone.now() + demora)
+
+
+def encolar_lote(tipo, lista_datos):
+    """Como encolar, pero con un solo INSERT para todas las tareas"""
+    return Tarea.objects.bulk_create([Tarea(tipo=tipo, datos=datos) for datos in lista_datos])
+
+
+def tomar_tareas(limite=10):
+    """Marca como en proceso hasta `limite` tareas disponibles y las devuelve"""
+    ahora = timezone.now()
+    with transaction.atomic():
+        tareas = list(Tarea.objects.select_for_update(skip_locked=True).filter(
+            Q(estado=Tarea.PENDIENTE, disponible_desde__lte=ahora)
+            | Q(estado=Tarea.EN_PROCESO, tomada_en__lt=ahora - TIEMPO_MAXIMO)
+        ).order_by('id')[:limite])
+        # Una tarea abandonada cuenta como intento fallido: si es ella la que tira
+        # abajo al worker (p. ej. sin memoria), no se reintenta para siempre
+        abandonadas = [tarea for tarea in tareas if tarea.estado == Tarea.EN_PROCESO]
+        for tarea in abandonadas:
+            tarea.intentos += 1
+        agotadas = [tarea for tarea in abandonadas if tarea.intentos >= MAX_INTENTOS]
+        if agotadas:
+            logger.error("Tareas abandonadas %s veces, quedan fallidas: %s", MAX_INTENTOS, agotadas)
+            Tarea.objects.filter(pk__in=[tarea.pk for tarea in agotadas]).update(
+                estado=Tarea.FALLIDA, intentos=MAX_INTENTOS,
+                error='El worker no terminó la tarea en el tiempo máximo',
+            )
+        tareas = [tarea for tarea in tareas if tarea not in agotadas]
+        Tarea.objects.filter(pk__in=[tarea.pk for tarea in abandonadas if tarea in tareas]).update(
+            intentos=F('intentos') + 1
+        )
+        Tarea.objects.filter(pk__in=[tarea.pk for tarea in tareas]).update(
+            estado=Tarea.EN_PROCESO, tomada_en=ahora
+        )
+    return tareas
+
+
+def ejecutar(tarea):
+    """Ejecuta una tarea; si falla la reprograma con espera exponencial"""
+    manejador = MANEJADORES.get(tarea.tipo)
+    try:
+        if manejador is None:
+            raise LookupError(f"No hay manejador registrado para '{tarea.tipo}'")
+        manejador(**tarea.datos)
+    except Exception:
+        intentos = tarea.intentos + 1
+        agotada = manejador is None or intentos >= MAX_INTENTOS
+        logger.exception("Falló la tarea %s (intento %s)", tarea, intentos)
+        Tarea.objects.filter(pk=tarea.pk).update(
+            estado=Tarea.FALLIDA if agotada else Tarea.PENDIENTE,
+            intentos=intentos,
+            error=traceback.format_exc(),
+            disponible_desde=timezone.now() + timedelta(minutes=2 ** intentos),
+        )
+        return False
+    # Las tareas terminadas no se conservan
+    Tarea.objects.filter(pk=tarea.pk).delete()
+    return True
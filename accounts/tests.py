@@ -1,3 +1,672 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlsplit
 
-# Create your tests here.
+from PIL import Image
+
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.utils import timezone
+
+from iscort.middleware import MetricasConsultas
+from rankings.models import AnuncioExtendido, Calificacion, PerfilExtendido, RankingSnapshot
+from rankings.rankings_manager import RankingDisplay, RankingManager
+
+from . import catalogo, cercania
+from .archivos import TAREA_RECOLECTAR, recolectar
+from .busqueda import buscar, reindexar
+from .eliminacion import TAREA_ANUNCIOS, eliminar_anuncios, eliminar_usuario, purgar_usuario
+from .home_cache import HOME_CACHE_KEY
+from .imagenes import procesar_foto
+from .models import Acompanante, Anuncio, ArchivoContenido, Categoria, Ciudad, FotoAnuncio, IndiceBusqueda, Tarea
+from .publicacion import firmar_borrador, leer_borrador
+from .tareas import TIEMPO_MAXIMO, ejecutar, tomar_tareas
+
+
+def crear_anuncio(usuario, **kwargs):
+    datos = {
+        'titulo': 'Anuncio',
+        'descripcion': 'Descripción',
+        'ciudad': 'Quito',
+        'precio': 50,
+        'sexo': 'mujer',
+    }
+    datos.update(kwargs)
+    return Anuncio.objects.create(usuario=usuario, **datos)
+
+
+def crear_foto(anuncio):
+    return FotoAnuncio.objects.create(
+        anuncio=anuncio, imagen=SimpleUploadedFile('foto.jpg', b'jpg', content_type='image/jpeg')
+    )
+
+
+class HomeCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = Acompanante.objects.create_user(username='ana', password='x')
+        crear_anuncio(self.usuario)
+
+    def test_home_sin_consultas_con_cache_caliente(self):
+        self.client.get('/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['estadisticas']['total_escorts'], 1)
+
+    def test_guardar_anuncio_invalida_cache(self):
+        self.client.get('/')
+        self.assertIsNotNone(cache.get(HOME_CACHE_KEY))
+        with self.captureOnCommitCallbacks(execute=True):
+            crear_anuncio(self.usuario, ciudad='Cuenca')
+        self.assertIsNone(cache.get(HOME_CACHE_KEY))
+        response = self.client.get('/')
+        self.assertEqual(response.context['estadisticas']['total_ciudades'], 2)
+
+
+class ListadoKeysetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        usuario = Acompanante.objects.create_user(username='ana', password='x')
+        self.anuncios = [crear_anuncio(usuario, titulo=f'A{i}') for i in range(7)]
+
+    def test_recorre_todas_las_paginas_sin_repetir(self):
+        vistos, cursor = [], None
+        while True:
+            url = '/publicaciones/?por_pagina=3' + (f'&cursor={cursor}' if cursor else '')
+            response = self.client.get(url)
+            vistos += [anuncio.pk for anuncio in response.context['anuncios']]
+            cursor = response.context['siguiente_cursor']
+            if not cursor:
+                break
+        self.assertEqual(vistos, [anuncio.pk for anuncio in reversed(self.anuncios)])
+
+    def test_cursor_invalido_vuelve_a_la_primera_pagina(self):
+        response = self.client.get('/publicaciones/?cursor=no-valido')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['anuncios']), 7)
+
+
+class FotoPrincipalTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        ajustes = override_settings(MEDIA_ROOT=self.media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        cache.clear()
+        self.usuario = Acompanante.objects.create_user(username='ana', password='x')
+
+    def test_portada_se_mantiene_al_subir_y_borrar(self):
+        anuncio = crear_anuncio(self.usuario)
+        primera, segunda = crear_foto(anuncio), crear_foto(anuncio)
+        anuncio.refresh_from_db()
+        self.assertEqual(anuncio.foto_principal, primera)
+        primera.delete()
+        anuncio.refresh_from_db()
+        self.assertEqual(anuncio.foto_principal, segunda)
+        segunda.delete()
+        anuncio.refresh_from_db()
+        self.assertIsNone(anuncio.foto_principal)
+
+    def test_listados_con_consultas_constantes(self):
+        for i in range(12):
+            anuncio = crear_anuncio(self.usuario, titulo=f'A{i}')
+            crear_foto(anuncio)
+            crear_foto(anuncio)
+        for por_pagina in (2, 12):
+            # validadores de la página + la página (la grilla todavía no está en caché)
+            with self.assertNumQueries(2):
+                self.client.get(f'/publicaciones/?por_pagina={por_pagina}')
+        self.client.force_login(self.usuario)
+        # sesión + usuario + anuncios + fotos
+        with self.assertNumQueries(4):
+            self.client.get('/mis-anuncios/')
+
+
+class ListadoCacheHttpTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        usuario = Acompanante.objects.create_user(username='ana', password='x')
+        self.anuncios = [crear_anuncio(usuario, titulo=f'A{i}') for i in range(3)]
+
+    def test_etag_y_304(self):
+        response = self.client.get('/publicaciones/')
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('s-maxage=', response['Cache-Control'])
+        self.assertTrue(response.has_header('Last-Modified'))
+        with self.assertNumQueries(1):
+            condicional = self.client.get('/publicaciones/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(condicional.status_code, 304)
+        self.assertEqual(condicional['ETag'], response['ETag'])
+
+    def test_grilla_desde_cache_de_fragmentos(self):
+        self.client.get('/publicaciones/')
+        with self.assertNumQueries(1):
+            response = self.client.get('/publicaciones/')
+        self.assertContains(response, 'A2')
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'iscort_cache_tests',
+    }})
+    def test_grilla_fria_con_cache_en_base_de_datos(self):
+        # El caché de producción es síncrono por dentro: la vista async no
+        # puede tocarlo fuera de sync_to_async
+        call_command('createcachetable', verbosity=0)
+        for url in ('/publicaciones/', '/publicaciones/'):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertContains(self.client.get('/publicaciones/'), 'A2')
+
+    def test_cambios_en_anuncio_y_fotos_cambian_el_etag(self):
+        etag = self.client.get('/publicaciones/')['ETag']
+        anuncio = self.anuncios[1]
+        anuncio.titulo = 'Editado'
+        anuncio.save()
+        response = self.client.get('/publicaciones/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Editado')
+
+        etag = response['ETag']
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        with self.settings(MEDIA_ROOT=media):
+            crear_foto(anuncio)
+        self.assertEqual(self.client.get('/publicaciones/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class ProcesamientoImagenesTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        ajustes = override_settings(MEDIA_ROOT=self.media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.anuncio = crear_anuncio(Acompanante.objects.create_user(username='ana', password='x'))
+
+    def jpeg_con_exif(self):
+        salida = io.BytesIO()
+        exif = Image.Exif()
+        exif[0x010F] = 'Camara'  # Make
+        Image.new('RGB', (2000, 1000), 'red').save(salida, 'JPEG', exif=exif)
+        return SimpleUploadedFile('grande.jpg', salida.getvalue(), content_type='image/jpeg')
+
+    def test_subida_encola_y_worker_genera_variantes(self):
+        foto = FotoAnuncio.objects.create(anuncio=self.anuncio, imagen=self.jpeg_con_exif())
+        self.assertEqual(foto.url_optimizada, foto.imagen.url)
+        tareas = tomar_tareas()
+        self.assertEqual([tarea.tipo for tarea in tareas], ['procesar_foto'])
+        self.assertTrue(ejecutar(tareas[0]))
+        self.assertFalse(Tarea.objects.exists())
+
+        foto.refresh_from_db()
+        self.assertEqual(set(foto.variantes), {'thumb', 'card', 'full'})
+        self.assertEqual(foto.variantes['thumb']['ancho'], 160)
+        self.assertIn('640w', foto.srcset_webp)
+        with foto.imagen.storage.open(foto.variantes['full']['jpeg']) as archivo:
+            variante = Image.open(archivo)
+            self.assertEqual(variante.size, (1600, 800))
+            self.assertEqual(len(variante.getexif()), 0)
+        self.assertRegex(foto.url_optimizada, r'^/media/h/([0-9a-f]{16})/.+/card\.\1\.jpeg$')
+
+        # Al reprocesar se borran las variantes que ya no se usan
+        vieja = default_storage.save('anuncios_fotos/variantes/vieja.jpeg', ContentFile(b'v'))
+        foto.variantes['card']['jpeg'] = vieja
+        foto.save(update_fields=['variantes'])
+        procesar_foto(foto.pk)
+        self.assertFalse(default_storage.exists(vieja))
+        foto.refresh_from_db()
+        self.assertTrue(default_storage.exists(foto.variantes['card']['jpeg']))
+
+    def test_tarea_fallida_se_reintenta_y_luego_queda_fallida(self):
+        foto = crear_foto(self.anuncio)  # No es una imagen válida
+        for _ in range(3):
+            tarea = Tarea.objects.get()
+            with self.assertLogs('accounts.tareas', 'ERROR'):
+                self.assertFalse(ejecutar(tarea))
+        tarea = Tarea.objects.get()
+        self.assertEqual((tarea.estado, tarea.intentos), (Tarea.FALLIDA, 3))
+        self.assertEqual(FotoAnuncio.objects.get(pk=foto.pk).variantes, {})
+
+    def test_tarea_abandonada_cuenta_como_intento(self):
+        crear_foto(self.anuncio)
+        tomar_tareas()
+        for intento in range(1, 3):
+            # El worker murió sin terminarla
+            Tarea.objects.update(tomada_en=timezone.now() - TIEMPO_MAXIMO - timedelta(seconds=1))
+            [tarea] = tomar_tareas()
+            self.assertEqual(Tarea.objects.get().intentos, intento)
+            self.assertEqual(tarea.intentos, intento)
+        Tarea.objects.update(tomada_en=timezone.now() - TIEMPO_MAXIMO - timedelta(seconds=1))
+        with self.assertLogs('accounts.tareas', 'ERROR'):
+            self.assertEqual(tomar_tareas(), [])
+        tarea = Tarea.objects.get()
+        self.assertEqual((tarea.estado, tarea.intentos), (Tarea.FALLIDA, 3))
+
+
+class SubidaFotosTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        ajustes = override_settings(MEDIA_ROOT=self.media, FOTO_MAX_BYTES=50_000)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.usuario = Acompanante.objects.create_user(username='ana', password='x')
+        self.client.force_login(self.usuario)
+        self.datos = {'titulo': 'Nuevo', 'descripcion': 'Hola', 'ciudad': 'Quito', 'precio': '40', 'sexo': 'mujer'}
+        self.borrador = firmar_borrador(self.datos)
+
+    def png(self, nombre='foto.png', relleno=0):
+        salida = io.BytesIO()
+        Image.new('RGB', (20, 20), 'blue').save(salida, 'PNG')
+        return SimpleUploadedFile(nombre, salida.getvalue() + b'\0' * relleno, content_type='image/png')
+
+    def archivos_en_disco(self):
+        return sum(len(archivos) for _, _, archivos in os.walk(self.media))
+
+    def test_plan_basico_guarda_solo_una_foto(self):
+        response = self.client.post('/fotos-user/', {
+            'borrador': self.borrador, 'fotos': [self.png('a.png'), self.png('b.png'), self.png('c.png')],
+        })
+        self.assertRedirects(response, '/mis-anuncios/', fetch_redirect_response=False)
+        foto = FotoAnuncio.objects.get()
+        self.assertTrue(foto.imagen.name.endswith('.png'))
+        self.assertEqual(self.archivos_en_disco(), 1)
+
+    def test_csrf_se_valida_despues_de_instalar_el_handler(self):
+        cliente = Client(enforce_csrf_checks=True)
+        cliente.force_login(self.usuario)
+        cliente.get(f'/fotos-user/?borrador={self.borrador}')
+        token = cliente.cookies['csrftoken'].value
+        for url in ('/fotos-user/', '/publicar/enviar/'):
+            response = cliente.post(url, {'borrador': self.borrador, 'fotos': [self.png()]})
+            self.assertEqual(response.status_code, 403)
+            response = cliente.post(url, {
+                'borrador': self.borrador, 'fotos': [self.png()], 'csrfmiddlewaretoken': token,
+            })
+            self.assertRedirects(response, '/mis-anuncios/', fetch_redirect_response=False)
+        self.assertEqual(Anuncio.objects.count(), 2)
+
+    def test_rechaza_archivos_que_no_son_imagenes(self):
+        falso = SimpleUploadedFile('foto.jpg', b'<?php echo 1; ?>', content_type='image/jpeg')
+        response = self.client.post('/fotos-user/', {'borrador': self.borrador, 'fotos': [falso]})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Anuncio.objects.exists())
+        self.assertEqual(self.archivos_en_disco(), 0)
+
+    def test_rechaza_foto_demasiado_grande(self):
+        self.usuario.plan = 'premium'
+        self.usuario.save()
+        response = self.client.post('/fotos-user/', {
+            'borrador': self.borrador, 'fotos': [self.png('grande.png', relleno=60_000), self.png()],
+        })
+        self.assertRedirects(response, '/mis-anuncios/', fetch_redirect_response=False)
+        self.assertEqual(FotoAnuncio.objects.count(), 1)
+        self.assertEqual(self.archivos_en_disco(), 1)
+
+    def test_publica_en_un_solo_request_sin_sesion(self):
+        self.usuario.plan = 'premium'
+        self.usuario.save()
+        sesiones = Session.objects.count()
+        response = self.client.post('/publicar/enviar/', {**self.datos, 'fotos': [self.png('a.png'), self.png('b.png')]})
+        self.assertRedirects(response, '/mis-anuncios/', fetch_redirect_response=False)
+        anuncio = Anuncio.objects.get()
+        fotos = list(anuncio.fotos.order_by('id'))
+        self.assertEqual(len(fotos), 2)
+        self.assertEqual(anuncio.foto_principal, fotos[0])
+        self.assertEqual(Tarea.objects.filter(tipo='procesar_foto').count(), 2)
+        self.assertEqual(Session.objects.count(), sesiones)
+
+    def test_borrador_firmado_en_lugar_de_sesion(self):
+        response = self.client.post('/publicar/', self.datos)
+        borrador = parse_qs(urlsplit(response.url).query)['borrador'][0]
+        self.assertEqual(leer_borrador(borrador), {**self.datos, 'pais': ''})
+        self.assertContains(self.client.get(response.url), 'name="borrador"')
+        # Un borrador alterado no publica nada y no deja archivos
+        response = self.client.post('/publicar/enviar/', {'borrador': self.borrador + 'x', 'fotos': [self.png()]})
+        self.assertRedirects(response, '/publicar/', fetch_redirect_response=False)
+        self.assertFalse(Anuncio.objects.exists())
+        self.assertEqual(self.archivos_en_disco(), 0)
+
+    def test_fotos_iguales_comparten_archivo_y_se_recolectan(self):
+        for _ in range(2):
+            self.client.post('/publicar/enviar/', {**self.datos, 'fotos': [self.png()]})
+        primera, segunda = FotoAnuncio.objects.order_by('id')
+        self.assertEqual(primera.imagen.name, segunda.imagen.name)
+        self.assertRegex(primera.imagen.url, r'^/media/h/[0-9a-f]{16}/anuncios_fotos/[0-9a-f]{2}/[0-9a-f]{64}\.png$')
+        self.assertEqual(self.archivos_en_disco(), 1)
+        archivo = ArchivoContenido.objects.get(nombre=primera.imagen.name)
+        self.assertEqual(archivo.referencias, 2)
+
+        primera.anuncio.delete()
+        archivo.refresh_from_db()
+        self.assertEqual(archivo.referencias, 1)
+        segunda.anuncio.delete()
+        archivo.refresh_from_db()
+        self.assertEqual(archivo.referencias, 0)
+        self.assertTrue(Tarea.objects.filter(tipo=TAREA_RECOLECTAR).exists())
+        # Dentro del margen no se borra
+        self.assertEqual(recolectar(), 0)
+        with self.settings(ARCHIVOS_GRACIA_SEGUNDOS=0):
+            self.assertEqual(recolectar(), 1)
+        self.assertFalse(ArchivoContenido.objects.exists())
+        self.assertEqual(self.archivos_en_disco(), 0)
+
+    def test_campos_invalidos_descartan_las_fotos(self):
+        response = self.client.post('/publicar/enviar/', {**self.datos, 'precio': 'gratis', 'fotos': [self.png()]})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Anuncio.objects.exists())
+        self.assertEqual(self.archivos_en_disco(), 0)
+
+
+class MediaTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        ajustes = override_settings(MEDIA_ROOT=self.media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.nombre = default_storage.save('anuncios_fotos/a.jpg', ContentFile(bytes(range(256)) * 4))
+
+    def test_url_con_hash_inmutable_y_304(self):
+        url = default_storage.url(self.nombre)
+        self.assertRegex(self.nombre, r'^anuncios_fotos/a\.[0-9a-f]{16}\.jpg$')
+        self.assertEqual(url, f'/media/h/{self.nombre[-20:-4]}/{self.nombre}')
+        # La URL sale del nombre, sin leer el archivo
+        with patch('builtins.open', side_effect=AssertionError):
+            self.assertEqual(default_storage.url(self.nombre), url)
+        # Mismo contenido, mismo archivo
+        self.assertEqual(default_storage.save('anuncios_fotos/a.jpg', ContentFile(bytes(range(256)) * 4)), self.nombre)
+        response = self.client.get(url)
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(256)) * 4)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        # Sin hash se sirve igual, pero revalidable
+        self.assertNotIn('immutable', self.client.get(f'/media/{self.nombre}')['Cache-Control'])
+
+    def test_rangos(self):
+        response = self.client.get(f'/media/{self.nombre}', HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(10, 20)))
+        sufijo = self.client.get(f'/media/{self.nombre}', HTTP_RANGE='bytes=-4')
+        self.assertEqual(b''.join(sufijo.streaming_content), bytes(range(252, 256)))
+        self.assertEqual(self.client.get(f'/media/{self.nombre}', HTTP_RANGE='bytes=5000-').status_code, 416)
+
+    def test_offload_y_rutas_fuera_de_media(self):
+        with self.settings(MEDIA_OFFLOAD='x-accel', MEDIA_OFFLOAD_PREFIJO='/_media/'):
+            response = self.client.get(f'/media/{self.nombre}')
+        self.assertEqual(response['X-Accel-Redirect'], f'/_media/{self.nombre}')
+        self.assertEqual(response.content, b'')
+        with self.settings(MEDIA_OFFLOAD='x-sendfile'):
+            response = self.client.get(f'/media/{self.nombre}')
+        self.assertEqual(response['X-Sendfile'], default_storage.path(self.nombre))
+        self.assertEqual(self.client.get('/media/../manage.py').status_code, 404)
+
+
+class EliminacionTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        ajustes = override_settings(MEDIA_ROOT=self.media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.usuario = Acompanante.objects.create_user(username='ana', password='x')
+        PerfilExtendido.objects.create(acompanante=self.usuario)
+        self.anuncios = [crear_anuncio(self.usuario, titulo=f'A{i}') for i in range(3)]
+        for anuncio in self.anuncios:
+            foto = crear_foto(anuncio)
+            foto.variantes = {'card': {'jpeg': default_storage.save(f'variantes/{foto.pk}/card.jpg', ContentFile(b'v')), 'ancho': 640}}
+            foto.save(update_fields=['variantes'])
+            Calificacion.objects.create(anuncio=anuncio, nombre_cliente='C', email_cliente='c@x.com', puntuacion=5)
+        self.otro = crear_anuncio(Acompanante.objects.create_user(username='eva', password='x'))
+        crear_foto(self.otro)
+
+    def test_anuncio_se_oculta_y_se_purga_en_segundo_plano(self):
+        anuncio = self.anuncios[0]
+        RankingManager.reconstruir_snapshot()
+        eliminar_anuncios([anuncio.pk])
+        self.assertFalse(Anuncio.objects.filter(pk=anuncio.pk).exists())
+        self.assertFalse(RankingSnapshot.objects.filter(anuncio=anuncio).exists())
+        self.assertTrue(Anuncio.todos.filter(pk=anuncio.pk).exists())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(ejecutar(Tarea.objects.get(tipo=TAREA_ANUNCIOS)))
+        self.assertFalse(Anuncio.todos.filter(pk=anuncio.pk).exists())
+        self.assertEqual(Calificacion.objects.count(), 2)
+        self.assertEqual(FotoAnuncio.objects.count(), 3)
+        # Todas las fotos comparten contenido: el archivo sigue en uso, la variante se fue
+        self.assertEqual(ArchivoContenido.objects.get().referencias, 3)
+        self.assertFalse(default_storage.listdir(f'variantes/{anuncio.pk}')[1])
+
+    def test_usuario_se_purga_por_lotes(self):
+        eliminar_usuario(self.usuario)
+        self.usuario.refresh_from_db()
+        self.assertFalse(self.usuario.is_active)
+        self.assertEqual(list(Anuncio.objects.all()), [self.otro])
+        # Aunque el snapshot todavía tenga filas suyas, rankings y home no las muestran
+        RankingSnapshot.objects.bulk_create([
+            RankingSnapshot(lista=RankingSnapshot.LISTA_DESTACADOS, anuncio=anuncio, posicion=posicion)
+            for posicion, anuncio in enumerate(self.anuncios, 1)
+        ])
+        self.assertEqual(RankingDisplay.get_home_rankings()['destacados_mes'], [])
+        with self.settings(ARCHIVOS_GRACIA_SEGUNDOS=0), self.captureOnCommitCallbacks(execute=True):
+            with patch('accounts.eliminacion.LOTE', 2):
+                purgar_usuario(self.usuario.pk)
+            self.assertEqual(recolectar(), 0)  # El anuncio de eva sigue usando el archivo
+        self.assertFalse(Acompanante.objects.filter(pk=self.usuario.pk).exists())
+        self.assertFalse(PerfilExtendido.objects.exists())
+        self.assertEqual(list(Anuncio.todos.all()), [self.otro])
+        self.assertEqual(FotoAnuncio.objects.get().anuncio, self.otro)
+        self.assertEqual(ArchivoContenido.objects.get().referencias, 1)
+        self.assertEqual(Calificacion.objects.count(), 0)
+
+
+class BusquedaTests(TestCase):
+    def setUp(self):
+        usuario = Acompanante.objects.create_user(username='ana', password='x')
+        self.masajes = crear_anuncio(usuario, titulo='Masajes en Cumbayá', descripcion='Relajación total', precio=80)
+        crear_anuncio(usuario, titulo='Cena y compañía', descripcion='Masaje incluido', ciudad='Guayaquil', precio=250)
+        crear_anuncio(usuario, titulo='Caballero', sexo='hombre', precio=40)
+        reindexar()
+
+    def test_texto_sin_acentos_y_por_prefijo(self):
+        resultados, _ = buscar('cumbaya')
+        self.assertEqual([r.anuncio_id for r in resultados], [self.masajes.id])
+        resultados, _ = buscar('masaj')
+        # El título pesa más que la descripción
+        self.assertEqual(resultados[0].anuncio_id, self.masajes.id)
+        self.assertEqual(len(resultados), 2)
+
+    def test_sintaxis_del_usuario_no_rompe_la_consulta(self):
+        resultados, _ = buscar('"masajes" -(')
+        self.assertEqual(len(resultados), 1)
+
+    def test_facetas_en_una_consulta(self):
+        with self.assertNumQueries(1):
+            _, facetas = buscar('masaj')
+        self.assertEqual(facetas['ciudad'], {'quito': 1, 'guayaquil': 1})
+        self.assertEqual(facetas['banda_precio'], {'50-100': 1, '200+': 1})
+        resultados, facetas = buscar(categoria='escorts-masculinos')
+        self.assertEqual(len(resultados), 1)
+        # Las facetas se cuentan antes de aplicar los filtros de faceta
+        self.assertEqual(facetas['categoria'], {'escorts-femeninos': 2, 'escorts-masculinos': 1})
+
+    def test_categoria_sale_de_la_fk_y_no_del_extendido(self):
+        caballero = Anuncio.objects.get(titulo='Caballero')
+        AnuncioExtendido.objects.get_or_create(anuncio=caballero)  # Su categoria por defecto es femenina
+        reindexar()
+        _, facetas = buscar()
+        self.assertEqual(facetas['categoria'], {'escorts-femeninos': 2, 'escorts-masculinos': 1})
+
+    def test_sin_edad_no_hay_banda_de_edad(self):
+        # La calificación crea el AnuncioExtendido sin edad
+        Calificacion.objects.create(
+            anuncio=self.masajes, nombre_cliente='Cliente', email_cliente='a@x.com', puntuacion=5, verificado=True
+        )
+        caballero = Anuncio.objects.get(titulo='Caballero')
+        AnuncioExtendido.objects.create(anuncio=caballero, edad=30)
+        reindexar()
+        _, facetas = buscar()
+        self.assertEqual(facetas['banda_edad'], {'25-34': 1})
+
+    def test_senal_reindexa_al_guardar(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.masajes.titulo = 'Tantra'
+            self.masajes.save()
+        self.assertEqual(IndiceBusqueda.objects.get(anuncio=self.masajes).titulo, 'Tantra')
+        self.assertFalse(buscar('cumbaya')[0].exists())
+
+    def test_vista(self):
+        response = self.client.get('/buscar/', {'q': 'masajes', 'ciudad': 'Quito'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Masajes en Cumbayá')
+        self.assertNotContains(response, 'Cena y compañía')
+
+
+class ReferenciasNormalizadasTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        catalogo.invalidar()
+        self.usuario = Acompanante.objects.create_user(username='ana', password='x')
+
+    def test_texto_libre_se_resuelve_a_referencias(self):
+        anuncio = crear_anuncio(self.usuario, ciudad=' QUITO', sexo='Femenino')
+        self.assertEqual(anuncio.ciudad_ref.nombre, 'Quito')
+        self.assertEqual(anuncio.categoria.slug, 'escorts-femeninos')
+        nueva = crear_anuncio(self.usuario, ciudad='Baños', sexo='otro')
+        self.assertEqual(nueva.ciudad_ref, Ciudad.objects.get(slug='banos'))
+        self.assertIsNone(nueva.categoria)
+        self.assertIn('Baños', catalogo.ciudades_de('Ecuador'))
+
+    def test_listado_filtra_por_ids(self):
+        quito = crear_anuncio(self.usuario, sexo='mujer')
+        crear_anuncio(self.usuario, ciudad='Cuenca', sexo='mujer')
+        crear_anuncio(self.usuario, sexo='hombre')
+        catalogo.cargar()  # El catálogo ya está en memoria: validadores de la página + la página
+        with self.assertNumQueries(2):
+            response = self.client.get('/publicaciones/escorts-femeninos/quito/')
+        self.assertEqual([anuncio.id for anuncio in response.context['anuncios']], [quito.id])
+        self.assertEqual(len(self.client.get('/publicaciones/mujer/').context['anuncios']), 2)
+        self.assertEqual(len(self.client.get('/publicaciones/mujer/atlantida/').context['anuncios']), 0)
+
+    def test_cambios_de_otro_proceso(self):
+        # Filas creadas sin señales, como las vería un worker que no hizo el cambio
+        catalogo.cargar()
+        pais = Ciudad.objects.get(slug='quito').pais
+        [banos] = Ciudad.objects.bulk_create([Ciudad(pais=pais, nombre='Baños', slug='banos')])
+        self.assertEqual(catalogo.ids_ciudad('Baños'), [banos.id])
+        self.assertEqual(catalogo.ciudad('Ecuador', 'Baños'), banos)
+
+        Categoria.objects.filter(slug='trans-travestis').update(nombre='Trans')
+        self.assertNotEqual(catalogo.categoria('trans').nombre, 'Trans')
+        cache.set(catalogo.CATALOGO_VERSION_KEY, 'otra')
+        with self.settings(CATALOGO_REVISION_SEGUNDOS=0):
+            self.assertEqual(catalogo.categoria('trans').nombre, 'Trans')
+
+
+class CercaniaTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        catalogo.invalidar()
+        self.usuario = Acompanante.objects.create_user(username='ana', password='x')
+
+    def test_matriz_de_distancias(self):
+        matriz = cercania.matriz()
+        quito, guayaquil = matriz.posiciones['quito'], matriz.posiciones['guayaquil']
+        self.assertEqual(matriz.distancias[quito, quito], 0)
+        self.assertAlmostEqual(matriz.distancias[quito, guayaquil], matriz.distancias[guayaquil, quito])
+        self.assertTrue(270 < matriz.distancias[quito, guayaquil] < 290)
+
+    def test_radio_se_resuelve_a_ids_de_ciudades(self):
+        ids = cercania.ids_en_radio('Latacunga', 86)
+        nombres = list(Ciudad.objects.filter(id__in=ids).values_list('slug', flat=True))
+        self.assertEqual(ids[0], Ciudad.objects.get(slug='latacunga').id)  # Primero la propia
+        self.assertEqual(sorted(nombres), ['ambato', 'guaranda', 'latacunga', 'quito', 'riobamba'])
+        self.assertIsNone(cercania.ids_en_radio('Atlántida', 86))
+
+    def test_listado_dentro_de_un_radio(self):
+        ambato = crear_anuncio(self.usuario, ciudad='Ambato')
+        quito = crear_anuncio(self.usuario, ciudad='Quito')
+        crear_anuncio(self.usuario, ciudad='Guayaquil')
+        catalogo.cargar()
+        # Sin radio, solo la ciudad exacta
+        self.assertEqual(len(self.client.get('/publicaciones/mujer/latacunga/').context['anuncios']), 0)
+        with self.assertNumQueries(2):
+            response = self.client.get('/publicaciones/mujer/latacunga/?radio_km=100&por_pagina=1')
+        self.assertEqual([anuncio.id for anuncio in response.context['anuncios']], [quito.id])
+        self.assertContains(response, 'radio_km=100')
+        cursor = response.context['siguiente_cursor']
+        response = self.client.get(f'/publicaciones/mujer/latacunga/?radio_km=100&por_pagina=1&cursor={cursor}')
+        self.assertEqual([anuncio.id for anuncio in response.context['anuncios']], [ambato.id])
+        self.assertIsNone(response.context['siguiente_cursor'])
+        # Radio inválido: se ignora (misma grilla vacía que sin radio, ya en caché)
+        self.assertContains(self.client.get('/publicaciones/mujer/latacunga/?radio_km=x'), 'No hay publicaciones')
+
+
+class InstrumentacionTests(TestCase):
+    def setUp(self):
+        usuario = Acompanante.objects.create_user(username='ana', password='x')
+        for _ in range(3):
+            crear_anuncio(usuario)
+
+    @override_settings(INSTRUMENTACION_MUESTREO=1.0, INSTRUMENTACION_LENTO_MS=0, INSTRUMENTACION_REPETIDAS=2)
+    def test_server_timing_y_log_de_lentos(self):
+        with self.assertLogs('iscort.rendimiento', 'WARNING') as logs:
+            response = self.client.get('/publicaciones/')
+        self.assertIn('db;dur=', response['Server-Timing'])
+        registro = json.loads(logs.records[0].getMessage())
+        self.assertEqual(registro['ruta'], '/publicaciones/')
+        self.assertGreaterEqual(registro['consultas'], 1)
+
+    @override_settings(INSTRUMENTACION_MUESTREO=0)
+    def test_sin_muestreo_no_mide(self):
+        self.assertNotIn('Server-Timing', self.client.get('/publicaciones/'))
+
+    def test_detecta_consultas_repetidas(self):
+        metricas = MetricasConsultas()
+        with connection.execute_wrapper(metricas):
+            for anuncio in Anuncio.objects.all():
+                anuncio.usuario  # N+1 a propósito
+            list(Anuncio.objects.filter(pk=anuncio.pk))
+            list(Anuncio.objects.filter(pk=anuncio.pk))
+        self.assertEqual(metricas.cantidad, 6)
+        sql, veces = metricas.repetidas(3)[0]
+        self.assertEqual(veces, 3)
+        self.assertIn('accounts_acompanante', sql)
+        # Mismo usuario tres veces + la misma búsqueda por pk dos veces
+        self.assertEqual(metricas.duplicadas(), 3)
+
+
+class VistasAsyncTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        catalogo.invalidar()
+        usuario = Acompanante.objects.create_user(username='ana', password='x')
+        self.anuncios = [crear_anuncio(usuario, titulo=f'A{i}') for i in range(3)]
+
+    async def test_home_y_listados_bajo_asgi(self):
+        response = await self.async_client.get('/')
+        self.assertEqual(response.context['estadisticas']['total_escorts'], 3)
+        self.assertEqual(len(response.context['top_femeninos']), 3)
+        response = await self.async_client.get('/publicaciones/escorts-femeninos/quito/', {'por_pagina': 2})
+        self.assertEqual(len(response.context['anuncios']), 2)
+        self.assertIsNotNone(response.context['siguiente_cursor'])
+        response = await self.async_client.get('/rankings/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['estadisticas']['total_escorts'], 3)
+
+    @override_settings(INSTRUMENTACION_MUESTREO=1.0, INSTRUMENTACION_LENTO_MS=10 ** 6)
+    async def test_instrumentacion_cuenta_consultas_async(self):
+        response = await self.async_client.get('/acompanantes/')
+        self.assertIn('desc="2 consultas"', response['Server-Timing'])
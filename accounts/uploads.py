@@ -0,0 +1,145 @@
+# accounts/uploads.py
+"""
+Upload handler para las fotos de anuncios.
+Aplica el cupo del plan mientras el cuerpo del request todavía se está
+leyendo: los archivos que sobran, los que no son imágenes y los que pasan
+el tamaño máximo se descartan sin bufferearlos, y los aceptados se escriben
+directo en el storage por contenido, calculando el hash mientras llegan.
+"""
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import (
+    FileUploadHandler, SkipFile, StopFutureHandlers, StopUpload,
+)
+from . import archivos
+from .models import FotoAnuncio
+
+CAMPO_FOTOS = 'fotos'
+# Bytes necesarios para reconocer el formato
+LARGO_CABECERA = 12
+
+
+def detectar_formato(cabecera):
+    """Devuelve la extensión según los magic bytes, o None si no es una imagen aceptada"""
+    if cabecera.startswith(b'\xff\xd8\xff'):
+        return 'jpg'
+    if cabecera.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if cabecera[:4] == b'RIFF' and cabecera[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+class FotoEnDestino(UploadedFile):
+    """
+    Foto ya escrita en el storage; `nombre_almacenado` se asigna tal cual a
+    FotoAnuncio.imagen. `nueva` es False si ese contenido ya estaba guardado.
+    """
+
+    def __init__(self, nombre_almacenado, nombre_original, content_type, size, nueva=True):
+        super().__init__(None, nombre_original, content_type, size)
+        self.nombre_almacenado = nombre_almacenado
+        self.nueva = nueva
+
+
+class CupoFotosUploadHandler(FileUploadHandler):
+    """
+    Acepta como máximo `max_archivos` fotos de hasta FOTO_MAX_BYTES cada una.
+    Debe ser el único handler del request (ver views.fotos_user).
+    """
+
+    def __init__(self, request, max_archivos):
+        super().__init__(request)
+        self.max_archivos = max_archivos
+        self.max_bytes_archivo = getattr(settings, 'FOTO_MAX_BYTES', 8 * 1024 * 1024)
+        # Cupo total: las fotos permitidas más un margen para los campos de texto
+        self.max_bytes_request = max_archivos * self.max_bytes_archivo + 1024 * 1024
+        self.storage = FotoAnuncio._meta.get_field('imagen').storage
+        self.aceptadas = []
+        self.rechazadas = []  # [(nombre, motivo)]
+        self.bytes_recibidos = 0
+        self.excede_request = False
+        self._archivo = None
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if content_length and content_length > self.max_bytes_request:
+            self.excede_request = True
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        if self.excede_request:
+            self.rechazadas.append((file_name, 'el envío supera el tamaño permitido'))
+            raise StopUpload(connection_reset=True)
+        if field_name != CAMPO_FOTOS:
+            raise SkipFile()  # El formulario solo sube fotos
+        if len(self.aceptadas) >= self.max_archivos:
+            self.rechazadas.append((file_name, 'supera el límite de fotos del plan'))
+            raise SkipFile()
+        self._archivo = None
+        self._cabecera = b''
+        self._tamano = 0
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.bytes_recibidos += len(raw_data)
+        if self.bytes_recibidos > self.max_bytes_request:
+            self.excede_request = True
+            self._descartar_actual()
+            self.rechazadas.append((self.file_name, 'el envío supera el tamaño permitido'))
+            raise StopUpload(connection_reset=True)
+        self._tamano += len(raw_data)
+        if self._tamano > self.max_bytes_archivo:
+            self._descartar_actual()
+            self.rechazadas.append((self.file_name, 'supera el tamaño máximo por foto'))
+            raise SkipFile()
+
+        if self._archivo is None:
+            self._cabecera += raw_data
+            if len(self._cabecera) < LARGO_CABECERA:
+                return None
+            extension = detectar_formato(self._cabecera)
+            if extension is None:
+                self.rechazadas.append((self.file_name, 'no es una imagen JPEG, PNG o WebP'))
+                raise SkipFile()
+            self._abrir_destino(extension)
+            raw_data, self._cabecera = self._cabecera, b''
+        self._archivo.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if self._archivo is None:
+            # Archivo vacío o demasiado corto para identificarlo
+            self.rechazadas.append((self.file_name, 'no es una imagen JPEG, PNG o WebP'))
+            return None
+        # Se registra antes de moverlo: así la recolección de huérfanos no
+        # puede borrar un archivo igual que esta subida va a reutilizar
+        nombre = self._archivo.nombre
+        nueva = archivos.registrar_subida(nombre)
+        self._archivo.cerrar()
+        foto = FotoEnDestino(nombre, self.file_name, self.content_type, file_size, nueva)
+        self._archivo = None
+        self.aceptadas.append(foto)
+        return foto
+
+    def upload_interrupted(self):
+        # Django también lo llama si la última parte se saltó con SkipFile:
+        # solo se descarta el archivo a medio escribir
+        self._descartar_actual()
+
+    def descartar(self):
+        """Borra del storage las fotos aceptadas (p. ej. si el request no las va a usar)"""
+        for foto in self.aceptadas:
+            if foto.nueva:
+                archivos.descartar_subida(foto.nombre_almacenado)
+        self.aceptadas = []
+
+    def _abrir_destino(self, extension):
+        campo = FotoAnuncio._meta.get_field('imagen')
+        # El nombre definitivo lo decide el hash del contenido (ver iscort.media)
+        self._archivo = self.storage.escritor(campo.generate_filename(None, f'foto.{extension}'))
+
+    def _descartar_actual(self):
+        if self._archivo is not None:
+            self._archivo.descartar()
+            self._archivo = None
@@ -1,42 +1,42 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render
-from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.views.decorators.http import require_POST
+from django.http import Http404, HttpResponse
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import authenticate, login, logout
 from django.shortcuts import redirect
-from accounts.paises import get_ciudades_por_pais
-from .models import Anuncio, FotoAnuncio
-from .forms import UserCreationForm
-from django.core.files.uploadedfile import InMemoryUploadedFile
-
-def home(request):
-    # Obtener los top 3 femeninos con sus fotos
-    top_femeninos_raw = Anuncio.objects.filter(
-        sexo__in=['mujer', 'femenino']
-    ).prefetch_related('fotos').order_by('-creado')[:3]
-    
-    # Por ahora mostramos datos básicos sin rankings hasta hacer migraciones
-    context = {
-        'estadisticas': {
-            'total_escorts': Anuncio.objects.count(),
-            'total_ciudades': Anuncio.objects.values('ciudad').distinct().count(),
-            'total_reviews': 0,
-            'promedio_satisfaccion': 0
-        },
-        'top_femeninos': list(top_femeninos_raw),
-        'top_masculinos': list(Anuncio.objects.filter(sexo__in=['hombre', 'masculino']).order_by('-creado')[:6]),
-        'top_trans': list(Anuncio.objects.filter(sexo__in=['trans', 'travesti']).order_by('-creado')[:6]),
-        'destacados_mes': [],
-        'nuevos_verificados': list(Anuncio.objects.order_by('-creado')[:6])
-    }
-    return render(request, 'home.html', context)
+from django.urls import reverse
+from django.utils.http import urlencode
+from django.core.paginator import Paginator
+from rankings import contadores
+from rankings.rankings_manager import RankingDisplay
+from . import catalogo, cercania, listado_cache
+from .busqueda import FACETAS, buscar as buscar_anuncios
+from .home_cache import aget_home_payload
+from .publicacion import firmar_borrador, leer_borrador, publicar
+from .paginacion import afilas_keyset, apaginar_keyset, tamano_pagina
+from .uploads import CupoFotosUploadHandler
+from .models import Anuncio
+from .forms import AnuncioForm, UserCreationForm
+
+# home, rankings y los listados públicos son async: bajo ASGI no ocupan un
+# thread por request; el ORM y el caché corren, de a una consulta por vez,
+# en el thread compartido de sync_to_async
+async def home(request):
+    # Payload precalculado y cacheado (ver accounts/home_cache.py)
+    return render(request, 'home.html', await aget_home_payload())
+
+async def rankings(request):
+    return render(request, 'rankings_pagina.html', await RankingDisplay.aget_home_rankings(limit=10))
 
 def panel(request):
     return render(request, 'panel.html')
 
 @login_required
 def mis_anuncios(request):
-    anuncios = Anuncio.objects.filter(usuario=request.user).order_by('-creado')
-    return render(request, 'listado.html', {'anuncios': anuncios})
+    anuncios = Anuncio.objects.filter(usuario=request.user).prefetch_related('fotos').order_by('-creado')
+    return render(request, 'listado_usuario.html', {'anuncios': anuncios})
 
 # Registro de usuario
 @csrf_exempt
@@ -71,60 +71,157 @@ def logout_view(request):
     logout(request)
     return redirect('login')
 
-def listado_acompanantes(request):
-    anuncios = Anuncio.objects.all().order_by('-creado')
-    return render(request, 'listado.html', {'anuncios': anuncios})
+async def _render_listado(request, anuncios):
+    cursor = request.GET.get('cursor')
+    tamano = tamano_pagina(request)
+    # Primero solo (id, creado, actualizado): alcanza para el 304 y para saber
+    # si la grilla ya está en el caché de fragmentos
+    filas, siguiente_cursor = await afilas_keyset(anuncios, cursor, tamano)
+    etag, last_modified = listado_cache.validadores(filas, siguiente_cursor)
+    no_modificada = listado_cache.respuesta_condicional(request, etag, last_modified)
+    if no_modificada is not None:
+        return listado_cache.aplicar_cabeceras(no_modificada, etag, last_modified)
+
+    grilla = await listado_cache.agrilla_cacheada(request, etag)
+    if grilla is None:
+        pagina, _ = await apaginar_keyset(anuncios.select_related('foto_principal'), cursor, tamano)
+        grilla = await listado_cache.arenderizar_grilla(request, etag, pagina)
+    response = render(request, 'listado_publico.html', {
+        'grilla': grilla,
+        'siguiente_cursor': siguiente_cursor,
+        'es_primera_pagina': not cursor,
+        'por_pagina': request.GET.get('por_pagina'),
+        'radio_km': request.GET.get('radio_km'),
+    })
+    return listado_cache.aplicar_cabeceras(response, etag, last_modified)
+
+async def listado_acompanantes(request):
+    return await _render_listado(request, Anuncio.objects.all())
 
-def listado_publico(request, categoria=None, ciudad=None):
-    anuncios = Anuncio.objects.all().order_by('-creado')
+def anuncios_listado(categoria=None, ciudad=None, radio_km=None):
+    """
+    Queryset del listado público. `categoria` es un slug (o un valor de sexo) y
+    `ciudad` un nombre o slug; se resuelven a ids con el catálogo en memoria
+    (que puede consultar la base: desde código async, con sync_to_async).
+    Con `radio_km` entran también las ciudades a esa distancia (accounts.cercania).
+    """
+    anuncios = Anuncio.objects.all()
     if categoria:
-        anuncios = anuncios.filter(sexo=categoria)
+        encontrada = catalogo.categoria(categoria)
+        if encontrada is None:
+            return anuncios.none()
+        anuncios = anuncios.filter(categoria_id=encontrada.id)
     if ciudad:
-        anuncios = anuncios.filter(ciudad__iexact=ciudad)
-    return render(request, 'listado_publico.html', {'anuncios': anuncios})
+        ids = cercania.ids_en_radio(ciudad, radio_km) if radio_km else None
+        if ids is None:
+            ids = catalogo.ids_ciudad(ciudad)  # Sin radio o sin coordenadas: solo esa ciudad
+        if not ids:
+            return anuncios.none()
+        anuncios = anuncios.filter(ciudad_ref_id=ids[0]) if len(ids) == 1 else anuncios.filter(ciudad_ref_id__in=ids)
+    return anuncios
+
+async def listado_publico(request, categoria=None, ciudad=None):
+    radio = cercania.radio_km(request) if ciudad else None
+    anuncios = await sync_to_async(anuncios_listado)(categoria, ciudad, radio)
+    return await _render_listado(request, anuncios)
+
+def buscar(request):
+    texto = request.GET.get('q', '').strip()
+    filtros = {faceta: request.GET.get(faceta, '') for faceta in FACETAS}
+    resultados, facetas = buscar_anuncios(texto, **filtros)
+    pagina = Paginator(resultados, tamano_pagina(request)).get_page(request.GET.get('pagina'))
+    # Parámetros actuales sin la página, para armar los enlaces
+    parametros = request.GET.copy()
+    parametros.pop('pagina', None)
+    opciones = []
+    for faceta in FACETAS:
+        valores = []
+        for valor, cantidad in sorted(facetas[faceta].items()):
+            enlace = parametros.copy()
+            activo = filtros[faceta].lower() == valor.lower()
+            if activo:
+                enlace.pop(faceta, None)  # Un segundo clic quita el filtro
+            else:
+                enlace[faceta] = valor
+            valores.append({'valor': valor, 'cantidad': cantidad, 'activo': activo, 'url': enlace.urlencode()})
+        opciones.append((faceta.replace('_', ' '), valores))
+    return render(request, 'busqueda.html', {
+        'q': texto,
+        'facetas': opciones,
+        'pagina': pagina,
+        'parametros': parametros.urlencode(),
+    })
+
+@csrf_exempt
+@require_POST
+def registrar_evento(request, anuncio_id, evento):
+    """Beacon de visitas/contactos: solo suma en memoria (ver rankings.contadores)"""
+    if evento not in contadores.EVENTOS:
+        raise Http404
+    contadores.registrar(evento, anuncio_id)
+    return HttpResponse(status=204)
 
 @login_required
 @csrf_exempt
 def fotos_user(request):
-    # Determinar límite por plan
-    plan = getattr(request.user, 'plan', 'basico')
-    max_fotos = 1 if plan == 'basico' else 10
     if request.method == 'POST':
-        # Recuperar datos del anuncio desde la sesión
-        anuncio_data = request.session.get('anuncio_data')
-        if not anuncio_data:
-            return redirect('unisex_form')
-        anuncio = Anuncio.objects.create(
-            usuario=request.user,
-            titulo=anuncio_data.get('titulo', ''),
-            descripcion=anuncio_data.get('descripcion', ''),
-            ciudad=anuncio_data.get('ciudad', ''),
-            pais=anuncio_data.get('pais', 'Ecuador'),
-            precio=anuncio_data.get('precio', 0),
-            sexo=anuncio_data.get('sexo', '')
-        )
-        fotos = request.FILES.getlist('fotos')
-        # Enforce limit server-side
-        for foto in fotos[:max_fotos]:
-            FotoAnuncio.objects.create(anuncio=anuncio, imagen=foto)
-        # Limpiar datos de sesión
-        if 'anuncio_data' in request.session:
-            del request.session['anuncio_data']
-        return redirect('mis_anuncios')
-    return render(request, 'onboarding/fotos_user.html', {'max_fotos': max_fotos})
+        # Igual que publicar_anuncio: CsrfViewMiddleware leería request.POST con
+        # los handlers por defecto; el token se valida en _publicar
+        return publicar_anuncio(request)
+    # El borrador firmado de unisex_form viaja en la URL y después en un campo oculto
+    borrador = request.GET.get('borrador', '')
+    if leer_borrador(borrador) is None:
+        return redirect('unisex_form')
+    return render(request, 'onboarding/fotos_user.html', {'max_fotos': request.user.max_fotos, 'borrador': borrador})
+
+@login_required
+@csrf_exempt
+def publicar_anuncio(request):
+    """
+    Publica en un solo POST: campos del anuncio (o el `borrador` firmado de
+    unisex_form) más las fotos. No usa la sesión para guardar el borrador.
+    """
+    if request.method != 'POST':
+        return redirect('unisex_form')
+    # El cupo del plan se aplica mientras se lee el cuerpo (antes de tocar request.POST/FILES);
+    # por eso la vista es csrf_exempt y el token se valida recién en _publicar
+    subida = CupoFotosUploadHandler(request, request.user.max_fotos)
+    request.upload_handlers = [subida]
+    return _publicar(request, subida)
+
+@csrf_protect
+def _publicar(request, subida):
+    max_fotos = request.user.max_fotos
+    borrador = request.POST.get('borrador')
+    datos = leer_borrador(borrador) if borrador else request.POST
+    if datos is None:
+        subida.descartar()
+        return redirect('unisex_form')
+    form = AnuncioForm(datos)
+    fotos = request.FILES.getlist('fotos')
+    if not form.is_valid():
+        subida.descartar()
+        return render(request, 'onboarding/unisex_form.html', {
+            'ciudades_ecuador': catalogo.ciudades_de("ecuador"), 'form': form,
+        }, status=400)
+    if subida.excede_request or not fotos:
+        subida.descartar()
+        error = subida.rechazadas[0][1] if subida.rechazadas else 'Debes subir al menos una foto.'
+        return render(request, 'onboarding/fotos_user.html', {
+            'max_fotos': max_fotos, 'error': error, 'borrador': borrador or firmar_borrador(datos),
+        }, status=400)
+    # Las fotos ya están en su ubicación final: solo se registra el nombre
+    publicar(request.user, form, [foto.nombre_almacenado for foto in fotos])
+    return redirect('mis_anuncios')
 
 @csrf_exempt
 def unisex_form(request):
-    ciudades = get_ciudades_por_pais("ecuador")
+    ciudades = catalogo.ciudades_de("ecuador")
     if request.method == 'POST':
-        # Guardar datos del formulario en sesión
-        request.session['anuncio_data'] = {
-            'titulo': request.POST.get('titulo', ''),
-            'descripcion': request.POST.get('descripcion', ''),
-            'ciudad': request.POST.get('ciudad', ''),
-            'pais': request.POST.get('pais', 'Ecuador'),
-            'precio': request.POST.get('precio', 0),
-            'sexo': request.POST.get('sexo', ''),
-        }
-        return redirect('fotos_user')
+        form = AnuncioForm(request.POST)
+        if form.is_valid():
+            # Sin sesión: el borrador firmado sigue al formulario de fotos
+            url = reverse('fotos_user') + '?' + urlencode({'borrador': firmar_borrador(request.POST)})
+            return redirect(url)
+        return render(request, 'onboarding/unisex_form.html', {'ciudades_ecuador': ciudades, 'form': form}, status=400)
     return render(request, 'onboarding/unisex_form.html', {'ciudades_ecuador': ciudades})
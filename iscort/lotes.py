@@ -0,0 +1,17 @@
+# iscort/lotes.py
+"""
+Recorrido por lotes para los trabajos batch.
+En Postgres queryset.iterator() usa un cursor del lado del servidor: la
+memoria queda acotada a `chunk_size` filas sin importar el tamaño de la tabla.
+"""
+
+from itertools import islice
+
+LOTE = 500
+
+
+def iterar_en_lotes(queryset, chunk_size=LOTE):
+    """Entrega listas de hasta `chunk_size` elementos leídos con un cursor del servidor"""
+    iterador = queryset.iterator(chunk_size=chunk_size)
+    while lote := list(islice(iterador, chunk_size)):
+        yield lote
@@ -0,0 +1,266 @@
+# iscort/media.py
+"""
+Servido de MEDIA_ROOT en producción (WhiteNoise solo cubre los estáticos).
+Las URLs llevan el hash del contenido (/media/h/<hash>/<ruta>), así que se
+pueden cachear para siempre: si el archivo cambia, cambia la URL. El hash
+se calcula al guardar y queda en el nombre del archivo, url() no lee el
+disco. Soporta ETag/If-None-Match y pedidos por rango.
+
+Bajo ASGI (uvicorn) no hay wsgi.file_wrapper: sin MEDIA_OFFLOAD los bytes
+pasan por Python en bloques de BLOQUE. Para que no sea así hace falta un
+servidor delante de la app que atienda el envío: nginx con
+MEDIA_OFFLOAD='x-accel' y una location `internal` en MEDIA_OFFLOAD_PREFIJO
+con `alias` a MEDIA_ROOT, o Apache/lighttpd con MEDIA_OFFLOAD='x-sendfile'.
+El despliegue de render.yaml no tiene ninguno, así que ahí conviene poner
+una CDN delante de /media/h/ (las respuestas son inmutables).
+"""
+
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+import uuid
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage, default_storage, storages
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+from django.utils.encoding import filepath_to_uri
+from django.utils.http import http_date, parse_etags
+from django.views.decorators.http import require_safe
+
+PREFIJO_HASH = 'h'
+LARGO_HASH = 16
+BLOQUE = 64 * 1024
+# Un año: lo máximo que respetan navegadores y CDN
+INMUTABLE = 365 * 24 * 3600
+RANGO = re.compile(r'^bytes=(\d*)-(\d*)$')
+NOMBRE_CONTENIDO = re.compile(r'^[0-9a-f]{64}$')
+# <raíz>.<hash><extensión>, como los guarda AlmacenamientoMedia
+NOMBRE_VERSIONADO = re.compile(r'\.([0-9a-f]{%d})(\.[^./]+)?$' % LARGO_HASH)
+
+
+@lru_cache(maxsize=4096)
+def _hash_archivo(ruta, mtime_ns, tamano):
+    """Hash del contenido; mtime y tamaño son parte de la clave para notar reescrituras"""
+    digest = hashlib.sha256()
+    with open(ruta, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(BLOQUE), b''):
+            digest.update(bloque)
+    return digest.hexdigest()[:LARGO_HASH]
+
+
+def hash_contenido(ruta):
+    """Hash corto del archivo en `ruta` (absoluta), o None si no existe"""
+    try:
+        estado = os.stat(ruta)
+    except OSError:
+        return None
+    return _hash_archivo(ruta, estado.st_mtime_ns, estado.st_size)
+
+
+class AlmacenamientoMedia(FileSystemStorage):
+    """
+    FileSystemStorage que guarda cada archivo como <raíz>.<hash><extensión>;
+    sus URLs llevan ese hash sin tener que leer el archivo.
+    """
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        for bloque in content.chunks():
+            digest.update(bloque)
+        content.seek(0)
+        raiz, extension = posixpath.splitext(name)
+        name = f'{raiz}.{digest.hexdigest()[:LARGO_HASH]}{extension}'
+        if self.exists(name):
+            return name  # Mismo nombre, mismo contenido
+        return super()._save(name, content)
+
+    def url(self, name):
+        coincidencia = NOMBRE_VERSIONADO.search(name)
+        if coincidencia is None:
+            return super().url(name)  # Archivo sin hash en el nombre: URL revalidable
+        return super().url(f'{PREFIJO_HASH}/{coincidencia.group(1)}/{name}')
+
+
+class EscrituraContenido:
+    """
+    Archivo que se está escribiendo en un AlmacenamientoContenido: calcula el
+    sha256 a medida que llegan los bytes y al cerrarlo lo mueve a su nombre
+    definitivo, o lo descarta si ese contenido ya estaba guardado.
+    """
+
+    def __init__(self, storage, name):
+        self.storage = storage
+        self.carpeta, archivo = posixpath.split(name)
+        self.extension = posixpath.splitext(archivo)[1].lower()
+        self.temporal = storage.path(posixpath.join(self.carpeta, f'.subiendo-{uuid.uuid4().hex}'))
+        os.makedirs(os.path.dirname(self.temporal), exist_ok=True)
+        self.archivo = open(self.temporal, 'xb')
+        self.digest = hashlib.sha256()
+
+    def write(self, datos):
+        self.digest.update(datos)
+        self.archivo.write(datos)
+
+    @property
+    def nombre(self):
+        """Nombre definitivo según lo escrito hasta ahora: <carpeta>/<hh>/<sha256><extensión>"""
+        hash_hex = self.digest.hexdigest()
+        return posixpath.join(self.carpeta, hash_hex[:2], hash_hex + self.extension)
+
+    def cerrar(self):
+        """Mueve el archivo a su nombre definitivo y lo devuelve"""
+        self.archivo.close()
+        nombre = self.nombre
+        destino = self.storage.path(nombre)
+        if os.path.exists(destino):
+            os.remove(self.temporal)  # Mismo contenido ya guardado: no se duplica
+        else:
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            os.replace(self.temporal, destino)
+        return nombre
+
+    def descartar(self):
+        self.archivo.close()
+        if os.path.exists(self.temporal):
+            os.remove(self.temporal)
+
+
+class AlmacenamientoContenido(AlmacenamientoMedia):
+    """
+    Guarda cada contenido una sola vez, con el sha256 como nombre. Dos
+    subidas iguales terminan en el mismo archivo; quién lo usa lo lleva
+    accounts.archivos (referencias y recolección de huérfanos).
+    """
+
+    def escritor(self, name):
+        """EscrituraContenido para ir escribiendo un archivo que llega por partes"""
+        return EscrituraContenido(self, name)
+
+    def get_available_name(self, name, max_length=None):
+        return name  # El nombre final lo decide el contenido
+
+    def _save(self, name, content):
+        escritura = self.escritor(name)
+        try:
+            for bloque in content.chunks():
+                escritura.write(bloque)
+        except BaseException:
+            escritura.descartar()
+            raise
+        return escritura.cerrar()
+
+    def url(self, name):
+        # El nombre ya es el sha256 completo
+        raiz = posixpath.splitext(posixpath.basename(name))[0]
+        if NOMBRE_CONTENIDO.match(raiz):
+            return FileSystemStorage.url(self, f'{PREFIJO_HASH}/{raiz[:LARGO_HASH]}/{name}')
+        return super().url(name)
+
+
+def almacenamiento_fotos():
+    """Storage de FotoAnuncio.imagen (STORAGES['fotos'])"""
+    return storages['fotos']
+
+
+def _archivo(ruta_relativa):
+    try:
+        ruta = default_storage.path(ruta_relativa)
+    except (SuspiciousFileOperation, NotImplementedError):
+        raise Http404
+    if not os.path.isfile(ruta):
+        raise Http404
+    return ruta
+
+
+def _rango(cabecera, tamano):
+    """(inicio, fin) inclusivos de un único rango `bytes=`; None si no aplica, False si es insatisfacible"""
+    coincidencia = RANGO.match(cabecera.strip()) if cabecera else None
+    if not coincidencia:
+        return None  # Sin Range, o con varios rangos: se manda el archivo entero
+    desde, hasta = coincidencia.groups()
+    if not desde:
+        if not hasta or int(hasta) == 0:
+            return False
+        return max(tamano - int(hasta), 0), tamano - 1  # Sufijo: últimos N bytes
+    inicio = int(desde)
+    fin = min(int(hasta), tamano - 1) if hasta else tamano - 1
+    if inicio >= tamano or fin < inicio:
+        return False
+    return inicio, fin
+
+
+def _leer_tramo(ruta, inicio, largo):
+    with open(ruta, 'rb') as archivo:
+        archivo.seek(inicio)
+        while largo > 0:
+            bloque = archivo.read(min(BLOQUE, largo))
+            if not bloque:
+                break
+            largo -= len(bloque)
+            yield bloque
+
+
+def _respuesta_offload(modo, ruta_relativa, ruta):
+    response = HttpResponse()
+    if modo == 'x-accel':
+        # nginx sirve el archivo (y resuelve Range) desde una location `internal`
+        prefijo = getattr(settings, 'MEDIA_OFFLOAD_PREFIJO', '/_media/')
+        response['X-Accel-Redirect'] = prefijo + filepath_to_uri(ruta_relativa)
+    else:
+        response['X-Sendfile'] = ruta
+    # El servidor pone el tipo por su cuenta; Django dejaría text/html
+    del response['Content-Type']
+    return response
+
+
+def _respuesta_archivo(request, ruta, etag):
+    tamano = os.path.getsize(ruta)
+    tipo = mimetypes.guess_type(ruta)[0] or 'application/octet-stream'
+    rango = _rango(request.headers.get('Range'), tamano)
+    if rango is not None and request.headers.get('If-Range', etag) != etag:
+        rango = None  # El cliente tiene otra versión: archivo entero
+    if rango is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{tamano}'
+    elif rango is None:
+        # Bajo ASGI FileResponse lee el archivo en bloques desde Python (no hay
+        # sendfile); para evitarlo, MEDIA_OFFLOAD con un servidor delante
+        response = FileResponse(open(ruta, 'rb'), content_type=tipo)
+    else:
+        inicio, fin = rango
+        response = StreamingHttpResponse(_leer_tramo(ruta, inicio, fin - inicio + 1), status=206, content_type=tipo)
+        response['Content-Range'] = f'bytes {inicio}-{fin}/{tamano}'
+        response['Content-Length'] = str(fin - inicio + 1)
+    response['Accept-Ranges'] = 'bytes'
+    response['Last-Modified'] = http_date(os.path.getmtime(ruta))
+    return response
+
+
+@require_safe
+def servir_media(request, ruta, version=None):
+    """Sirve un archivo de MEDIA_ROOT; con `version` vigente la respuesta es inmutable"""
+    ruta_absoluta = _archivo(ruta)
+    actual = hash_contenido(ruta_absoluta)
+    etag = f'"{actual}"'
+    vigente = version == actual
+
+    if request.headers.get('If-None-Match') and etag in parse_etags(request.headers['If-None-Match']):
+        response = HttpResponseNotModified()
+    else:
+        modo = getattr(settings, 'MEDIA_OFFLOAD', None)
+        if modo:
+            response = _respuesta_offload(modo, ruta, ruta_absoluta)
+        else:
+            response = _respuesta_archivo(request, ruta_absoluta, etag)
+    response['ETag'] = etag
+    if vigente:
+        patch_cache_control(response, public=True, max_age=INMUTABLE, immutable=True)
+    else:
+        # URL sin hash o con un hash viejo: el contenido puede cambiar, se revalida
+        patch_cache_control(response, public=True, max_age=getattr(settings, 'MEDIA_MAX_AGE', 300))
+    return response
@@ -0,0 +1,157 @@
+# iscort/middleware.py
+"""
+Instrumentación por request: cantidad de consultas, tiempo en la base de
+datos, consultas repetidas (N+1) y latencia total.
+Se mide solo una fracción de los requests (INSTRUMENTACION_MUESTREO), así
+puede quedar activo en producción; los medidos llevan el header
+Server-Timing y, si son lentos o repiten consultas, dejan una línea JSON en
+el logger `iscort.rendimiento`.
+
+Todos los middlewares propios soportan sync y async: con uno solo que no lo
+hiciera, Django volvería a correr las vistas async en un thread por request.
+"""
+
+import json
+import logging
+import random
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+logger = logging.getLogger('iscort.rendimiento')
+
+
+class MetricasConsultas:
+    """execute_wrapper que cuenta y cronometra cada consulta"""
+
+    def __init__(self):
+        self.cantidad = 0
+        self.tiempo = 0.0
+        self.por_sql = Counter()   # Misma consulta con cualquier parámetro (patrón N+1)
+        self.exactas = Counter()   # Misma consulta con los mismos parámetros
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tiempo += time.perf_counter() - inicio
+            self.cantidad += 1
+            self.por_sql[sql] += 1
+            self.exactas[(sql, repr(params))] += 1
+
+    def repetidas(self, minimo):
+        """[(sql, veces)] de las consultas ejecutadas al menos `minimo` veces"""
+        return [(sql, veces) for sql, veces in self.por_sql.most_common() if veces >= minimo]
+
+    def duplicadas(self):
+        return sum(veces - 1 for veces in self.exactas.values() if veces > 1)
+
+
+def _instalar(metricas):
+    """Registra `metricas` en las conexiones del thread actual; devuelve el ExitStack para quitarlo"""
+    pila = ExitStack()
+    for conexion in connections.all():
+        pila.enter_context(conexion.execute_wrapper(metricas))
+    return pila
+
+
+def _muestrear():
+    muestreo = getattr(settings, 'INSTRUMENTACION_MUESTREO', 0.0)
+    return muestreo > 0 and random.random() < muestreo
+
+
+class InstrumentacionMiddleware:
+    """Debe ir primero en MIDDLEWARE para que la latencia incluya todo el stack"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not _muestrear():
+            return self.get_response(request)
+
+        metricas = MetricasConsultas()
+        inicio = time.perf_counter()
+        with _instalar(metricas):
+            response = self.get_response(request)
+        return self._reportar(request, response, metricas, inicio)
+
+    async def __acall__(self, request):
+        if not _muestrear():
+            return await self.get_response(request)
+
+        metricas = MetricasConsultas()
+        inicio = time.perf_counter()
+        # Las conexiones son por thread: el wrapper se instala (y se quita) en el
+        # thread donde el ORM async ejecuta las consultas de este request
+        pila = await sync_to_async(_instalar)(metricas)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(pila.close)()
+        return self._reportar(request, response, metricas, inicio)
+
+    def _reportar(self, request, response, metricas, inicio):
+        latencia_ms = (time.perf_counter() - inicio) * 1000
+        db_ms = metricas.tiempo * 1000
+
+        response['Server-Timing'] = (
+            f'db;dur={db_ms:.1f};desc="{metricas.cantidad} consultas", '
+            f'app;dur={latencia_ms - db_ms:.1f}, total;dur={latencia_ms:.1f}'
+        )
+
+        repetidas = metricas.repetidas(getattr(settings, 'INSTRUMENTACION_REPETIDAS', 5))
+        if latencia_ms >= getattr(settings, 'INSTRUMENTACION_LENTO_MS', 500) or repetidas:
+            logger.warning(json.dumps({
+                'metodo': request.method,
+                'ruta': request.path,
+                'vista': getattr(request.resolver_match, 'view_name', None),
+                'status': response.status_code,
+                'latencia_ms': round(latencia_ms, 1),
+                'db_ms': round(db_ms, 1),
+                'consultas': metricas.cantidad,
+                'duplicadas': metricas.duplicadas(),
+                'repetidas': [{'sql': sql[:300], 'veces': veces} for sql, veces in repetidas[:5]],
+            }, ensure_ascii=False))
+        return response
+
+
+class WhiteNoiseAsyncMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise 6.7 solo es sync. Los estáticos se buscan igual que en el
+    original (en memoria salvo con autorefresh) y el resto pasa al siguiente
+    middleware sin salir del event loop.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
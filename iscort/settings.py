@@ -49,8 +49,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'iscort.middleware.InstrumentacionMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'iscort.middleware.WhiteNoiseAsyncMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -92,7 +93,104 @@ DATABASES = {
 # If DATABASE_URL is provided (Render/Heroku style), use it.
 DATABASE_URL = os.environ.get('DATABASE_URL')
 if DATABASE_URL:
-    DATABASES['default'] = dj_database_url.parse(DATABASE_URL, conn_max_age=600, ssl_require=True)
+    # Bajo ASGI cada request usa su propio thread: las conexiones persistentes
+    # (conn_max_age) quedarían abiertas por thread, así que se cierran al terminar
+    # y, en Postgres, vuelven al pool de psycopg 3 en vez de cerrarse de verdad
+    DATABASES['default'] = dj_database_url.parse(DATABASE_URL, conn_max_age=0, ssl_require=True)
+
+# Pool de conexiones por proceso (Postgres). Con N workers de gunicorn se abren
+# hasta N * DB_POOL_MAX conexiones: mantenerlo bajo el max_connections del servidor
+DB_POOL = os.environ.get('DB_POOL', 'True').lower() == 'true'
+if DB_POOL and DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    from psycopg_pool import ConnectionPool
+
+    DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+        'min_size': int(os.environ.get('DB_POOL_MIN', '2')),
+        'max_size': int(os.environ.get('DB_POOL_MAX', '10')),
+        # Segundos que un request espera una conexión libre antes de fallar
+        'timeout': float(os.environ.get('DB_POOL_TIMEOUT', '10')),
+        # Las conexiones ociosas se cierran; las rotas se descartan al entregarlas
+        'max_idle': 300,
+        'check': ConnectionPool.check_connection,
+    }
+# Detrás de PgBouncer en modo transacción los cursores del servidor (iscort.lotes) no sirven
+if os.environ.get('DB_SIN_CURSORES_SERVIDOR', 'False').lower() == 'true':
+    DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# El caché tiene que ser compartido: las señales que invalidan el home corren
+# en el proceso que hizo el cambio (un worker web, procesar_tareas, el admin o
+# un comando) y el resto de los workers tiene que ver el borrado. Con una base
+# externa se usa la tabla de caché de Django (`manage.py createcachetable`);
+# en desarrollo, con un solo proceso, alcanza LocMem
+if DATABASE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'iscort_cache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'iscort',
+        }
+    }
+
+# Cada cuántos segundos un proceso confirma en el caché que su copia de
+# accounts.catalogo (países, ciudades y categorías) sigue vigente
+CATALOGO_REVISION_SEGUNDOS = 10
+
+# Segundos que vive el payload precalculado del home (también es el healthCheckPath)
+HOME_CACHE_TIMEOUT = int(os.environ.get('HOME_CACHE_TIMEOUT', '300'))
+
+# Listados públicos: Cache-Control para navegadores (max-age) y para la CDN
+# (s-maxage); al vencer revalidan con ETag/Last-Modified y reciben un 304.
+# La grilla renderizada vive LISTADO_FRAGMENTO_TIMEOUT segundos en el caché
+LISTADO_CACHE_MAX_AGE = int(os.environ.get('LISTADO_CACHE_MAX_AGE', '30'))
+LISTADO_CACHE_S_MAXAGE = int(os.environ.get('LISTADO_CACHE_S_MAXAGE', '60'))
+LISTADO_CACHE_STALE = 30
+LISTADO_FRAGMENTO_TIMEOUT = 600
+
+# Posiciones guardadas por lista en la tabla materializada de rankings
+RANKING_SNAPSHOT_LIMITE = int(os.environ.get('RANKING_SNAPSHOT_LIMITE', '100'))
+# Cada cuántos segundos el worker de tareas la reconstruye (rankings.tareas)
+RANKING_SNAPSHOT_INTERVALO = int(os.environ.get('RANKING_SNAPSHOT_INTERVALO', '900'))
+
+# Escritura diferida de visitas/contactos: cada worker vuelca su buffer con
+# esta frecuencia (es también lo máximo que se pierde si el worker muere)
+CONTADORES_VACIADO_SEGUNDOS = int(os.environ.get('CONTADORES_VACIADO_SEGUNDOS', '10'))
+CONTADORES_VACIADO_MAXIMO = 1000
+
+# Instrumentación por request (iscort.middleware): fracción de requests medidos
+# (en producción, p. ej. 0.01), umbral del log de requests lentos y cuántas
+# veces tiene que repetirse una consulta para reportarla como N+1
+INSTRUMENTACION_MUESTREO = float(os.environ.get('INSTRUMENTACION_MUESTREO', '1.0' if DEBUG else '0'))
+INSTRUMENTACION_LENTO_MS = int(os.environ.get('INSTRUMENTACION_LENTO_MS', '500'))
+INSTRUMENTACION_REPETIDAS = 5
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'iscort.rendimiento': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+    },
+}
+
+
+# Paginación por cursor de los listados públicos
+LISTADO_TAMANO_PAGINA = int(os.environ.get('LISTADO_TAMANO_PAGINA', '24'))
+LISTADO_TAMANO_MAXIMO = 100
+
+# Tope de ?radio_km= en la búsqueda por cercanía (accounts.cercania)
+CERCANIA_RADIO_MAXIMO_KM = 300
 
 
 # Password validation
@@ -133,19 +231,43 @@ STATIC_URL = 'static/'
 # Where collectstatic will put files for production (served by WhiteNoise)
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+STORAGES = {
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+    # URLs de media con el hash del contenido (iscort/media.py)
+    'default': {
+        'BACKEND': 'iscort.media.AlmacenamientoMedia',
+    },
+    # Fotos de anuncios: una copia por contenido, con referencias (accounts/archivos.py)
+    'fotos': {
+        'BACKEND': 'iscort.media.AlmacenamientoContenido',
+    },
+}
 if not DEBUG:
     # Enable WhiteNoise gzip/brotli compression and caching headers
-    STORAGES = {
-        'staticfiles': {
-            'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
-        },
-        'default': {
-            'BACKEND': 'django.core.files.storage.FileSystemStorage',
-        },
+    STORAGES['staticfiles'] = {
+        'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
     }
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Envío de media: None (Django; bajo ASGI los bytes pasan por Python),
+# 'x-accel' (nginx delante, con una location `internal` en MEDIA_OFFLOAD_PREFIJO
+# que apunte a MEDIA_ROOT) o 'x-sendfile' (Apache mod_xsendfile / lighttpd).
+# render.yaml no tiene servidor delante: ahí queda en None (ver iscort/media.py)
+MEDIA_OFFLOAD = os.environ.get('MEDIA_OFFLOAD') or None
+MEDIA_OFFLOAD_PREFIJO = os.environ.get('MEDIA_OFFLOAD_PREFIJO', '/_media/')
+# Cache-Control de las URLs de media sin hash (las con hash son inmutables)
+MEDIA_MAX_AGE = 300
+
+# Un archivo de fotos sin referencias se borra después de este margen, para
+# no pisar una subida del mismo contenido que todavía no creó su FotoAnuncio
+ARCHIVOS_GRACIA_SEGUNDOS = int(os.environ.get('ARCHIVOS_GRACIA_SEGUNDOS', '3600'))
+
+# Tamaño máximo por foto de anuncio; se corta mientras se recibe (accounts/uploads.py)
+FOTO_MAX_BYTES = int(os.environ.get('FOTO_MAX_BYTES', 8 * 1024 * 1024))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
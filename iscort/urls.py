@@ -17,8 +17,10 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path
 from django.conf import settings
-from django.conf.urls.static import static
 from accounts import views
+from iscort.media import PREFIJO_HASH, servir_media
+
+MEDIA = settings.MEDIA_URL.lstrip('/')
 
 urlpatterns = [
     path('', views.home, name='home'),
@@ -31,10 +33,14 @@ urlpatterns = [
     path('publicaciones/', views.listado_publico, name='listado_publico'),
     path('publicaciones/<str:categoria>/', views.listado_publico, name='listado_publico_categoria'),
     path('publicaciones/<str:categoria>/<str:ciudad>/', views.listado_publico, name='listado_publico_categoria_ciudad'),
+    path('anuncios/<int:anuncio_id>/<str:evento>/', views.registrar_evento, name='registrar_evento'),
+    path('rankings/', views.rankings, name='rankings'),
+    path('buscar/', views.buscar, name='buscar'),
     path('publicar/', views.unisex_form, name='unisex_form'),
+    path('publicar/enviar/', views.publicar_anuncio, name='publicar_anuncio'),
     path('fotos-user/', views.fotos_user, name='fotos_user'),
     path('logout/', views.logout_view, name='logout'),
+    # Media también con DEBUG=False (ver iscort/media.py)
+    path(f'{MEDIA}{PREFIJO_HASH}/<str:version>/<path:ruta>', servir_media, name='media_hash'),
+    path(f'{MEDIA}<path:ruta>', servir_media, name='media'),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
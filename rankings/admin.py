@@ -1,8 +1,18 @@
 # rankings/admin.py
 
 from django.contrib import admin
+from django.db import transaction
 from .models import Calificacion, PerfilExtendido, AnuncioExtendido
 
+def _cambiar_verificacion(queryset, verificado):
+    """Cambia `verificado` en bloque y recalcula una sola vez cada anuncio afectado"""
+    with transaction.atomic():
+        cambiar = queryset.exclude(verificado=verificado)
+        anuncio_ids = set(cambiar.values_list('anuncio_id', flat=True))
+        total = cambiar.update(verificado=verificado)
+        AnuncioExtendido.recalcular_agregados(anuncio_ids)
+    return total
+
 @admin.register(Calificacion)
 class CalificacionAdmin(admin.ModelAdmin):
     list_display = ['anuncio', 'puntuacion', 'nombre_cliente', 'fecha', 'verificado']
@@ -11,15 +21,13 @@ class CalificacionAdmin(admin.ModelAdmin):
     actions = ['marcar_como_verificado', 'marcar_como_no_verificado']
     
     def marcar_como_verificado(self, request, queryset):
-        queryset.update(verificado=True)
-        for calificacion in queryset:
-            calificacion.actualizar_puntuacion_anuncio()
+        total = _cambiar_verificacion(queryset, True)
+        self.message_user(request, f"{total} calificaciones marcadas como verificadas")
     marcar_como_verificado.short_description = "Marcar como verificado"
     
     def marcar_como_no_verificado(self, request, queryset):
-        queryset.update(verificado=False)
-        for calificacion in queryset:
-            calificacion.actualizar_puntuacion_anuncio()
+        total = _cambiar_verificacion(queryset, False)
+        self.message_user(request, f"{total} calificaciones marcadas como no verificadas")
     marcar_como_no_verificado.short_description = "Marcar como no verificado"
 
 @admin.register(PerfilExtendido)
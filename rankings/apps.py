@@ -5,3 +5,6 @@ class RankingsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'rankings'
     verbose_name = 'Sistema de Rankings y Calificaciones'
+
+    def ready(self):
+        from . import contadores, signals, tareas  # noqa: F401
@@ -0,0 +1,184 @@
+# rankings/benchmark.py
+"""
+Datos sintéticos y medición de las vistas públicas, para comparar cambios
+de rendimiento (`manage.py seed_bench` y `manage.py benchmark`).
+Los datos tienen la asimetría de producción: pocas ciudades y pocos
+anuncios concentran la mayoría de las calificaciones.
+"""
+
+import json
+import random
+import time
+from itertools import accumulate
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import OuterRef, Subquery
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from accounts import catalogo
+from accounts.busqueda import reindexar
+from accounts.models import Acompanante, Anuncio, FotoAnuncio, SEXOS_POR_CATEGORIA
+from .models import AnuncioExtendido, Calificacion
+from .rankings_manager import RankingDisplay, RankingManager
+
+PREFIJO = 'bench_'
+PALABRAS = ['masajes', 'cena', 'compañía', 'discreción', 'elegante', 'viajes', 'eventos', 'spa', 'relax', 'tantra']
+
+
+def _pesos_zipf(cantidad, exponente):
+    """Pesos acumulados 1/rango^exponente para random.choices"""
+    return list(accumulate(1 / rango ** exponente for rango in range(1, cantidad + 1)))
+
+
+def limpiar():
+    """Borra los datos generados por sembrar() (en cascada desde los usuarios)"""
+    return Acompanante.objects.filter(username__startswith=PREFIJO).delete()[0]
+
+
+@transaction.atomic
+def sembrar(usuarios=200, anuncios_por_usuario=2, fotos_por_anuncio=3, calificaciones=5000,
+            exponente=1.2, semilla=42):
+    """
+    Genera datos con bulk_create (sin señales) y después recalcula lo que las
+    señales mantendrían: portada, agregados, snapshot de rankings e índice de búsqueda.
+    """
+    azar = random.Random(semilla)
+    ciudades = [catalogo.ciudad('Ecuador', nombre) for nombre in catalogo.ciudades_de('Ecuador')]
+    azar.shuffle(ciudades)
+    pesos_ciudad = _pesos_zipf(len(ciudades), exponente)
+    sexos = [sexo for lista in SEXOS_POR_CATEGORIA.values() for sexo in lista[:1]]
+
+    creados = Acompanante.objects.bulk_create([
+        Acompanante(
+            username=f'{PREFIJO}{semilla}_{i}', password='!', first_name=f'Bench {i}',
+            plan=azar.choice(['basico', 'premium']),
+        )
+        for i in range(usuarios)
+    ])
+
+    anuncios = []
+    for usuario in creados:
+        for _ in range(azar.randint(1, anuncios_por_usuario * 2 - 1)):
+            ciudad = azar.choices(ciudades, cum_weights=pesos_ciudad)[0]
+            sexo = azar.choices(sexos, weights=[6, 2, 2])[0]
+            anuncios.append(Anuncio(
+                usuario=usuario,
+                titulo=' '.join(azar.sample(PALABRAS, 3)).capitalize(),
+                descripcion=' '.join(azar.choices(PALABRAS, k=30)),
+                ciudad=ciudad.nombre, pais='Ecuador', ciudad_ref=ciudad,
+                precio=azar.choice([30, 50, 80, 120, 200, 300]),
+                sexo=sexo, categoria=catalogo.categoria(sexo),
+            ))
+    anuncios = Anuncio.objects.bulk_create(anuncios, batch_size=1000)
+
+    FotoAnuncio.objects.bulk_create([
+        FotoAnuncio(anuncio=anuncio, imagen=f'anuncios_fotos/bench/{anuncio.id}_{n}.jpg')
+        for anuncio in anuncios for n in range(azar.randint(1, fotos_por_anuncio))
+    ], batch_size=1000)
+    ids = [anuncio.id for anuncio in anuncios]
+    Anuncio.objects.filter(pk__in=ids).update(foto_principal=Subquery(
+        FotoAnuncio.objects.filter(anuncio=OuterRef('pk')).order_by('id').values('id')[:1]
+    ))
+
+    # Los anuncios de las ciudades grandes y los primeros del orden acaparan las calificaciones
+    azar.shuffle(anuncios)
+    pesos_anuncio = _pesos_zipf(len(anuncios), exponente)
+    filas = []
+    for n in range(calificaciones):
+        anuncio = azar.choices(anuncios, cum_weights=pesos_anuncio)[0]
+        filas.append(Calificacion(
+            anuncio=anuncio, nombre_cliente='Cliente', email_cliente=f'cliente{n}@bench.test',
+            puntuacion=azar.choices([1, 2, 3, 4, 5], weights=[1, 1, 3, 8, 10])[0],
+            trato=azar.randint(3, 5), puntualidad=azar.randint(2, 5),
+            verificado=azar.random() < 0.8,
+        ))
+    Calificacion.objects.bulk_create(filas, batch_size=1000)
+
+    AnuncioExtendido.recalcular_agregados(ids)
+    RankingManager.reconstruir_snapshot()
+    reindexar()
+    return {'usuarios': len(creados), 'anuncios': len(anuncios), 'calificaciones': len(filas)}
+
+
+def _percentil(valores, p):
+    """Percentil por rango más cercano"""
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, max(0, round(p / 100 * len(ordenados)) - 1))]
+
+
+def objetivos():
+    """{nombre: función sin argumentos} que se mide"""
+    cliente = Client()
+
+    def vista(url):
+        def pedir():
+            response = cliente.get(url)
+            if response.status_code != 200:
+                raise RuntimeError(f'{url} respondió {response.status_code}')
+        return pedir
+
+    def home_sin_cache():
+        cache.clear()
+        vista('/')()
+
+    return {
+        'home': vista('/'),
+        'home_sin_cache': home_sin_cache,
+        'listado_publico': vista('/publicaciones/'),
+        'listado_categoria': vista('/publicaciones/escorts-femeninos/'),
+        'listado_categoria_ciudad': vista('/publicaciones/escorts-femeninos/quito/'),
+        'acompanantes': vista('/acompanantes/'),
+        'buscar': vista('/buscar/?q=masajes'),
+        'home_rankings': lambda: RankingDisplay.get_home_rankings(),
+    }
+
+
+def medir(iteraciones=30, calentamiento=3, solo=None):
+    """{nombre: {p50_ms, p95_ms, max_ms, consultas}} de cada objetivo"""
+    resultados = {}
+    with override_settings(ALLOWED_HOSTS=['*'], INSTRUMENTACION_MUESTREO=0):
+        for nombre, funcion in objetivos().items():
+            if solo and nombre not in solo:
+                continue
+            for _ in range(calentamiento):
+                funcion()
+            tiempos, consultas = [], []
+            for _ in range(iteraciones):
+                with CaptureQueriesContext(connection) as capturadas:
+                    inicio = time.perf_counter()
+                    funcion()
+                    tiempos.append((time.perf_counter() - inicio) * 1000)
+                consultas.append(len(capturadas))
+            resultados[nombre] = {
+                'p50_ms': round(_percentil(tiempos, 50), 2),
+                'p95_ms': round(_percentil(tiempos, 95), 2),
+                'max_ms': round(max(tiempos), 2),
+                'consultas': max(consultas),
+            }
+    return resultados
+
+
+def comparar(resultados, baseline, tolerancia=0.2):
+    """
+    Regresiones frente a `baseline`: p95 más de `tolerancia` por encima o
+    más consultas. Devuelve {nombre: [motivos]}.
+    """
+    regresiones = {}
+    for nombre, actual in resultados.items():
+        anterior = baseline.get(nombre)
+        if anterior is None:
+            continue
+        motivos = []
+        if actual['p95_ms'] > anterior['p95_ms'] * (1 + tolerancia):
+            motivos.append(f"p95 {anterior['p95_ms']} -> {actual['p95_ms']} ms")
+        if actual['consultas'] > anterior['consultas']:
+            motivos.append(f"consultas {anterior['consultas']} -> {actual['consultas']}")
+        if motivos:
+            regresiones[nombre] = motivos
+    return regresiones
+
+
+def cargar_baseline(ruta):
+    with open(ruta, encoding='utf-8') as archivo:
+        return json.load(archivo)['resultados']
@@ -0,0 +1,136 @@
+# rankings/contadores.py
+"""
+Contadores de visitas y contactos con escritura diferida.
+Cada proceso acumula los incrementos en memoria y los vuelca cada
+CONTADORES_VACIADO_SEGUNDOS (o al pasar CONTADORES_VACIADO_MAXIMO eventos)
+con UPDATE ... SET x = x + delta agrupados por delta, después de responder
+el request. Como todas las escrituras son sumas, varios workers pueden
+vaciar a la vez sin pisarse. Si un worker muere sin salir limpio se
+pierden a lo sumo los eventos de su último intervalo.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.dispatch import receiver
+from django.utils import timezone
+from accounts.models import Anuncio
+from .models import AnuncioExtendido, EstadisticaDiaria, PerfilExtendido
+
+logger = logging.getLogger(__name__)
+
+# evento: (campo en AnuncioExtendido, campo en PerfilExtendido, campo en EstadisticaDiaria)
+EVENTOS = {
+    'visita': ('visualizaciones', 'total_visitas', 'visitas'),
+    'contacto': ('clicks_contacto', 'total_contactos', 'contactos'),
+}
+
+_lock = threading.Lock()
+_pendientes = Counter()  # (evento, anuncio_id, fecha) -> cantidad
+_ultimo_vaciado = time.monotonic()
+
+
+def registrar(evento, anuncio_id, cantidad=1):
+    """Suma `cantidad` al contador en memoria; no toca la base de datos"""
+    if evento not in EVENTOS:
+        raise ValueError(f"Evento desconocido: '{evento}'")
+    with _lock:
+        _pendientes[(evento, anuncio_id, timezone.localdate())] += cantidad
+
+
+def hay_que_vaciar():
+    intervalo = getattr(settings, 'CONTADORES_VACIADO_SEGUNDOS', 10)
+    maximo = getattr(settings, 'CONTADORES_VACIADO_MAXIMO', 1000)
+    with _lock:
+        if not _pendientes:
+            return False
+        return time.monotonic() - _ultimo_vaciado >= intervalo or sum(_pendientes.values()) >= maximo
+
+
+def _sumar(queryset, columna_id, campo, deltas):
+    """Un UPDATE por cada delta distinto: campo = campo + delta WHERE id IN (...)"""
+    por_delta = defaultdict(list)
+    for objeto_id, delta in deltas.items():
+        por_delta[delta].append(objeto_id)
+    for delta, ids in por_delta.items():
+        queryset.filter(**{f'{columna_id}__in': ids}).update(**{campo: F(campo) + delta})
+
+
+def _aplicar(pendientes):
+    duenos = dict(Anuncio.objects.filter(
+        pk__in={anuncio_id for _, anuncio_id, _ in pendientes}
+    ).values_list('id', 'usuario_id'))
+    # Los anuncios borrados mientras tanto se descartan
+    pendientes = {clave: cantidad for clave, cantidad in pendientes.items() if clave[1] in duenos}
+
+    por_anuncio = defaultdict(Counter)  # evento -> {anuncio_id: delta}
+    por_perfil = defaultdict(Counter)
+    por_dia = defaultdict(Counter)  # (evento, fecha) -> {anuncio_id: delta}
+    for (evento, anuncio_id, fecha), cantidad in pendientes.items():
+        por_anuncio[evento][anuncio_id] += cantidad
+        por_perfil[evento][duenos[anuncio_id]] += cantidad
+        por_dia[(evento, fecha)][anuncio_id] += cantidad
+
+    # Las filas que falten (anuncios o perfiles nuevos, días nuevos) se crean en
+    # cero antes de sumar; si otro worker las crea a la vez, no hay conflicto
+    AnuncioExtendido.objects.bulk_create(
+        [AnuncioExtendido(anuncio_id=anuncio_id) for anuncio_id in {anuncio_id for _, anuncio_id, _ in pendientes}],
+        ignore_conflicts=True,
+    )
+    PerfilExtendido.objects.bulk_create(
+        [PerfilExtendido(acompanante_id=usuario_id) for usuario_id in set(duenos.values())],
+        ignore_conflicts=True,
+    )
+    EstadisticaDiaria.objects.bulk_create(
+        [EstadisticaDiaria(anuncio_id=anuncio_id, fecha=fecha)
+         for anuncio_id, fecha in {(anuncio_id, fecha) for _, anuncio_id, fecha in pendientes}],
+        ignore_conflicts=True,
+    )
+    for evento, deltas in por_anuncio.items():
+        campo_anuncio, campo_perfil, _ = EVENTOS[evento]
+        _sumar(AnuncioExtendido.objects, 'anuncio_id', campo_anuncio, deltas)
+        _sumar(PerfilExtendido.objects, 'acompanante_id', campo_perfil, por_perfil[evento])
+    for (evento, fecha), deltas in por_dia.items():
+        _sumar(EstadisticaDiaria.objects.filter(fecha=fecha), 'anuncio_id', EVENTOS[evento][2], deltas)
+
+
+def vaciar():
+    """Escribe los incrementos pendientes de este proceso; devuelve cuántos eventos se guardaron"""
+    global _pendientes, _ultimo_vaciado
+    with _lock:
+        pendientes, _pendientes = _pendientes, Counter()
+        _ultimo_vaciado = time.monotonic()
+    if not pendientes:
+        return 0
+    try:
+        with transaction.atomic():
+            _aplicar(pendientes)
+    except Exception:
+        logger.exception("No se pudieron guardar %s eventos; se reintenta en el próximo vaciado", sum(pendientes.values()))
+        with _lock:
+            _pendientes.update(pendientes)
+        return 0
+    return sum(pendientes.values())
+
+
+@receiver(request_finished)
+def vaciar_despues_del_request(sender, **kwargs):
+    """El vaciado corre cuando la respuesta ya salió, no suma latencia al usuario"""
+    if hay_que_vaciar():
+        try:
+            vaciar()
+        finally:
+            # Django ya cerró las conexiones de este request (close_old_connections
+            # corre antes en request_finished): la que abrió el vaciado no debe
+            # quedar tomada del pool fuera de un request
+            close_old_connections()
+
+
+atexit.register(vaciar)
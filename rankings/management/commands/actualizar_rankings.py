@@ -0,0 +1,34 @@
+# rankings/management/commands/actualizar_rankings.py
+"""
+Recalcula puntuacion_ranking y posicion_ranking de todos los perfiles.
+"""
+
+from django.core.management.base import BaseCommand
+from rankings.rankings_manager import RankingManager
+
+
+class Command(BaseCommand):
+    help = 'Recalcula puntuacion_ranking y posicion_ranking de PerfilExtendido por lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Perfiles por lote (default: 500)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Calcula y reporta sin escribir en la base de datos')
+
+    def handle(self, *args, **options):
+        def progreso(procesados, total):
+            self.stdout.write(f"  {procesados}/{total} perfiles")
+
+        resultado = RankingManager.actualizar_rankings_automatico(
+            chunk_size=options['chunk_size'],
+            dry_run=options['dry_run'],
+            progreso=progreso,
+        )
+        prefijo = '[dry-run] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefijo}{resultado['perfiles']} perfiles, "
+            f"{resultado['puntuaciones_cambiadas']} puntuaciones y "
+            f"{resultado['posiciones_cambiadas']} posiciones cambiadas "
+            f"(puntuación {resultado['tiempo_puntuacion']:.2f}s, total {resultado['tiempo_total']:.2f}s)"
+        ))
@@ -0,0 +1,38 @@
+# rankings/management/commands/backfill_calificaciones_diarias.py
+"""
+Rehace la tabla CalificacionDiaria desde las calificaciones crudas.
+Para la carga inicial o para reparar desvíos; el camino normal son los deltas.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from iscort.lotes import iterar_en_lotes
+from rankings.models import Calificacion, CalificacionDiaria
+
+
+class Command(BaseCommand):
+    help = 'Recalcula CalificacionDiaria (calificaciones verificadas por anuncio y día) por lotes de anuncios'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Anuncios por lote (default: 500)')
+
+    def handle(self, *args, **options):
+        inicio = time.monotonic()
+        anuncio_ids = Calificacion.objects.filter(verificado=True).values_list(
+            'anuncio_id', flat=True
+        ).distinct().order_by('anuncio_id')
+        anuncios = 0
+        for lote in iterar_en_lotes(anuncio_ids, options['chunk_size']):
+            with transaction.atomic():
+                CalificacionDiaria.recalcular(lote)
+            anuncios += len(lote)
+            self.stdout.write(f"  {anuncios} anuncios")
+        # Anuncios que ya no tienen calificaciones verificadas
+        CalificacionDiaria.objects.exclude(anuncio__calificaciones__verificado=True).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f"{CalificacionDiaria.objects.count()} filas diarias de {anuncios} anuncios "
+            f"en {time.monotonic() - inicio:.2f}s"
+        ))
@@ -0,0 +1,49 @@
+# rankings/management/commands/benchmark.py
+"""
+Mide las vistas públicas y get_home_rankings contra la base actual
+(ver seed_bench) y compara con un baseline guardado.
+"""
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from accounts.models import Anuncio
+from rankings import benchmark
+from rankings.models import Calificacion
+
+
+class Command(BaseCommand):
+    help = 'Reporta p50/p95 y cantidad de consultas de las vistas públicas en JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iteraciones', type=int, default=30)
+        parser.add_argument('--calentamiento', type=int, default=3)
+        parser.add_argument('--solo', nargs='*', default=None, help='Nombres de objetivos a medir')
+        parser.add_argument('--salida', help='Archivo donde guardar el reporte JSON')
+        parser.add_argument('--baseline', help='Reporte JSON anterior contra el cual comparar')
+        parser.add_argument('--tolerancia', type=float, default=0.2, help='Aumento de p95 aceptado (0.2 = 20%%)')
+        parser.add_argument('--estricto', action='store_true', help='Termina con error si hay regresiones')
+
+    def handle(self, *args, **options):
+        reporte = {
+            'fecha': timezone.now().isoformat(),
+            'motor': connection.vendor,
+            'datos': {'anuncios': Anuncio.objects.count(), 'calificaciones': Calificacion.objects.count()},
+            'iteraciones': options['iteraciones'],
+            'resultados': benchmark.medir(options['iteraciones'], options['calentamiento'], options['solo']),
+        }
+        if options['baseline']:
+            reporte['regresiones'] = benchmark.comparar(
+                reporte['resultados'], benchmark.cargar_baseline(options['baseline']), options['tolerancia']
+            )
+
+        texto = json.dumps(reporte, indent=2, ensure_ascii=False)
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                archivo.write(texto + '\n')
+        self.stdout.write(texto)
+
+        if reporte.get('regresiones') and options['estricto']:
+            raise CommandError(f"Regresiones en: {', '.join(reporte['regresiones'])}")
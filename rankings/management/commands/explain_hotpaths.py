@@ -0,0 +1,84 @@
+# rankings/management/commands/explain_hotpaths.py
+"""
+Corre EXPLAIN sobre las consultas calientes (rankings, listados, home)
+contra la base de datos actual y marca los recorridos secuenciales.
+"""
+
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from accounts.models import Anuncio
+from accounts.views import anuncios_listado
+from rankings.models import RankingSnapshot
+from rankings.rankings_manager import RankingManager
+
+# Recorrido completo de una tabla, por motor. En SQLite "SCAN t USING INDEX" recorre un índice, no la tabla
+SEQ_SCAN = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (\w+)\s*$', re.MULTILINE),
+}
+
+
+def consultas_calientes(ciudad, categoria):
+    """{nombre: queryset} de lo que se ejecuta en cada request de home, listados y rankings"""
+    listado = lambda qs: qs.order_by('-creado', '-id')[:25]
+    return {
+        'listado': listado(anuncios_listado()),
+        'listado_categoria': listado(anuncios_listado(categoria=categoria)),
+        'listado_categoria_ciudad': listado(anuncios_listado(categoria=categoria, ciudad=ciudad)),
+        'listado_cercania': listado(anuncios_listado(categoria=categoria, ciudad=ciudad, radio_km=150)),
+        'top_femeninos': RankingManager.get_top_escorts_femeninos(),
+        'top_por_ciudad': RankingManager.get_top_por_ciudad(ciudad),
+        'destacados_del_mes': RankingManager.get_destacados_del_mes(),
+        'nuevos_verificados': RankingManager.get_nuevos_verificados(),
+        'mejores_por_trato': RankingManager.get_mejores_por_trato(),
+        'home_rankings': RankingSnapshot.objects.filter(
+            lista__in=[RankingSnapshot.LISTA_CATEGORIA, RankingSnapshot.LISTA_DESTACADOS], posicion__lte=6,
+        ).select_related('anuncio__usuario', 'anuncio__foto_principal').order_by('lista', 'categoria', 'posicion'),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Muestra el plan (EXPLAIN) de las consultas calientes y marca los recorridos secuenciales'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ciudad', default=None, help='Ciudad de ejemplo (por defecto la del anuncio más reciente)')
+        parser.add_argument('--categoria', default='escorts-femeninos', help='Slug de categoría para el listado')
+        parser.add_argument('--solo', nargs='*', default=None, help='Nombres de consultas a revisar')
+        parser.add_argument('--sin-seqscan', action='store_true',
+                            help='Postgres: desalienta Seq Scan para ver si hay un índice utilizable '
+                                 '(con tablas chicas el planner lo prefiere igual)')
+        parser.add_argument('--estricto', action='store_true', help='Termina con error si hay recorridos secuenciales')
+
+    def handle(self, *args, **options):
+        patron = SEQ_SCAN.get(connection.vendor)
+        if patron is None:
+            raise CommandError(f"EXPLAIN no soportado para '{connection.vendor}'")
+        ciudad = options['ciudad'] or (
+            Anuncio.objects.order_by('-creado').values_list('ciudad', flat=True).first() or 'quito'
+        )
+        consultas = consultas_calientes(ciudad, options['categoria'])
+        if options['solo']:
+            consultas = {nombre: qs for nombre, qs in consultas.items() if nombre in options['solo']}
+
+        marcadas = []
+        with transaction.atomic():
+            if options['sin_seqscan'] and connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+            for nombre, queryset in consultas.items():
+                plan = queryset.explain()
+                tablas = sorted(set(patron.findall(plan)))
+                self.stdout.write(self.style.MIGRATE_HEADING(f'== {nombre}'))
+                self.stdout.write(plan)
+                if tablas:
+                    marcadas.append(nombre)
+                    self.stdout.write(self.style.WARNING(f"  Recorrido secuencial en: {', '.join(tablas)}"))
+
+        if not marcadas:
+            self.stdout.write(self.style.SUCCESS(f'{len(consultas)} consultas sin recorridos secuenciales'))
+        elif options['estricto']:
+            raise CommandError(f"Recorridos secuenciales en: {', '.join(marcadas)}")
+        else:
+            self.stdout.write(self.style.WARNING(f"{len(marcadas)}/{len(consultas)} consultas con recorridos secuenciales"))
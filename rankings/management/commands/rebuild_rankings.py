@@ -0,0 +1,28 @@
+# rankings/management/commands/rebuild_rankings.py
+"""
+Reconstruye la tabla materializada de rankings.
+Corre en cada deploy; después la mantiene al día la tarea periódica de
+rankings.tareas, que este comando encola si no hay una pendiente.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from rankings.rankings_manager import RankingManager
+from rankings.tareas import programar_reconstruccion
+
+
+class Command(BaseCommand):
+    help = 'Recalcula la tabla RankingSnapshot (top por categoría, por ciudad y destacados del mes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limite', type=int, default=None,
+                            help='Posiciones a guardar por lista (por defecto RANKING_SNAPSHOT_LIMITE)')
+
+    def handle(self, *args, **options):
+        inicio = time.monotonic()
+        total = RankingManager.reconstruir_snapshot(options['limite'])
+        programar_reconstruccion()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rankings reconstruidos: {total} filas en {time.monotonic() - inicio:.2f}s"
+        ))
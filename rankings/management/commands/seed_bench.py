@@ -0,0 +1,41 @@
+# rankings/management/commands/seed_bench.py
+"""
+Genera datos sintéticos para `manage.py benchmark`.
+No usar contra la base de producción: crea usuarios bench_*.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from rankings import benchmark
+
+
+class Command(BaseCommand):
+    help = 'Crea acompañantes, anuncios, fotos y calificaciones sintéticas con distribución asimétrica'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=200)
+        parser.add_argument('--anuncios-por-usuario', type=int, default=2, help='Promedio por usuario')
+        parser.add_argument('--fotos-por-anuncio', type=int, default=3, help='Máximo por anuncio')
+        parser.add_argument('--calificaciones', type=int, default=5000)
+        parser.add_argument('--exponente', type=float, default=1.2,
+                            help='Asimetría (Zipf) de ciudades y calificaciones; 0 es uniforme')
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--limpiar', action='store_true', help='Borra antes los datos bench_* existentes')
+
+    def handle(self, *args, **options):
+        if options['limpiar']:
+            self.stdout.write(f"Borradas {benchmark.limpiar()} filas de datos sintéticos anteriores")
+        inicio = time.monotonic()
+        totales = benchmark.sembrar(
+            usuarios=options['usuarios'],
+            anuncios_por_usuario=options['anuncios_por_usuario'],
+            fotos_por_anuncio=options['fotos_por_anuncio'],
+            calificaciones=options['calificaciones'],
+            exponente=options['exponente'],
+            semilla=options['semilla'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Creados {totales['usuarios']} usuarios, {totales['anuncios']} anuncios y "
+            f"{totales['calificaciones']} calificaciones en {time.monotonic() - inicio:.2f}s"
+        ))
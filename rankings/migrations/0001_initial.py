@@ -0,0 +1,84 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('accounts', '0003_acompanante_plan'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnuncioExtendido',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('categoria', models.CharField(choices=[('escorts-femeninos', 'Escort Femenino'), ('escorts-masculinos', 'Escort Masculino'), ('trans-travestis', 'Trans y Travestis')], default='escorts-femeninos', max_length=50)),
+                ('direccion', models.CharField(blank=True, max_length=200)),
+                ('barrio', models.CharField(blank=True, max_length=100)),
+                ('edad', models.IntegerField(default=18)),
+                ('detalle_sexo', models.CharField(blank=True, max_length=100)),
+                ('servicios', models.TextField(blank=True)),
+                ('atiende_a', models.CharField(blank=True, max_length=100)),
+                ('lugar', models.CharField(blank=True, max_length=100)),
+                ('pago_efectivo', models.BooleanField(default=False)),
+                ('pago_tarjeta', models.BooleanField(default=False)),
+                ('telefono', models.CharField(blank=True, max_length=15)),
+                ('whatsapp', models.BooleanField(default=False)),
+                ('correo', models.EmailField(blank=True, max_length=254)),
+                ('mostrar_contacto', models.CharField(choices=[('ambos', 'Teléfono y correo'), ('telefono', 'Solo teléfono'), ('correo', 'Solo correo')], default='ambos', max_length=20)),
+                ('activo', models.BooleanField(default=True)),
+                ('destacado', models.BooleanField(default=False)),
+                ('vip', models.BooleanField(default=False)),
+                ('puntuacion_promedio', models.FloatField(default=0.0)),
+                ('total_calificaciones', models.IntegerField(default=0)),
+                ('visualizaciones', models.IntegerField(default=0)),
+                ('clicks_contacto', models.IntegerField(default=0)),
+                ('anuncio', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='anuncio_extendido', to='accounts.anuncio')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PerfilExtendido',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('telefono_verificado', models.BooleanField(default=False)),
+                ('email_verificado', models.BooleanField(default=False)),
+                ('documento_verificado', models.BooleanField(default=False)),
+                ('puntuacion_ranking', models.FloatField(default=0.0)),
+                ('posicion_ranking', models.IntegerField(default=0)),
+                ('etnia', models.CharField(blank=True, max_length=50)),
+                ('nacionalidad', models.CharField(blank=True, max_length=50)),
+                ('sobre_ti', models.TextField(blank=True)),
+                ('total_visitas', models.IntegerField(default=0)),
+                ('total_contactos', models.IntegerField(default=0)),
+                ('acompanante', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='perfil_extendido', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Calificacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre_cliente', models.CharField(max_length=100)),
+                ('email_cliente', models.EmailField(max_length=254)),
+                ('puntuacion', models.IntegerField(choices=[(1, 1), (2, 2), (3, 3), (4, 4), (5, 5)])),
+                ('comentario', models.TextField(blank=True)),
+                ('trato', models.IntegerField(blank=True, choices=[(1, 1), (2, 2), (3, 3), (4, 4), (5, 5)], null=True)),
+                ('puntualidad', models.IntegerField(blank=True, choices=[(1, 1), (2, 2), (3, 3), (4, 4), (5, 5)], null=True)),
+                ('higiene', models.IntegerField(blank=True, choices=[(1, 1), (2, 2), (3, 3), (4, 4), (5, 5)], null=True)),
+                ('servicio', models.IntegerField(blank=True, choices=[(1, 1), (2, 2), (3, 3), (4, 4), (5, 5)], null=True)),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('ip_cliente', models.GenericIPAddressField(blank=True, null=True)),
+                ('verificado', models.BooleanField(default=False)),
+                ('anuncio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='calificaciones', to='accounts.anuncio')),
+            ],
+            options={
+                'unique_together': {('anuncio', 'email_cliente')},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_acompanante_plan'),
+        ('rankings', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RankingSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lista', models.CharField(choices=[('categoria', 'Top por categoría'), ('ciudad', 'Top por ciudad'), ('destacados', 'Destacados del mes')], max_length=20)),
+                ('categoria', models.CharField(blank=True, max_length=50)),
+                ('ciudad', models.CharField(blank=True, max_length=100)),
+                ('posicion', models.PositiveIntegerField()),
+                ('avg_rating', models.FloatField(default=0.0)),
+                ('total_reviews', models.IntegerField(default=0)),
+                ('score', models.FloatField(default=0.0)),
+                ('generado', models.DateTimeField(auto_now_add=True)),
+                ('anuncio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rankings_snapshot', to='accounts.anuncio')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['lista', 'categoria', 'ciudad', 'posicion'], name='ranking_snapshot_lookup')],
+            },
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:38
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+SUBPUNTAJES = ('trato', 'puntualidad', 'higiene', 'servicio')
+
+
+def calcular_agregados(apps, schema_editor):
+    """Llena las columnas acumuladas a partir de las calificaciones verificadas existentes"""
+    Calificacion = apps.get_model('rankings', 'Calificacion')
+    AnuncioExtendido = apps.get_model('rankings', 'AnuncioExtendido')
+    totales = {'total_calificaciones': Count('id'), 'suma_puntuacion': Sum('puntuacion')}
+    for campo in SUBPUNTAJES:
+        totales[f'total_{campo}'] = Count(campo)
+        totales[f'suma_{campo}'] = Sum(campo)
+    filas = Calificacion.objects.filter(verificado=True).values('anuncio_id').annotate(**totales)
+    for fila in filas:
+        anuncio_id = fila.pop('anuncio_id')
+        valores = {campo: valor or 0 for campo, valor in fila.items()}
+        valores['puntuacion_promedio'] = valores['suma_puntuacion'] / valores['total_calificaciones']
+        AnuncioExtendido.objects.update_or_create(anuncio_id=anuncio_id, defaults=valores)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rankings', '0002_rankingsnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='anuncioextendido',
+            name='suma_higiene',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='anuncioextendido',
+            name='suma_puntuacion',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='anuncioextendido',
+            name='suma_puntualidad',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='anuncioextendido',
+            name='suma_servicio',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='anuncioextendido',
+            name='suma_trato',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='anuncioextendido',
+            name='total_higiene',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='anuncioextendido',
+            name='total_puntualidad',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='anuncioextendido',
+            name='total_servicio',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='anuncioextendido',
+            name='total_trato',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(calcular_agregados, migrations.RunPython.noop),
+    ]
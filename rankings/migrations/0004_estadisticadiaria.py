@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_indicebusqueda'),
+        ('rankings', '0003_agregados_calificaciones'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadisticaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('visitas', models.PositiveIntegerField(default=0)),
+                ('contactos', models.PositiveIntegerField(default=0)),
+                ('anuncio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='estadisticas_diarias', to='accounts.anuncio')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('anuncio', 'fecha'), name='estadistica_diaria_unica')],
+            },
+        ),
+    ]
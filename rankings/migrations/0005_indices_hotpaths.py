@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_indices_hotpaths'),
+        ('rankings', '0004_estadisticadiaria'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='calificacion',
+            index=models.Index(fields=['anuncio', 'verificado', 'fecha'], name='calificacion_verif_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.1 on 2026-10-18 16:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+SUBPUNTAJES = ('trato', 'puntualidad', 'higiene', 'servicio')
+
+
+def cargar_historico(apps, schema_editor):
+    """Carga inicial; después se repara con `manage.py backfill_calificaciones_diarias`"""
+    Calificacion = apps.get_model('rankings', 'Calificacion')
+    CalificacionDiaria = apps.get_model('rankings', 'CalificacionDiaria')
+    totales = {'total_calificaciones': Count('id'), 'suma_puntuacion': Sum('puntuacion')}
+    for campo in SUBPUNTAJES:
+        totales[f'total_{campo}'] = Count(campo)
+        totales[f'suma_{campo}'] = Sum(campo)
+    filas = Calificacion.objects.filter(verificado=True).annotate(dia=TruncDate('fecha')).values(
+        'anuncio_id', 'dia'
+    ).annotate(**totales).order_by()
+    CalificacionDiaria.objects.bulk_create([
+        CalificacionDiaria(anuncio_id=fila.pop('anuncio_id'), fecha=fila.pop('dia'),
+                           **{columna: valor or 0 for columna, valor in fila.items()})
+        for fila in filas
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_anuncio_oculto'),
+        ('rankings', '0005_indices_hotpaths'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CalificacionDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('total_calificaciones', models.PositiveIntegerField(default=0)),
+                ('suma_puntuacion', models.PositiveIntegerField(default=0)),
+                ('suma_trato', models.PositiveIntegerField(default=0)),
+                ('total_trato', models.PositiveIntegerField(default=0)),
+                ('suma_puntualidad', models.PositiveIntegerField(default=0)),
+                ('total_puntualidad', models.PositiveIntegerField(default=0)),
+                ('suma_higiene', models.PositiveIntegerField(default=0)),
+                ('total_higiene', models.PositiveIntegerField(default=0)),
+                ('suma_servicio', models.PositiveIntegerField(default=0)),
+                ('total_servicio', models.PositiveIntegerField(default=0)),
+                ('anuncio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='calificaciones_diarias', to='accounts.anuncio')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['fecha', 'anuncio'], name='calificacion_diaria_fecha_idx')],
+                'constraints': [models.UniqueConstraint(fields=('anuncio', 'fecha'), name='calificacion_diaria_unica')],
+            },
+        ),
+        migrations.RunPython(cargar_historico, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 17:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rankings', '0006_calificaciondiaria'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='anuncioextendido',
+            name='edad',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
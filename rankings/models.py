@@ -4,10 +4,28 @@ Modelos para el sistema de rankings y calificaciones
 Separado de la app accounts para evitar problemas de migración
 """
 
-from django.db import models
-from django.db.models import Avg
+from django.db import models, transaction
+from django.db.models import Case, Count, F, FloatField, Sum, When
+from django.db.models.functions import Cast, TruncDate
+from django.utils import timezone
 from accounts.models import Anuncio, Acompanante
 
+# Sub-puntajes opcionales de una calificación
+SUBPUNTAJES = ('trato', 'puntualidad', 'higiene', 'servicio')
+CAMPOS_AGREGADOS = ('verificado', 'puntuacion') + SUBPUNTAJES
+COLUMNAS_AGREGADAS = ['total_calificaciones', 'suma_puntuacion'] + [
+    f'{prefijo}_{campo}' for campo in SUBPUNTAJES for prefijo in ('total', 'suma')
+]
+
+
+def _totales_calificaciones():
+    """Agregados de COLUMNAS_AGREGADAS sobre un queryset de Calificacion agrupado"""
+    totales = {'total_calificaciones': Count('id'), 'suma_puntuacion': Sum('puntuacion')}
+    for campo in SUBPUNTAJES:
+        totales[f'total_{campo}'] = Count(campo)
+        totales[f'suma_{campo}'] = Sum(campo)
+    return totales
+
 class Calificacion(models.Model):
     """Modelo para calificaciones de clientes a escorts"""
     anuncio = models.ForeignKey(Anuncio, on_delete=models.CASCADE, related_name='calificaciones')
@@ -29,29 +47,64 @@ class Calificacion(models.Model):
     
     class Meta:
         unique_together = ['anuncio', 'email_cliente']  # Una calificación por email por anuncio
+        indexes = [
+            # Agregados y destacados: calificaciones verificadas de un anuncio por fecha
+            models.Index(fields=['anuncio', 'verificado', 'fecha'], name='calificacion_verif_fecha_idx'),
+        ]
+    
+    def aporte(self):
+        """Lo que esta calificación suma a las columnas agregadas de AnuncioExtendido"""
+        if not self.verificado:
+            return {}
+        aporte = {'suma_puntuacion': self.puntuacion, 'total_calificaciones': 1}
+        for campo in SUBPUNTAJES:
+            valor = getattr(self, campo)
+            if valor is not None:
+                aporte[f'suma_{campo}'] = valor
+                aporte[f'total_{campo}'] = 1
+        return aporte
         
+    def aporte_guardado(self):
+        """
+        (anuncio_id, día, aporte) de la fila tal como está en la base, leída con
+        lock; None si no existe. Llamar dentro de una transacción.
+        """
+        # No se usa la copia en memoria: dos guardados a la vez (dos moderadores
+        # verificando la misma calificación) no pueden aplicar el mismo delta dos veces
+        fila = Calificacion.objects.select_for_update().filter(pk=self.pk).values(
+            'anuncio_id', 'fecha', *CAMPOS_AGREGADOS
+        ).first()
+        if fila is None:
+            return None
+        anuncio_id, fecha = fila.pop('anuncio_id'), fila.pop('fecha')
+        return anuncio_id, timezone.localdate(fecha), Calificacion(**fila).aporte()
+
+    @staticmethod
+    def aplicar_aporte(anuncio_id, dia, delta):
+        """Suma `delta` a los agregados del anuncio y a su fila del día"""
+        AnuncioExtendido.aplicar_delta(anuncio_id, delta)
+        CalificacionDiaria.aplicar_delta(anuncio_id, dia, delta)
+
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        # Actualizar puntuación del anuncio cuando se guarda una calificación
-        self.actualizar_puntuacion_anuncio()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not set(update_fields) & {'anuncio', 'anuncio_id', *CAMPOS_AGREGADOS}:
+            return super().save(*args, **kwargs)  # No cambia lo que aporta a los agregados
+        with transaction.atomic():
+            guardada = None if self._state.adding else self.aporte_guardado()
+            super().save(*args, **kwargs)
+            dia, nuevo, anterior = timezone.localdate(self.fecha), self.aporte(), {}
+            if guardada is not None:
+                anuncio_id, dia_anterior, anterior = guardada
+                if (anuncio_id, dia_anterior) != (self.anuncio_id, dia):
+                    # La calificación se movió a otro anuncio: se descuenta de donde estaba
+                    self.aplicar_aporte(anuncio_id, dia_anterior, {campo: -valor for campo, valor in anterior.items()})
+                    anterior = {}
+            delta = {campo: nuevo.get(campo, 0) - anterior.get(campo, 0) for campo in nuevo.keys() | anterior.keys()}
+            self.aplicar_aporte(self.anuncio_id, dia, delta)
     
     def actualizar_puntuacion_anuncio(self):
-        """Actualiza la puntuación promedio del anuncio"""
-        calificaciones_verificadas = Calificacion.objects.filter(
-            anuncio=self.anuncio, 
-            verificado=True
-        )
-        
-        if calificaciones_verificadas.exists():
-            promedio = calificaciones_verificadas.aggregate(Avg('puntuacion'))['puntuacion__avg']
-            # Actualizamos campos en el anuncio (los agregamos después)
-            self.anuncio.puntuacion_promedio = round(promedio, 1)
-            self.anuncio.total_calificaciones = calificaciones_verificadas.count()
-        else:
-            self.anuncio.puntuacion_promedio = 0.0
-            self.anuncio.total_calificaciones = 0
-        
-        self.anuncio.save()
+        """Recalcula desde cero los agregados del anuncio (reparación, no es el camino normal)"""
+        AnuncioExtendido.recalcular_agregados([self.anuncio_id])
 
     def __str__(self):
         return f"Calificación {self.puntuacion}★ para {self.anuncio.titulo}"
@@ -79,42 +132,10 @@ class PerfilExtendido(models.Model):
     total_contactos = models.IntegerField(default=0)
     
     def calcular_ranking(self):
-        """Calcula el puntaje de ranking basado en varios factores"""
-        score = 0
-        
-        # 1. Promedio de calificaciones (40% del score)
-        calificaciones = Calificacion.objects.filter(
-            anuncio__usuario=self.acompanante, 
-            verificado=True
-        )
-        if calificaciones.exists():
-            promedio = calificaciones.aggregate(Avg('puntuacion'))['puntuacion__avg']
-            score += (promedio / 5.0) * 40
-        
-        # 2. Completitud del perfil (20% del score)
-        completitud = self.calcular_completitud_perfil()
-        score += completitud * 20
-        
-        # 3. Número de anuncios activos (15% del score)
-        anuncios_activos = self.acompanante.anuncios.filter(activo=True).count()
-        score += min(15, anuncios_activos * 5)
-        
-        # 4. Verificaciones (15% del score)
-        verificaciones = 0
-        if self.email_verificado: verificaciones += 1
-        if self.telefono_verificado: verificaciones += 1
-        if self.documento_verificado: verificaciones += 1
-        score += (verificaciones / 3.0) * 15
-        
-        # 5. Actividad reciente (10% del score)
-        from django.utils import timezone
-        if self.acompanante.anuncios.exists():
-            ultimo_anuncio = self.acompanante.anuncios.latest('actualizado')
-            dias_inactivo = (timezone.now() - ultimo_anuncio.actualizado).days
-            score += max(0, 10 - dias_inactivo)
-        
-        self.puntuacion_ranking = round(score, 2)
-        self.save()
+        """Calcula el puntaje de ranking basado en varios factores (ver RankingManager)"""
+        from .rankings_manager import RankingManager
+        self.puntuacion_ranking = RankingManager.calcular_puntuaciones_perfiles([self])[self.pk]
+        self.save(update_fields=['puntuacion_ranking'])
         return self.puntuacion_ranking
     
     def calcular_completitud_perfil(self):
@@ -146,7 +167,7 @@ class AnuncioExtendido(models.Model):
     ], default='escorts-femeninos')
     direccion = models.CharField(max_length=200, blank=True)
     barrio = models.CharField(max_length=100, blank=True)
-    edad = models.IntegerField(default=18)
+    edad = models.IntegerField(null=True, blank=True)  # None si el anuncio no la informó
     detalle_sexo = models.CharField(max_length=100, blank=True)
     
     # Servicios
@@ -170,17 +191,104 @@ class AnuncioExtendido(models.Model):
     activo = models.BooleanField(default=True)
     destacado = models.BooleanField(default=False)
     vip = models.BooleanField(default=False)
-    puntuacion_promedio = models.FloatField(default=0.0)
+    puntuacion_promedio = models.FloatField(default=0.0)  # Derivado de suma/total
     total_calificaciones = models.IntegerField(default=0)
     
+    # Agregados acumulados de calificaciones verificadas (se actualizan con F())
+    suma_puntuacion = models.IntegerField(default=0)
+    suma_trato = models.IntegerField(default=0)
+    total_trato = models.IntegerField(default=0)
+    suma_puntualidad = models.IntegerField(default=0)
+    total_puntualidad = models.IntegerField(default=0)
+    suma_higiene = models.IntegerField(default=0)
+    total_higiene = models.IntegerField(default=0)
+    suma_servicio = models.IntegerField(default=0)
+    total_servicio = models.IntegerField(default=0)
+    
     # Estadísticas
     visualizaciones = models.IntegerField(default=0)
     clicks_contacto = models.IntegerField(default=0)
     
+    @classmethod
+    def aplicar_delta(cls, anuncio_id, delta):
+        """
+        Suma `delta` ({columna: incremento}) a los agregados del anuncio en un solo
+        UPDATE atómico y deriva el promedio en la misma sentencia. Costo O(1).
+        """
+        delta = {campo: valor for campo, valor in delta.items() if valor}
+        if not delta:
+            return
+        cambios = {campo: F(campo) + valor for campo, valor in delta.items()}
+        # En SQL el lado derecho ve los valores previos, por eso se suma el delta aquí también
+        total = delta.get('total_calificaciones', 0)
+        cambios['puntuacion_promedio'] = Case(
+            When(
+                total_calificaciones__gt=-total,
+                then=Cast(F('suma_puntuacion') + delta.get('suma_puntuacion', 0), FloatField())
+                / (F('total_calificaciones') + total),
+            ),
+            default=0.0,
+            output_field=FloatField(),
+        )
+        if cls.objects.filter(anuncio_id=anuncio_id).update(**cambios):
+            return
+        if any(valor < 0 for valor in delta.values()):
+            # Restar de una fila que no existe (p. ej. el anuncio se está borrando)
+            return
+        cls.objects.get_or_create(anuncio_id=anuncio_id)
+        cls.objects.filter(anuncio_id=anuncio_id).update(**cambios)
+    
+    @classmethod
+    def recalcular_agregados(cls, anuncio_ids):
+        """
+        Recalcula desde cero los agregados de varios anuncios: una consulta agrupada
+        sobre las calificaciones verificadas y un bulk_update, en una transacción.
+        También rehace sus filas de CalificacionDiaria.
+        """
+        anuncio_ids = set(anuncio_ids)
+        if not anuncio_ids:
+            return 0
+        totales = _totales_calificaciones()
+
+        with transaction.atomic():
+            existentes = {
+                extendido.anuncio_id: extendido
+                for extendido in cls.objects.select_for_update().filter(
+                    anuncio_id__in=anuncio_ids
+                ).only('anuncio_id', 'puntuacion_promedio', *COLUMNAS_AGREGADAS)
+            }
+            por_anuncio = {
+                fila.pop('anuncio_id'): fila
+                for fila in Calificacion.objects.filter(
+                    anuncio_id__in=anuncio_ids,
+                    verificado=True
+                ).values('anuncio_id').annotate(**totales).order_by()
+            }
+            nuevos = [cls(anuncio_id=anuncio_id) for anuncio_id in por_anuncio.keys() - existentes.keys()]
+            for extendido in list(existentes.values()) + nuevos:
+                valores = por_anuncio.get(extendido.anuncio_id, {})
+                for columna in COLUMNAS_AGREGADAS:
+                    setattr(extendido, columna, valores.get(columna) or 0)
+                extendido.puntuacion_promedio = (
+                    extendido.suma_puntuacion / extendido.total_calificaciones
+                    if extendido.total_calificaciones else 0.0
+                )
+            cls.objects.bulk_update(
+                existentes.values(), COLUMNAS_AGREGADAS + ['puntuacion_promedio'], batch_size=500
+            )
+            cls.objects.bulk_create(nuevos, batch_size=500)
+            CalificacionDiaria.recalcular(anuncio_ids)
+        return len(existentes) + len(nuevos)
+    
+    def promedio_subpuntaje(self, campo):
+        """Promedio de trato, puntualidad, higiene o servicio a partir de los acumulados"""
+        total = getattr(self, f'total_{campo}')
+        return getattr(self, f'suma_{campo}') / total if total else 0.0
+    
     def get_primera_foto(self):
         """Obtiene la primera foto del anuncio para mostrar en rankings"""
-        primera_foto = self.anuncio.fotos.first()
-        return primera_foto.imagen.url if primera_foto else '/static/img/no-image.jpg'
+        primera_foto = self.anuncio.foto_principal
+        return primera_foto.url_optimizada if primera_foto else '/static/img/no-image.jpg'
     
     def get_servicios_lista(self):
         """Convierte servicios en lista para mostrar"""
@@ -188,3 +296,113 @@ class AnuncioExtendido(models.Model):
 
     def __str__(self):
         return f"Datos extendidos de {self.anuncio.titulo}"
+
+class RankingSnapshot(models.Model):
+    """Ranking materializado; lo llena `manage.py rebuild_rankings`"""
+    LISTA_CATEGORIA = 'categoria'
+    LISTA_CIUDAD = 'ciudad'
+    LISTA_DESTACADOS = 'destacados'
+
+    lista = models.CharField(max_length=20, choices=[
+        (LISTA_CATEGORIA, 'Top por categoría'),
+        (LISTA_CIUDAD, 'Top por ciudad'),
+        (LISTA_DESTACADOS, 'Destacados del mes'),
+    ])
+    categoria = models.CharField(max_length=50, blank=True)
+    ciudad = models.CharField(max_length=100, blank=True)  # Slug de Ciudad
+    posicion = models.PositiveIntegerField()
+    anuncio = models.ForeignKey(Anuncio, on_delete=models.CASCADE, related_name='rankings_snapshot')
+    avg_rating = models.FloatField(default=0.0)
+    total_reviews = models.IntegerField(default=0)
+    score = models.FloatField(default=0.0)
+    generado = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['lista', 'categoria', 'ciudad', 'posicion'], name='ranking_snapshot_lookup'),
+        ]
+
+    def __str__(self):
+        return f"#{self.posicion} {self.lista} {self.categoria or self.ciudad}"
+
+
+class EstadisticaDiaria(models.Model):
+    """Visitas y contactos de un anuncio por día; la llena rankings.contadores"""
+    anuncio = models.ForeignKey(Anuncio, on_delete=models.CASCADE, related_name='estadisticas_diarias')
+    fecha = models.DateField()
+    visitas = models.PositiveIntegerField(default=0)
+    contactos = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['anuncio', 'fecha'], name='estadistica_diaria_unica'),
+        ]
+
+    def __str__(self):
+        return f"{self.anuncio_id} {self.fecha}: {self.visitas} visitas, {self.contactos} contactos"
+
+
+class CalificacionDiaria(models.Model):
+    """
+    Calificaciones verificadas de un anuncio por día (mismas columnas que los
+    agregados de AnuncioExtendido). Se mantiene con deltas al verificar,
+    desverificar o borrar; los destacados del mes leen a lo sumo 30 filas
+    por anuncio en lugar de las calificaciones crudas.
+    """
+    anuncio = models.ForeignKey(Anuncio, on_delete=models.CASCADE, related_name='calificaciones_diarias')
+    fecha = models.DateField()
+    total_calificaciones = models.PositiveIntegerField(default=0)
+    suma_puntuacion = models.PositiveIntegerField(default=0)
+    suma_trato = models.PositiveIntegerField(default=0)
+    total_trato = models.PositiveIntegerField(default=0)
+    suma_puntualidad = models.PositiveIntegerField(default=0)
+    total_puntualidad = models.PositiveIntegerField(default=0)
+    suma_higiene = models.PositiveIntegerField(default=0)
+    total_higiene = models.PositiveIntegerField(default=0)
+    suma_servicio = models.PositiveIntegerField(default=0)
+    total_servicio = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['anuncio', 'fecha'], name='calificacion_diaria_unica'),
+        ]
+        indexes = [
+            # Ventanas por fecha de todos los anuncios (destacados del mes)
+            models.Index(fields=['fecha', 'anuncio'], name='calificacion_diaria_fecha_idx'),
+        ]
+
+    @classmethod
+    def aplicar_delta(cls, anuncio_id, fecha, delta):
+        """Suma `delta` ({columna: incremento}) a la fila del día en un solo UPDATE"""
+        delta = {campo: valor for campo, valor in delta.items() if valor}
+        if not delta:
+            return
+        cambios = {campo: F(campo) + valor for campo, valor in delta.items()}
+        if cls.objects.filter(anuncio_id=anuncio_id, fecha=fecha).update(**cambios):
+            return
+        if any(valor < 0 for valor in delta.values()):
+            return  # Restar de un día sin fila: no hay nada que descontar
+        cls.objects.get_or_create(anuncio_id=anuncio_id, fecha=fecha)
+        cls.objects.filter(anuncio_id=anuncio_id, fecha=fecha).update(**cambios)
+
+    @classmethod
+    def recalcular(cls, anuncio_ids):
+        """
+        Rehace desde las calificaciones crudas todas las filas de esos anuncios.
+        Llamar dentro de una transacción (borra y vuelve a insertar).
+        """
+        anuncio_ids = set(anuncio_ids)
+        cls.objects.filter(anuncio_id__in=anuncio_ids).delete()
+        filas = Calificacion.objects.filter(
+            anuncio_id__in=anuncio_ids, verificado=True
+        ).annotate(dia=TruncDate('fecha')).values('anuncio_id', 'dia').annotate(
+            **_totales_calificaciones()
+        ).order_by()
+        cls.objects.bulk_create([
+            cls(anuncio_id=fila.pop('anuncio_id'), fecha=fila.pop('dia'),
+                **{columna: valor or 0 for columna, valor in fila.items()})
+            for fila in filas
+        ], batch_size=500)
+
+    def __str__(self):
+        return f"{self.anuncio_id} {self.fecha}: {self.total_calificaciones} calificaciones"
@@ -4,172 +4,378 @@ Sistema de Rankings para iScort
 Maneja toda la lógica de rankings y top lists
 """
 
-from django.db.models import Avg, Count, Q
+import time
+from collections import namedtuple
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, F, FloatField, Max, Q, Sum, Value, Window
+from django.db.models.functions import Cast, Coalesce, RowNumber
 from django.utils import timezone
+from django.utils.text import slugify
 from datetime import timedelta
 from accounts.models import Anuncio, Acompanante
-from .models import Calificacion, AnuncioExtendido
+from iscort.lotes import iterar_en_lotes
+from .models import Calificacion, CalificacionDiaria, AnuncioExtendido, PerfilExtendido, RankingSnapshot
 
 class RankingManager:
     """Clase para manejar todos los rankings de la plataforma"""
     
+    @staticmethod
+    def _desde_snapshot(limit, **filtros):
+        """Lee un ranking materializado como queryset de Anuncio ordenado por posición"""
+        filtros = {f'rankings_snapshot__{campo}': valor for campo, valor in filtros.items()}
+        return Anuncio.objects.select_related('usuario', 'foto_principal').filter(
+            rankings_snapshot__posicion__lte=limit, **filtros
+        ).annotate(
+            avg_rating=F('rankings_snapshot__avg_rating'),
+            total_reviews=F('rankings_snapshot__total_reviews'),
+            posicion=F('rankings_snapshot__posicion'),
+        ).order_by('rankings_snapshot__posicion')
+    
     @staticmethod
     def get_top_escorts_femeninos(limit=10):
         """Obtiene el top de escorts femeninos"""
-        return Anuncio.objects.filter(
-            sexo__in=['mujer', 'femenino'],
-            # Cuando migremos: anuncio_extendido__categoria='escorts-femeninos',
-            # anuncio_extendido__activo=True
-        ).annotate(
-            avg_rating=Avg('calificaciones__puntuacion', filter=Q(calificaciones__verificado=True)),
-            total_reviews=Count('calificaciones', filter=Q(calificaciones__verificado=True))
-        ).order_by('-avg_rating', '-total_reviews', '-actualizado')[:limit]
+        return RankingManager._desde_snapshot(
+            limit, lista=RankingSnapshot.LISTA_CATEGORIA, categoria='escorts-femeninos'
+        )
     
     @staticmethod
     def get_top_escorts_masculinos(limit=10):
         """Obtiene el top de escorts masculinos"""
-        return Anuncio.objects.filter(
-            sexo__in=['hombre', 'masculino'],
-        ).annotate(
-            avg_rating=Avg('calificaciones__puntuacion', filter=Q(calificaciones__verificado=True)),
-            total_reviews=Count('calificaciones', filter=Q(calificaciones__verificado=True))
-        ).order_by('-avg_rating', '-total_reviews', '-actualizado')[:limit]
+        return RankingManager._desde_snapshot(
+            limit, lista=RankingSnapshot.LISTA_CATEGORIA, categoria='escorts-masculinos'
+        )
     
     @staticmethod
     def get_top_trans_travestis(limit=10):
         """Obtiene el top de trans y travestis"""
-        return Anuncio.objects.filter(
-            sexo__in=['trans', 'travesti'],
-        ).annotate(
-            avg_rating=Avg('calificaciones__puntuacion', filter=Q(calificaciones__verificado=True)),
-            total_reviews=Count('calificaciones', filter=Q(calificaciones__verificado=True))
-        ).order_by('-avg_rating', '-total_reviews', '-actualizado')[:limit]
+        return RankingManager._desde_snapshot(
+            limit, lista=RankingSnapshot.LISTA_CATEGORIA, categoria='trans-travestis'
+        )
     
     @staticmethod
     def get_top_por_ciudad(ciudad, limit=10):
         """Obtiene el top de escorts por ciudad específica"""
-        return Anuncio.objects.filter(
-            ciudad__iexact=ciudad,
-        ).annotate(
-            avg_rating=Avg('calificaciones__puntuacion', filter=Q(calificaciones__verificado=True)),
-            total_reviews=Count('calificaciones', filter=Q(calificaciones__verificado=True))
-        ).order_by('-avg_rating', '-total_reviews', '-actualizado')[:limit]
+        return RankingManager._desde_snapshot(
+            limit, lista=RankingSnapshot.LISTA_CIUDAD, ciudad=slugify(ciudad)
+        )
     
     @staticmethod
     def get_destacados_del_mes(limit=6):
         """Obtiene los escorts destacados del mes"""
-        hace_un_mes = timezone.now() - timedelta(days=30)
-        
-        return Anuncio.objects.filter(
-            calificaciones__fecha__gte=hace_un_mes,
-            calificaciones__verificado=True
-        ).annotate(
-            avg_rating=Avg('calificaciones__puntuacion'),
-            total_reviews=Count('calificaciones'),
-            reviews_recientes=Count('calificaciones', filter=Q(calificaciones__fecha__gte=hace_un_mes))
-        ).filter(
-            avg_rating__gte=4.0,  # Mínimo 4 estrellas
-            total_reviews__gte=3   # Mínimo 3 reviews
-        ).order_by('-avg_rating', '-reviews_recientes')[:limit]
+        return RankingManager._desde_snapshot(limit, lista=RankingSnapshot.LISTA_DESTACADOS)
     
     @staticmethod
     def get_nuevos_verificados(limit=8):
         """Obtiene escorts nuevos y verificados"""
         hace_dos_semanas = timezone.now() - timedelta(days=14)
         
-        return Anuncio.objects.filter(
+        return Anuncio.objects.select_related('usuario', 'foto_principal').filter(
             creado__gte=hace_dos_semanas,
             # Cuando migremos: usuario__perfil_extendido__email_verificado=True
+        ).annotate(
+            avg_rating=F('anuncio_extendido__puntuacion_promedio'),
+            total_reviews=F('anuncio_extendido__total_calificaciones'),
         ).order_by('-creado')[:limit]
     
     @staticmethod
     def get_mejores_por_trato(limit=10):
-        """Obtiene los mejores por trato al cliente"""
-        return Anuncio.objects.filter(
-            calificaciones__verificado=True
+        """Obtiene los mejores por trato al cliente (con los acumulados de AnuncioExtendido)"""
+        return Anuncio.objects.select_related('usuario', 'foto_principal').filter(
+            anuncio_extendido__total_trato__gt=0,
+            anuncio_extendido__total_calificaciones__gte=2,
         ).annotate(
-            avg_trato=Avg('calificaciones__trato'),
-            total_reviews=Count('calificaciones')
-        ).filter(
-            avg_trato__isnull=False,
-            total_reviews__gte=2
+            avg_trato=Cast(F('anuncio_extendido__suma_trato'), FloatField()) / F('anuncio_extendido__total_trato'),
+            total_reviews=F('anuncio_extendido__total_calificaciones'),
         ).order_by('-avg_trato', '-total_reviews')[:limit]
+
+    @staticmethod
+    def get_tendencia_calificaciones(anuncio_id, dias=30):
+        """Serie diaria [{fecha, total, promedio}] de las calificaciones verificadas del anuncio"""
+        desde = timezone.localdate() - timedelta(days=dias)
+        return [
+            {
+                'fecha': dia.fecha,
+                'total': dia.total_calificaciones,
+                'promedio': dia.suma_puntuacion / dia.total_calificaciones,
+            }
+            for dia in CalificacionDiaria.objects.filter(
+                anuncio_id=anuncio_id, fecha__gte=desde, total_calificaciones__gt=0
+            ).order_by('fecha')
+        ]
     
+    # Agregados de get_estadisticas_generales (compartidos con la versión async)
+    _AGREGADOS_ANUNCIOS = {'total_escorts': Count('id'), 'total_ciudades': Count('ciudad', distinct=True)}
+    _AGREGADOS_CALIFICACIONES = {
+        'total_reviews': Count('id'),
+        'promedio': Avg('puntuacion'),  # Promedio general de satisfacción
+    }
+
     @staticmethod
     def get_estadisticas_generales():
         """Obtiene estadísticas generales para mostrar en home"""
-        total_escorts = Anuncio.objects.count()
-        total_ciudades = Anuncio.objects.values('ciudad').distinct().count()
-        total_reviews = Calificacion.objects.filter(verificado=True).count()
-        
-        # Promedio general de satisfacción
-        promedio_general = Calificacion.objects.filter(
-            verificado=True
-        ).aggregate(Avg('puntuacion'))['puntuacion__avg'] or 0
+        return RankingManager._formatear_estadisticas(
+            Anuncio.objects.aggregate(**RankingManager._AGREGADOS_ANUNCIOS),
+            Calificacion.objects.filter(verificado=True).aggregate(**RankingManager._AGREGADOS_CALIFICACIONES),
+        )
+
+    @staticmethod
+    def _formatear_estadisticas(anuncios, calificaciones):
+        promedio_general = calificaciones['promedio'] or 0
         
         return {
-            'total_escorts': total_escorts,
-            'total_ciudades': total_ciudades,
-            'total_reviews': total_reviews,
+            'total_escorts': anuncios['total_escorts'],
+            'total_ciudades': anuncios['total_ciudades'],
+            'total_reviews': calificaciones['total_reviews'],
             'promedio_satisfaccion': round(promedio_general, 1) if promedio_general else 0
         }
 
+    @staticmethod
+    def reconstruir_snapshot(limite=None):
+        """
+        Recalcula la tabla RankingSnapshot con consultas agregadas por conjunto:
+        una por tipo de lista, con la posición asignada por ROW_NUMBER().
+        """
+        limite = limite or getattr(settings, 'RANKING_SNAPSHOT_LIMITE', 100)
+        verificadas = Q(calificaciones__verificado=True)
+        con_promedio = Anuncio.objects.annotate(
+            avg_rating=Coalesce(
+                Avg('calificaciones__puntuacion', filter=verificadas), 0.0, output_field=FloatField()
+            ),
+            total_reviews=Count('calificaciones', filter=verificadas),
+        )
+        orden = [F('avg_rating').desc(), F('total_reviews').desc(), F('actualizado').desc()]
+
+        por_categoria = con_promedio.filter(categoria__isnull=False).annotate(
+            clave=F('categoria__slug'),
+            posicion=Window(RowNumber(), partition_by=[F('categoria_id')], order_by=orden),
+        ).filter(posicion__lte=limite)
+
+        por_ciudad = con_promedio.filter(ciudad_ref__isnull=False).annotate(
+            clave=F('ciudad_ref__slug'),
+            posicion=Window(RowNumber(), partition_by=[F('ciudad_ref_id')], order_by=orden),
+        ).filter(posicion__lte=limite)
+
+        # A lo sumo 30 filas de CalificacionDiaria por anuncio, no las calificaciones crudas
+        hace_un_mes = timezone.localdate() - timedelta(days=30)
+        # Los días que quedaron en cero (calificaciones desverificadas o borradas)
+        # no se suman: si todos lo están, Postgres fallaría dividiendo por cero
+        destacados = Anuncio.objects.filter(
+            calificaciones_diarias__fecha__gte=hace_un_mes,
+            calificaciones_diarias__total_calificaciones__gt=0,
+        ).annotate(
+            avg_rating=Cast(Sum('calificaciones_diarias__suma_puntuacion'), FloatField())
+            / Sum('calificaciones_diarias__total_calificaciones'),
+            total_reviews=Sum('calificaciones_diarias__total_calificaciones'),
+        ).filter(
+            avg_rating__gte=4.0,  # Mínimo 4 estrellas
+            total_reviews__gte=3   # Mínimo 3 reviews
+        ).annotate(
+            clave=Value(''),
+            posicion=Window(RowNumber(), order_by=[F('avg_rating').desc(), F('total_reviews').desc()]),
+        ).filter(posicion__lte=limite)
+
+        total = 0
+        with transaction.atomic():
+            RankingSnapshot.objects.all().delete()
+            for lista, queryset, campo in [
+                (RankingSnapshot.LISTA_CATEGORIA, por_categoria, 'categoria'),
+                (RankingSnapshot.LISTA_CIUDAD, por_ciudad, 'ciudad'),
+                (RankingSnapshot.LISTA_DESTACADOS, destacados, 'categoria'),
+            ]:
+                columnas = queryset.values('id', 'clave', 'posicion', 'avg_rating', 'total_reviews')
+                for lote in iterar_en_lotes(columnas, 1000):
+                    RankingSnapshot.objects.bulk_create([
+                        RankingSnapshot(
+                            lista=lista,
+                            posicion=fila['posicion'],
+                            anuncio_id=fila['id'],
+                            avg_rating=round(fila['avg_rating'], 2),
+                            total_reviews=fila['total_reviews'],
+                            score=fila['avg_rating'],
+                            **{campo: fila['clave']}
+                        )
+                        for fila in lote
+                    ])
+                    total += len(lote)
+        return total
+
+    @staticmethod
+    def calcular_puntuaciones_perfiles(perfiles):
+        """
+        Calcula puntuacion_ranking para una lista de PerfilExtendido (con acompanante
+        cargado) con una sola consulta agrupada. Devuelve {perfil_id: puntuacion}.
+        """
+        activo = Q(anuncios__anuncio_extendido__activo=True) | Q(anuncios__anuncio_extendido__isnull=True)
+        estadisticas = {
+            fila['id']: fila
+            for fila in Acompanante.objects.filter(
+                id__in=[perfil.acompanante_id for perfil in perfiles]
+            ).values('id').annotate(
+                suma=Sum('anuncios__anuncio_extendido__suma_puntuacion'),
+                total=Sum('anuncios__anuncio_extendido__total_calificaciones'),
+                activos=Count('anuncios', filter=activo),
+                ultimo=Max('anuncios__actualizado'),
+            ).order_by()
+        }
+        ahora = timezone.now()
+        puntuaciones = {}
+        for perfil in perfiles:
+            fila = estadisticas.get(perfil.acompanante_id, {})
+            score = 0
+            # 1. Promedio de calificaciones (40% del score)
+            if fila.get('total'):
+                score += (fila['suma'] / fila['total'] / 5.0) * 40
+            # 2. Completitud del perfil (20% del score)
+            score += perfil.calcular_completitud_perfil() * 20
+            # 3. Número de anuncios activos (15% del score)
+            score += min(15, (fila.get('activos') or 0) * 5)
+            # 4. Verificaciones (15% del score)
+            verificaciones = sum([perfil.email_verificado, perfil.telefono_verificado, perfil.documento_verificado])
+            score += (verificaciones / 3.0) * 15
+            # 5. Actividad reciente (10% del score)
+            if fila.get('ultimo'):
+                score += max(0, 10 - (ahora - fila['ultimo']).days)
+            puntuaciones[perfil.pk] = round(score, 2)
+        return puntuaciones
+    
+    @staticmethod
+    def actualizar_rankings_automatico(chunk_size=500, dry_run=False, progreso=None):
+        """
+        Recalcula puntuacion_ranking de todos los perfiles por lotes (iterator +
+        bulk_update) y luego posicion_ranking con ROW_NUMBER(). Con dry_run no escribe.
+        `progreso(procesados, total)` se llama después de cada lote.
+        """
+        inicio = time.monotonic()
+        perfiles = PerfilExtendido.objects.select_related('acompanante').order_by('pk')
+        total = perfiles.count()
+        procesados = cambios = 0
+        for lote in iterar_en_lotes(perfiles, chunk_size):
+            puntuaciones = RankingManager.calcular_puntuaciones_perfiles(lote)
+            modificados = []
+            for perfil in lote:
+                if perfil.puntuacion_ranking != puntuaciones[perfil.pk]:
+                    perfil.puntuacion_ranking = puntuaciones[perfil.pk]
+                    modificados.append(perfil)
+            if modificados and not dry_run:
+                PerfilExtendido.objects.bulk_update(modificados, ['puntuacion_ranking'])
+            procesados += len(lote)
+            cambios += len(modificados)
+            if progreso:
+                progreso(procesados, total)
+        tiempo_puntuacion = time.monotonic() - inicio
+
+        posiciones = 0
+        if not dry_run:
+            # Solo vuelven las filas cuya posición cambió
+            nuevas = PerfilExtendido.objects.annotate(
+                nueva_posicion=Window(
+                    RowNumber(), order_by=[F('puntuacion_ranking').desc(), F('pk').asc()]
+                )
+            ).exclude(posicion_ranking=F('nueva_posicion')).values_list('pk', 'nueva_posicion')
+            for lote in iterar_en_lotes(nuevas, chunk_size):
+                PerfilExtendido.objects.bulk_update(
+                    [PerfilExtendido(pk=pk, posicion_ranking=posicion) for pk, posicion in lote],
+                    ['posicion_ranking'],
+                )
+                posiciones += len(lote)
+
+        return {
+            'perfiles': procesados,
+            'puntuaciones_cambiadas': cambios,
+            'posiciones_cambiadas': posiciones,
+            'tiempo_puntuacion': tiempo_puntuacion,
+            'tiempo_total': time.monotonic() - inicio,
+        }
+
+# Tarjeta liviana que consumen los templates de rankings
+TarjetaRanking = namedtuple('TarjetaRanking', [
+    'id', 'titulo', 'usuario', 'ciudad', 'precio', 'puntuacion', 'total_reviews',
+    'foto_principal', 'categoria', 'telefono', 'servicios', 'created',
+])
+
+# (lista, categoria) del snapshot -> nombre de la lista en el home
+LISTAS_HOME = {
+    (RankingSnapshot.LISTA_CATEGORIA, 'escorts-femeninos'): 'top_femeninos',
+    (RankingSnapshot.LISTA_CATEGORIA, 'escorts-masculinos'): 'top_masculinos',
+    (RankingSnapshot.LISTA_CATEGORIA, 'trans-travestis'): 'top_trans',
+    (RankingSnapshot.LISTA_DESTACADOS, ''): 'destacados_mes',
+}
+
 class RankingDisplay:
     """Clase para formatear datos de rankings para mostrar en templates"""
     
     @staticmethod
     def format_anuncio_for_ranking(anuncio):
-        """Formatea un anuncio para mostrar en rankings"""
-        # Obtener primera foto
-        primera_foto = anuncio.fotos.first()
-        foto_url = primera_foto.imagen.url if primera_foto else '/static/img/no-image.jpg'
-        
-        # Calcular promedio de calificaciones
-        calificaciones = anuncio.calificaciones.filter(verificado=True)
-        promedio = 0
-        total_reviews = 0
-        if calificaciones.exists():
-            promedio = round(calificaciones.aggregate(Avg('puntuacion'))['puntuacion__avg'], 1)
-            total_reviews = calificaciones.count()
+        """
+        Formatea un anuncio para mostrar en rankings. Usa las anotaciones
+        avg_rating/total_reviews y la portada ya cargadas; no hace consultas.
+        """
+        primera_foto = anuncio.foto_principal
+        promedio = getattr(anuncio, 'avg_rating', None) or 0
         
-        return {
-            'id': anuncio.id,
-            'titulo': anuncio.titulo,
-            'usuario': anuncio.usuario.first_name or anuncio.usuario.username,
-            'ciudad': anuncio.ciudad,
-            'precio': anuncio.precio,
-            'puntuacion': promedio,
-            'total_reviews': total_reviews,
-            'foto_principal': foto_url,
-            'categoria': anuncio.sexo,
-            'telefono': None,  # Por ahora no mostramos teléfono
-            'servicios': [],   # Por ahora vacío
-            'created': anuncio.creado,
-        }
+        return TarjetaRanking(
+            id=anuncio.id,
+            titulo=anuncio.titulo,
+            usuario=anuncio.usuario.first_name or anuncio.usuario.username,
+            ciudad=anuncio.ciudad,
+            precio=anuncio.precio,
+            puntuacion=round(promedio, 1),
+            total_reviews=getattr(anuncio, 'total_reviews', None) or 0,
+            foto_principal=primera_foto.url_optimizada if primera_foto else '/static/img/no-image.jpg',
+            categoria=anuncio.sexo,
+            telefono=None,  # Por ahora no mostramos teléfono
+            servicios=[],   # Por ahora vacío
+            created=anuncio.creado,
+        )
     
     @staticmethod
-    def get_home_rankings():
-        """Obtiene todos los rankings para mostrar en la página principal"""
-        return {
-            'top_femeninos': [
-                RankingDisplay.format_anuncio_for_ranking(anuncio) 
-                for anuncio in RankingManager.get_top_escorts_femeninos(6)
-            ],
-            'top_masculinos': [
-                RankingDisplay.format_anuncio_for_ranking(anuncio) 
-                for anuncio in RankingManager.get_top_escorts_masculinos(6)
-            ],
-            'top_trans': [
-                RankingDisplay.format_anuncio_for_ranking(anuncio) 
-                for anuncio in RankingManager.get_top_trans_travestis(6)
-            ],
-            'destacados_mes': [
-                RankingDisplay.format_anuncio_for_ranking(anuncio) 
-                for anuncio in RankingManager.get_destacados_del_mes(6)
-            ],
-            'nuevos_verificados': [
-                RankingDisplay.format_anuncio_for_ranking(anuncio) 
-                for anuncio in RankingManager.get_nuevos_verificados(6)
-            ],
-            'estadisticas': RankingManager.get_estadisticas_generales()
-        }
+    def _candidatos_home(limit):
+        """Filas del snapshot de todas las listas del home, en una sola consulta"""
+        return RankingSnapshot.objects.filter(
+            lista__in=[RankingSnapshot.LISTA_CATEGORIA, RankingSnapshot.LISTA_DESTACADOS],
+            posicion__lte=limit,
+            # select_related no pasa por el manager de Anuncio: los ocultos se filtran aquí
+            anuncio__oculto=False,
+        ).select_related(
+            'anuncio__usuario', 'anuncio__foto_principal'
+        ).order_by('lista', 'categoria', 'posicion')
+
+    @staticmethod
+    def get_home_rankings(limit=6):
+        """
+        Obtiene todos los rankings para mostrar en la página principal.
+        Las listas del snapshot salen de una sola consulta que se reparte en una pasada.
+        """
+        return RankingDisplay._armar_home(
+            RankingDisplay._candidatos_home(limit),
+            RankingManager.get_nuevos_verificados(limit),
+            RankingManager.get_estadisticas_generales(),
+        )
+
+    @staticmethod
+    async def aget_home_rankings(limit=6):
+        """
+        Versión async de get_home_rankings. Corre entera en un thread: el ORM async
+        manda cada consulta al mismo thread, así que lanzarlas juntas no las paraleliza
+        """
+        return await sync_to_async(RankingDisplay.get_home_rankings)(limit)
+
+    @staticmethod
+    def _armar_home(candidatos, nuevos, estadisticas):
+        rankings = {nombre: [] for nombre in LISTAS_HOME.values()}
+        for fila in candidatos:
+            nombre = LISTAS_HOME.get((fila.lista, fila.categoria))
+            if nombre is None:
+                continue
+            anuncio = fila.anuncio
+            anuncio.avg_rating = fila.avg_rating
+            anuncio.total_reviews = fila.total_reviews
+            rankings[nombre].append(RankingDisplay.format_anuncio_for_ranking(anuncio))
+        
+        rankings['nuevos_verificados'] = [
+            RankingDisplay.format_anuncio_for_ranking(anuncio) for anuncio in nuevos
+        ]
+        rankings['estadisticas'] = estadisticas
+        return rankings
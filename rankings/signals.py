@@ -0,0 +1,20 @@
+# rankings/signals.py
+"""
+Señales de la app rankings
+"""
+
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+from .models import Calificacion
+
+
+@receiver(pre_delete, sender=Calificacion)
+def descontar_calificacion_borrada(sender, instance, **kwargs):
+    """
+    Resta del anuncio lo que aportaba la calificación que se borra. Corre dentro
+    de la transacción del borrado y relee la fila con lock, como Calificacion.save
+    """
+    guardada = instance.aporte_guardado()
+    if guardada is not None:
+        anuncio_id, dia, aporte = guardada
+        Calificacion.aplicar_aporte(anuncio_id, dia, {campo: -valor for campo, valor in aporte.items()})
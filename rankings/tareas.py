@@ -0,0 +1,35 @@
+# rankings/tareas.py
+"""
+Reconstrucción periódica de RankingSnapshot sobre la cola de accounts.tareas.
+Cada pasada encola la siguiente (RANKING_SNAPSHOT_INTERVALO segundos después)
+antes de trabajar; `rebuild_rankings` (en cada deploy) arranca la cadena si no
+hay una pendiente.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from accounts.models import Tarea
+from accounts.tareas import encolar, registrar
+from .rankings_manager import RankingManager
+
+TAREA_RECONSTRUIR = 'reconstruir_rankings'
+
+
+def _intervalo():
+    return timedelta(seconds=getattr(settings, 'RANKING_SNAPSHOT_INTERVALO', 900))
+
+
+def programar_reconstruccion(demora=None):
+    """Encola la reconstrucción salvo que ya haya una pendiente"""
+    if not Tarea.objects.filter(tipo=TAREA_RECONSTRUIR, estado=Tarea.PENDIENTE).exists():
+        encolar(TAREA_RECONSTRUIR, demora=_intervalo() if demora is None else demora)
+
+
+@registrar(TAREA_RECONSTRUIR)
+def reconstruir_rankings():
+    """Tarea: programa la próxima pasada y rehace el snapshot"""
+    # Primero la próxima: aunque esta falle hasta quedar FALLIDA (o tire abajo
+    # al worker) la cadena sigue. Los reintentos ya encuentran una pendiente
+    programar_reconstruccion()
+    RankingManager.reconstruir_snapshot()
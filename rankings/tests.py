@@ -0,0 +1,413 @@
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.core.signals import request_finished
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from accounts.models import Acompanante, Anuncio, Tarea
+from accounts.tareas import MAX_INTENTOS, ejecutar, tomar_tareas
+from iscort.lotes import iterar_en_lotes
+from .admin import _cambiar_verificacion
+from . import benchmark, contadores
+from .models import (
+    AnuncioExtendido, Calificacion, CalificacionDiaria, EstadisticaDiaria, PerfilExtendido, RankingSnapshot,
+)
+from .rankings_manager import RankingDisplay, RankingManager
+from .tareas import TAREA_RECONSTRUIR
+
+
+def crear_anuncio(usuario, **kwargs):
+    datos = {
+        'titulo': 'Anuncio',
+        'descripcion': 'Descripción',
+        'ciudad': 'Quito',
+        'precio': 50,
+        'sexo': 'mujer',
+    }
+    datos.update(kwargs)
+    return Anuncio.objects.create(usuario=usuario, **datos)
+
+
+def calificar(anuncio, email, puntuacion, verificado=True, **kwargs):
+    return Calificacion.objects.create(
+        anuncio=anuncio, nombre_cliente='Cliente', email_cliente=email,
+        puntuacion=puntuacion, verificado=verificado, **kwargs
+    )
+
+
+class AgregadosIncrementalesTests(TestCase):
+    def setUp(self):
+        self.usuario = Acompanante.objects.create_user(username='ana', password='x')
+        self.anuncio = crear_anuncio(self.usuario)
+
+    def extendido(self):
+        return AnuncioExtendido.objects.get(anuncio=self.anuncio)
+
+    def test_alta_verificacion_y_borrado(self):
+        calificar(self.anuncio, 'a@x.com', 5, trato=4)
+        pendiente = calificar(self.anuncio, 'b@x.com', 2, verificado=False, trato=2)
+        ext = self.extendido()
+        self.assertEqual((ext.total_calificaciones, ext.suma_puntuacion), (1, 5))
+        self.assertEqual(ext.puntuacion_promedio, 5.0)
+
+        pendiente = Calificacion.objects.get(pk=pendiente.pk)
+        pendiente.verificado = True
+        pendiente.save()
+        ext = self.extendido()
+        self.assertEqual(ext.total_calificaciones, 2)
+        self.assertEqual(ext.puntuacion_promedio, 3.5)
+        self.assertEqual(ext.promedio_subpuntaje('trato'), 3.0)
+
+        pendiente.verificado = False
+        pendiente.save()
+        self.assertEqual(self.extendido().puntuacion_promedio, 5.0)
+
+        Calificacion.objects.all().delete()
+        ext = self.extendido()
+        self.assertEqual((ext.total_calificaciones, ext.suma_puntuacion, ext.total_trato), (0, 0, 0))
+        self.assertEqual(ext.puntuacion_promedio, 0.0)
+
+    def test_guardados_concurrentes_no_duplican_el_delta(self):
+        pendiente = calificar(self.anuncio, 'a@x.com', 4, verificado=False)
+        # Dos moderadores con la misma calificación cargada
+        primera, segunda = Calificacion.objects.get(pk=pendiente.pk), Calificacion.objects.get(pk=pendiente.pk)
+        for copia in (primera, segunda):
+            copia.verificado = True
+            copia.save()
+        ext = self.extendido()
+        self.assertEqual((ext.total_calificaciones, ext.suma_puntuacion), (1, 4))
+        dia = CalificacionDiaria.objects.get(anuncio=self.anuncio)
+        self.assertEqual(dia.total_calificaciones, 1)
+
+    def test_mover_a_otro_anuncio(self):
+        otro = crear_anuncio(self.usuario)
+        calificacion = calificar(self.anuncio, 'a@x.com', 4)
+        calificacion.anuncio = otro
+        calificacion.save()
+        ext = self.extendido()
+        self.assertEqual((ext.total_calificaciones, ext.suma_puntuacion), (0, 0))
+        self.assertEqual(CalificacionDiaria.objects.get(anuncio=self.anuncio).total_calificaciones, 0)
+        ext = AnuncioExtendido.objects.get(anuncio=otro)
+        self.assertEqual((ext.total_calificaciones, ext.suma_puntuacion), (1, 4))
+        self.assertEqual(CalificacionDiaria.objects.get(anuncio=otro).total_calificaciones, 1)
+
+    def test_borrar_una_copia_vieja_descuenta_lo_guardado(self):
+        calificacion = calificar(self.anuncio, 'a@x.com', 4, verificado=False)
+        vieja = Calificacion.objects.get(pk=calificacion.pk)
+        calificacion.verificado = True
+        calificacion.save()
+        vieja.delete()  # En memoria sigue sin verificar
+        ext = self.extendido()
+        self.assertEqual((ext.total_calificaciones, ext.suma_puntuacion), (0, 0))
+        self.assertEqual(CalificacionDiaria.objects.get(anuncio=self.anuncio).total_calificaciones, 0)
+
+    def test_costo_constante_por_calificacion(self):
+        calificar(self.anuncio, 'primera@x.com', 4)
+        for i in range(20):
+            calificar(self.anuncio, f'{i}@x.com', 3)
+        # INSERT + UPDATE de agregados + UPDATE de la fila del día (+ savepoint del atomic)
+        with self.assertNumQueries(5):
+            calificar(self.anuncio, 'ultima@x.com', 5)
+
+
+class VerificacionEnBloqueTests(TestCase):
+    def setUp(self):
+        usuario = Acompanante.objects.create_user(username='ana', password='x')
+        self.anuncios = [crear_anuncio(usuario, titulo=f'A{i}') for i in range(3)]
+        for anuncio in self.anuncios:
+            for i in range(4):
+                calificar(anuncio, f'{i}@x.com', i + 2, verificado=False, higiene=3)
+
+    def test_verificar_recalcula_cada_anuncio_una_vez(self):
+        # + DELETE/SELECT/INSERT de las filas diarias
+        with self.assertNumQueries(12):
+            total = _cambiar_verificacion(Calificacion.objects.all(), True)
+        self.assertEqual(total, 12)
+        for anuncio in self.anuncios:
+            ext = AnuncioExtendido.objects.get(anuncio=anuncio)
+            self.assertEqual((ext.total_calificaciones, ext.suma_puntuacion), (4, 14))
+            self.assertEqual(ext.puntuacion_promedio, 3.5)
+            self.assertEqual(ext.promedio_subpuntaje('higiene'), 3.0)
+
+        _cambiar_verificacion(Calificacion.objects.filter(puntuacion__gte=4), False)
+        ext = AnuncioExtendido.objects.get(anuncio=self.anuncios[0])
+        self.assertEqual((ext.total_calificaciones, ext.puntuacion_promedio), (2, 2.5))
+
+
+class CalificacionDiariaTests(TestCase):
+    def setUp(self):
+        usuario = Acompanante.objects.create_user(username='ana', password='x')
+        self.anuncio = crear_anuncio(usuario)
+
+    def dia(self):
+        return CalificacionDiaria.objects.get(anuncio=self.anuncio, fecha=timezone.localdate())
+
+    def test_deltas_al_verificar_desverificar_y_borrar(self):
+        calificar(self.anuncio, 'a@x.com', 4, trato=5)
+        pendiente = calificar(self.anuncio, 'b@x.com', 2, verificado=False)
+        dia = self.dia()
+        self.assertEqual((dia.total_calificaciones, dia.suma_puntuacion, dia.total_trato), (1, 4, 1))
+
+        pendiente.verificado = True
+        pendiente.save()
+        self.assertEqual((self.dia().total_calificaciones, self.dia().suma_puntuacion), (2, 6))
+
+        pendiente.verificado = False
+        pendiente.save()
+        self.assertEqual(self.dia().total_calificaciones, 1)
+
+        Calificacion.objects.all().delete()
+        dia = self.dia()
+        self.assertEqual((dia.total_calificaciones, dia.suma_puntuacion, dia.total_trato), (0, 0, 0))
+
+    def test_backfill_coincide_con_los_deltas(self):
+        for i in range(3):
+            calificar(self.anuncio, f'{i}@x.com', i + 3, higiene=4)
+        calificar(self.anuncio, 'p@x.com', 1, verificado=False)
+        antes = list(CalificacionDiaria.objects.values())
+        CalificacionDiaria.objects.update(total_calificaciones=99)
+        call_command('backfill_calificaciones_diarias', chunk_size=1, stdout=StringIO())
+        despues = list(CalificacionDiaria.objects.values())
+        for fila in antes + despues:
+            fila.pop('id')
+        self.assertEqual(despues, antes)
+
+    def test_destacados_del_mes_desde_filas_diarias(self):
+        for i in range(3):
+            calificar(self.anuncio, f'{i}@x.com', 5)
+        # Un día fuera de la ventana de 30 días no cuenta
+        CalificacionDiaria.objects.create(
+            anuncio=self.anuncio, fecha=timezone.localdate() - timedelta(days=40),
+            total_calificaciones=10, suma_puntuacion=10,
+        )
+        RankingManager.reconstruir_snapshot()
+        destacados = list(RankingManager.get_destacados_del_mes())
+        self.assertEqual([(a.id, a.avg_rating, a.total_reviews) for a in destacados], [(self.anuncio.id, 5.0, 3)])
+
+        tendencia = RankingManager.get_tendencia_calificaciones(self.anuncio.id)
+        self.assertEqual(tendencia, [{'fecha': timezone.localdate(), 'total': 3, 'promedio': 5.0}])
+
+    def test_destacados_ignoran_los_dias_en_cero(self):
+        for i in range(3):
+            calificar(self.anuncio, f'{i}@x.com', 5)
+        otro = crear_anuncio(self.anuncio.usuario, titulo='Otro')
+        calificacion = calificar(otro, 'z@x.com', 5)
+        calificacion.verificado = False
+        calificacion.save()
+        self.assertEqual(CalificacionDiaria.objects.get(anuncio=otro).total_calificaciones, 0)
+        # En Postgres el día en cero haría fallar la división del promedio
+        RankingManager.reconstruir_snapshot()
+        destacados = RankingSnapshot.objects.filter(lista=RankingSnapshot.LISTA_DESTACADOS)
+        self.assertEqual(list(destacados.values_list('anuncio_id', flat=True)), [self.anuncio.id])
+
+
+class RankingPerfilesTests(TestCase):
+    def setUp(self):
+        completa = Acompanante.objects.create_user(
+            username='ana', password='x', first_name='Ana', email='ana@x.com', ciudad='Quito', genero='mujer'
+        )
+        self.completo = PerfilExtendido.objects.create(
+            acompanante=completa, etnia='Mestiza', nacionalidad='Ecuatoriana', sobre_ti='Hola',
+            email_verificado=True, telefono_verificado=True, documento_verificado=True,
+        )
+        anuncio = crear_anuncio(completa)
+        calificar(anuncio, 'a@x.com', 5)
+        calificar(anuncio, 'b@x.com', 3)
+        calificar(anuncio, 'c@x.com', 1, verificado=False)
+
+        con_email = Acompanante.objects.create_user(username='bea', password='x', email='bea@x.com')
+        self.con_anuncio = PerfilExtendido.objects.create(acompanante=con_email)
+        crear_anuncio(con_email)  # Sin calificaciones ni AnuncioExtendido: cuenta como activo
+
+        vacio = Acompanante.objects.create_user(username='cris', password='x')
+        self.vacio = PerfilExtendido.objects.create(acompanante=vacio)
+
+    def test_puntuaciones(self):
+        perfiles = list(PerfilExtendido.objects.select_related('acompanante'))
+        with self.assertNumQueries(1):
+            puntuaciones = RankingManager.calcular_puntuaciones_perfiles(perfiles)
+        # Promedio 4/5 * 40 + completitud 20 + un anuncio activo 5 + verificaciones 15 + actividad de hoy 10
+        self.assertEqual(puntuaciones[self.completo.pk], 82.0)
+        # Completitud 1/7 * 20 + un anuncio activo 5 + actividad de hoy 10
+        self.assertEqual(puntuaciones[self.con_anuncio.pk], 17.86)
+        self.assertEqual(puntuaciones[self.vacio.pk], 0.0)
+
+    def test_actualizar_puntuaciones_y_posiciones(self):
+        resultado = RankingManager.actualizar_rankings_automatico(chunk_size=2)
+        self.assertEqual(
+            (resultado['perfiles'], resultado['puntuaciones_cambiadas'], resultado['posiciones_cambiadas']), (3, 2, 3)
+        )
+        filas = PerfilExtendido.objects.order_by('posicion_ranking').values_list('pk', 'puntuacion_ranking', 'posicion_ranking')
+        self.assertEqual(list(filas), [
+            (self.completo.pk, 82.0, 1), (self.con_anuncio.pk, 17.86, 2), (self.vacio.pk, 0.0, 3),
+        ])
+        # Una segunda pasada sin cambios no escribe nada
+        resultado = RankingManager.actualizar_rankings_automatico()
+        self.assertEqual((resultado['puntuaciones_cambiadas'], resultado['posiciones_cambiadas']), (0, 0))
+
+    def test_comando_dry_run_no_escribe(self):
+        salida = StringIO()
+        call_command('actualizar_rankings', '--dry-run', '--chunk-size', '1', stdout=salida)
+        self.assertIn('[dry-run] 3 perfiles, 2 puntuaciones', salida.getvalue())
+        self.assertEqual(
+            set(PerfilExtendido.objects.values_list('puntuacion_ranking', 'posicion_ranking')), {(0.0, 0)}
+        )
+
+        call_command('actualizar_rankings', stdout=StringIO())
+        self.assertEqual(PerfilExtendido.objects.get(pk=self.completo.pk).posicion_ranking, 1)
+
+
+class HomeRankingsTests(TestCase):
+    def poblar(self, cantidad):
+        usuario = Acompanante.objects.create_user(username=f'u{cantidad}', password='x')
+        for i in range(cantidad):
+            anuncio = crear_anuncio(usuario, titulo=f'A{i}', sexo=['mujer', 'hombre', 'trans'][i % 3])
+            for j in range(3):
+                calificar(anuncio, f'{j}@x.com', 5)
+        RankingManager.reconstruir_snapshot()
+
+    def test_consultas_constantes_y_tarjetas(self):
+        self.poblar(3)
+        with self.assertNumQueries(4):
+            rankings = RankingDisplay.get_home_rankings()
+        tarjeta = rankings['top_femeninos'][0]
+        self.assertEqual((tarjeta.puntuacion, tarjeta.total_reviews), (5.0, 3))
+        self.assertEqual(len(rankings['destacados_mes']), 3)
+
+        self.poblar(30)
+        with self.assertNumQueries(4):
+            rankings = RankingDisplay.get_home_rankings()
+        self.assertEqual(len(rankings['top_trans']), 6)
+        self.assertEqual(len(rankings['nuevos_verificados']), 6)
+
+    def test_snapshot_se_reconstruye_periodicamente(self):
+        call_command('rebuild_rankings', stdout=StringIO())
+        call_command('rebuild_rankings', stdout=StringIO())  # No duplica la cadena
+        tarea = Tarea.objects.get(tipo=TAREA_RECONSTRUIR)
+        self.assertGreater(tarea.disponible_desde, timezone.now())
+
+        self.poblar(3)
+        RankingSnapshot.objects.all().delete()
+        Tarea.objects.update(disponible_desde=timezone.now())
+        [tarea] = tomar_tareas()
+        self.assertTrue(ejecutar(tarea))
+        self.assertEqual(len(RankingDisplay.get_home_rankings()['destacados_mes']), 3)
+        siguiente = Tarea.objects.get(tipo=TAREA_RECONSTRUIR)
+        self.assertNotEqual(siguiente.pk, tarea.pk)
+
+    def test_la_cadena_sigue_si_la_reconstruccion_falla(self):
+        call_command('rebuild_rankings', stdout=StringIO())
+        Tarea.objects.update(disponible_desde=timezone.now(), intentos=MAX_INTENTOS - 1)
+        [tarea] = tomar_tareas()
+        with patch.object(RankingManager, 'reconstruir_snapshot', side_effect=RuntimeError('caída')):
+            self.assertFalse(ejecutar(tarea))
+        self.assertEqual(Tarea.objects.get(pk=tarea.pk).estado, Tarea.FALLIDA)
+        siguiente = Tarea.objects.get(tipo=TAREA_RECONSTRUIR, estado=Tarea.PENDIENTE)
+        self.assertGreater(siguiente.disponible_desde, timezone.now())
+
+
+@override_settings(CONTADORES_VACIADO_SEGUNDOS=3600)
+class ContadoresDiferidosTests(TestCase):
+    def setUp(self):
+        contadores._pendientes.clear()
+        usuario = Acompanante.objects.create_user(username='ana', password='x')
+        self.perfil = PerfilExtendido.objects.create(acompanante=usuario)
+        self.anuncios = [crear_anuncio(usuario) for _ in range(3)]
+        for anuncio in self.anuncios:
+            AnuncioExtendido.objects.create(anuncio=anuncio)
+
+    def test_beacon_no_escribe_hasta_vaciar(self):
+        with self.assertNumQueries(0):
+            for _ in range(3):
+                self.client.post(f'/anuncios/{self.anuncios[0].id}/visita/')
+            self.client.post(f'/anuncios/{self.anuncios[0].id}/contacto/')
+        self.assertEqual(self.client.post(f'/anuncios/{self.anuncios[0].id}/otro/').status_code, 404)
+        self.assertEqual(AnuncioExtendido.objects.get(anuncio=self.anuncios[0]).visualizaciones, 0)
+
+        self.assertEqual(contadores.vaciar(), 4)
+        extendido = AnuncioExtendido.objects.get(anuncio=self.anuncios[0])
+        self.assertEqual((extendido.visualizaciones, extendido.clicks_contacto), (3, 1))
+        self.perfil.refresh_from_db()
+        self.assertEqual((self.perfil.total_visitas, self.perfil.total_contactos), (3, 1))
+        dia = EstadisticaDiaria.objects.get(anuncio=self.anuncios[0], fecha=timezone.localdate())
+        self.assertEqual((dia.visitas, dia.contactos), (3, 1))
+
+    def test_vaciado_agrupa_por_delta_y_suma(self):
+        for anuncio in self.anuncios:
+            contadores.registrar('visita', anuncio.id, 2)
+        contadores.vaciar()
+        for anuncio in self.anuncios:
+            contadores.registrar('visita', anuncio.id)
+        # Dueños, alta de filas faltantes y un UPDATE por tabla (un solo delta), más el savepoint
+        with self.assertNumQueries(9):
+            contadores.vaciar()
+        self.assertEqual(
+            sorted(AnuncioExtendido.objects.values_list('visualizaciones', flat=True)), [3, 3, 3]
+        )
+        self.assertEqual(EstadisticaDiaria.objects.count(), 3)
+        self.perfil.refresh_from_db()
+        self.assertEqual(self.perfil.total_visitas, 9)
+
+    def test_crea_las_filas_extendidas_que_faltan(self):
+        usuario = Acompanante.objects.create_user(username='nueva', password='x')
+        anuncio = crear_anuncio(usuario)
+        AnuncioExtendido.objects.filter(anuncio=anuncio).delete()
+        for _ in range(5):
+            contadores.registrar('visita', anuncio.id)
+        self.assertEqual(contadores.vaciar(), 5)
+        self.assertEqual(AnuncioExtendido.objects.get(anuncio=anuncio).visualizaciones, 5)
+        self.assertEqual(PerfilExtendido.objects.get(acompanante=usuario).total_visitas, 5)
+        self.assertEqual(EstadisticaDiaria.objects.get(anuncio=anuncio).visitas, 5)
+
+    @override_settings(CONTADORES_VACIADO_SEGUNDOS=0)
+    def test_vaciado_tras_el_request_cierra_la_conexion(self):
+        contadores.registrar('visita', self.anuncios[0].id)
+        with patch('rankings.contadores.close_old_connections') as cerrar:
+            request_finished.send(sender=None)
+        cerrar.assert_called_once_with()
+        self.assertEqual(AnuncioExtendido.objects.get(anuncio=self.anuncios[0]).visualizaciones, 1)
+
+
+class ExplainHotpathsTests(TestCase):
+    def test_listados_usan_los_indices(self):
+        salida = StringIO()
+        call_command('explain_hotpaths', '--ciudad', 'Quito', '--estricto', stdout=salida)
+        plan = salida.getvalue()
+        self.assertIn('anuncio_categoria_creado_idx', plan)
+        self.assertIn('anuncio_ciudad_categoria_idx', plan)
+        self.assertNotIn('Recorrido secuencial', plan)
+
+
+class IterarEnLotesTests(TestCase):
+    def test_lotes_acotados(self):
+        usuario = Acompanante.objects.create_user(username='ana', password='x')
+        for i in range(7):
+            crear_anuncio(usuario, titulo=f'A{i}')
+        lotes = list(iterar_en_lotes(Anuncio.objects.order_by('id'), chunk_size=3))
+        self.assertEqual([len(lote) for lote in lotes], [3, 3, 1])
+        self.assertEqual([a.titulo for lote in lotes for a in lote], [f'A{i}' for i in range(7)])
+
+
+class BenchmarkTests(TestCase):
+    def test_sembrar_y_medir(self):
+        totales = benchmark.sembrar(usuarios=10, calificaciones=200)
+        self.assertEqual(Calificacion.objects.count(), 200)
+        self.assertEqual(Anuncio.objects.filter(foto_principal__isnull=True).count(), 0)
+        # Asimetría: el anuncio más calificado junta mucho más que el promedio
+        mas_calificado = AnuncioExtendido.objects.order_by('-total_calificaciones').first()
+        self.assertGreater(mas_calificado.total_calificaciones, 3 * 160 / totales['anuncios'])
+
+        # Con la grilla ya en el caché de fragmentos el listado es una sola consulta
+        resultados = benchmark.medir(iteraciones=2, calentamiento=1, solo=['listado_categoria', 'home_rankings'])
+        self.assertEqual(set(resultados), {'listado_categoria', 'home_rankings'})
+        self.assertEqual(resultados['listado_categoria']['consultas'], 1)
+
+    def test_comparar_con_baseline(self):
+        baseline = {'home': {'p95_ms': 10.0, 'consultas': 4}, 'buscar': {'p95_ms': 10.0, 'consultas': 3}}
+        actual = {'home': {'p95_ms': 11.0, 'consultas': 5}, 'buscar': {'p95_ms': 13.0, 'consultas': 3}}
+        regresiones = benchmark.comparar(actual, baseline, tolerancia=0.2)
+        self.assertEqual(regresiones['home'], ['consultas 4 -> 5'])
+        self.assertEqual(regresiones['buscar'], ['p95 10.0 -> 13.0 ms'])